@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пула прогретых соединений: время от подключения кандидата до
+готового сервиса с пулом и без него.
+
+Вместо Simli — заглушка с задержкой рукопожатия; кандидаты приходят
+волнами, часть волн больше размера пула (холодные старты), а паузы между
+волнами длиннее ``idle_timeout`` (пересоздание простаивающих соединений).
+
+Запуск из папки avatar:
+    python -m benchmarks.bench_warm_pool
+"""
+import asyncio
+import random
+
+from warm_pool import WarmPool
+
+HANDSHAKE_SECONDS = (0.8, 1.6)
+SESSION_SECONDS = 0.3
+WAVES = [1, 1, 3, 1, 2, 1]
+PAUSE_SECONDS = 1.5
+
+
+class StubService:
+    """Заглушка внешнего сервиса с рукопожатием"""
+
+    opened = 0
+    closed = 0
+
+    async def connect(self):
+        await asyncio.sleep(random.uniform(*HANDSHAKE_SECONDS))
+        StubService.opened += 1
+
+    async def close(self):
+        StubService.closed += 1
+
+
+async def create_service() -> StubService:
+    service = StubService()
+    await service.connect()
+    return service
+
+
+async def close_service(service: StubService):
+    await service.close()
+
+
+async def session(pool: WarmPool, delays: list):
+    lease = await pool.claim()
+    delays.append(lease.claim_seconds)
+    await asyncio.sleep(SESSION_SECONDS)
+    await pool.release(lease)
+
+
+async def run(pool_size: int) -> dict:
+    random.seed(1)
+    StubService.opened = StubService.closed = 0
+    pool = WarmPool(create_service, close_service, size=pool_size, idle_timeout=1.0, claim_wait=0.5, name="stub")
+    await pool.start()
+    # Пул успевает прогреться до первого кандидата
+    await asyncio.sleep(HANDSHAKE_SECONDS[1] + 0.1)
+
+    delays = []
+    for wave in WAVES:
+        await asyncio.gather(*(session(pool, delays) for _ in range(wave)))
+        await asyncio.sleep(PAUSE_SECONDS)
+    stats = pool.stats()
+    await pool.shutdown()
+
+    delays.sort()
+    return {
+        "pool": pool_size,
+        "p50_ms": delays[len(delays) // 2] * 1000,
+        "max_ms": delays[-1] * 1000,
+        "mean_ms": sum(delays) / len(delays) * 1000,
+        "warm": stats["warm_claims"],
+        "cold": stats["cold_claims"],
+        "recycled": stats["recycled"],
+        "opened": StubService.opened,
+        "leaked": StubService.opened - StubService.closed,
+    }
+
+
+def main():
+    print(f"{sum(WAVES)} подключений волнами {WAVES}; рукопожатие {HANDSHAKE_SECONDS[0]}–{HANDSHAKE_SECONDS[1]} с")
+    print(f"{'пул':>4} {'p50, мс':>9} {'max, мс':>9} {'среднее':>9} {'тёплых':>7} {'холодных':>9} {'пересозд.':>10} {'открыто':>8} {'утечки':>7}")
+    for size in (0, 1, 2):
+        row = asyncio.run(run(size))
+        print(
+            f"{row['pool']:>4} {row['p50_ms']:>9.0f} {row['max_ms']:>9.0f} {row['mean_ms']:>9.0f} "
+            f"{row['warm']:>7} {row['cold']:>9} {row['recycled']:>10} {row['opened']:>8} {row['leaked']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@
 # SPDX-License-Identifier: BSD 2-Clause License
 #
 
+import asyncio
 import os
+from typing import Optional
 
 from dotenv import load_dotenv
 from loguru import logger
@@ -38,6 +40,9 @@ from pipecat.adapters.schemas.function_schema import FunctionSchema
 from pipecat.adapters.schemas.tools_schema import ToolsSchema
 from pipecat.services.llm_service import FunctionCallParams
 from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
+from latency import LATENCY_TIMELINE_DIR, LatencyObserver
+from prompts import prompt_cache
+from warm_pool import WarmPool
 # Load environment variables
 load_dotenv(override=True)
 
@@ -65,7 +70,59 @@ async def get_current_datetime(params: FunctionCallParams):
 # Create a tools schema with your functions
 
 
-async def run_bot(webrtc_connection):
+class PrewarmedSimliVideoService(SimliVideoService):
+    """Simli с рукопожатием до запуска конвейера.
+
+    ``SimliVideoService`` не повторяет ``Initialize`` для уже
+    инициализированного клиента, поэтому на StartFrame остаётся только
+    запустить потоки аудио и видео.
+    """
+
+    async def prewarm(self):
+        await self._simli_client.Initialize()
+        self._initialized = True
+
+    async def close(self):
+        await self._simli_client.stop()
+
+
+def create_simli() -> PrewarmedSimliVideoService:
+    return PrewarmedSimliVideoService(
+        SimliConfig(
+            apiKey=os.getenv("SIMLI_API_KEY"),
+            faceId=os.getenv("SIMLI_FACE_ID"),
+            handleSilence=True,
+            # Время в пуле входит в длительность сессии Simli
+            maxSessionLength=300 + int(SIMLI_POOL_IDLE_TIMEOUT),
+            maxIdleTime=30,
+        ),
+        use_turn_server=True,
+        latency_interval=0
+    )
+
+
+async def warm_simli() -> PrewarmedSimliVideoService:
+    simli = create_simli()
+    try:
+        await simli.prewarm()
+    except BaseException:
+        await simli.close()
+        raise
+    return simli
+
+
+# Простой в пуле должен быть короче maxIdleTime Simli, иначе пул выдаст оборванную сессию
+SIMLI_POOL_IDLE_TIMEOUT = float(os.getenv("SIMLI_POOL_IDLE_TIMEOUT", "25"))
+simli_pool = WarmPool(
+    warm_simli,
+    close=lambda simli: simli.close(),
+    size=int(os.getenv("SIMLI_POOL_SIZE", "1")),
+    idle_timeout=SIMLI_POOL_IDLE_TIMEOUT,
+    name="simli",
+)
+
+
+async def run_bot(webrtc_connection, interview_link: Optional[str] = None):
     logger.info(f"Starting bot")
     pipecat_transport = SmallWebRTCTransport(
         webrtc_connection=webrtc_connection,
@@ -81,204 +138,125 @@ async def run_bot(webrtc_connection):
         vad_analyzer=None
     ),
     )
-    # Create the Gemini Multimodal Live LLM service
-    system_instruction = f"""
-Ты — Александра, продвинутый HR-интервьюер.
-
-**Задача:** Провести структурированное интервью на **русском языке**, соблюдая этические нормы (без дискриминационных вопросов). Твоя роль — оценить кандидата и подготовить отчет для HR-менеджера, **а не принимать решение о найме**.
-
-**Входные данные:**
-* **Вакансия:Frontend Developer, база знаний React, TypeScript, JavaScript, HTML/CSS, описание: Собеседование на позицию Frontend разработчика с опытом работы от 3 лет**
-* **Резюме:Храмов Альберт Марсович
-Мужчина, 19 лет, родился 19 января 2006
-+7 (939) 3473144 — предпочитаемый способ связи
-albert1yandex@gmail.com
-@albert_khramov — telegram
-Проживает: Москва
-Гражданство: Россия, есть разрешение на работу: Россия
-Не готов к переезду, не готов к командировкам
-Желаемая должность и зарплата
-Аналитик-программист
-Специализации:
-— Аналитик, ML-инженер
-Занятость: частичная занятость, стажировка
-График работы: сменный график, гибкий график, удаленная работа
-Желательное время в пути до работы: не имеет значения
-Образование
-Неоконченное высшее
-2028
- Национальный исследовательский технологический
-университет «МИСИС», Москва
-ИКН, Информатика и вычислительная техника
-Повышение квалификации, курсы
-2024
- Deep Learning School (DLS) 1 семестр - 01.09–31.12
-CV-week (Яндекс) - 25.11–30.11
-Введение в машинное обучение (Сириус Курсы) - 01.08–31.08
-2023
- Основы статистики (Stepik, Anatoliy Karpov) - 01.10–15.11
-Навыки
-Знание языков
-Навыки
-Русский — Родной
-Python Английский язык Аналитическое мышление Обучение и развитие
-Анализ данных PostgreSQL Data Analysis Алгоритмы ML pandas Git sklearn
-Data Science PyTorch CV CatBoost Seaborn Matplotlib transformers NLTK
-TensorFlow Прогнозирование
-Опыт работы над проектами
-Pet-проект: Telegram-бот для DND (AI-ARROW Hackathon, 2024)
-Описание проекта:
-Разработан Telegram-бот, выполняющий роль ведущего для настольной ролевой игры
-Dungeons & Dragons. Использует API ChatGPT для генерации квестов, событий и
-персонажей, а также FLUX API и FreeSound для мультимедийного сопровождения.
-Цель проекта:
-Автоматизация работы ведущего игры, добавление интерактивного мультимедиа.
-Моя роль в проекте:
-• Разработка структуры JSON для хранения состояния игры
-• Написание логики обработки команд
-• Интеграция с API
-• Подготовка пользовательской документации
-• Презентация проекта
-Результат:
-Проект размещен на GitHub: https://github.com/c0lbarator/truedungeons
-Почему я выбрал направление ML?
-Первое знакомство с ML произошло в 2023 году на хакатоне «Цифровой прорыв», где я заинтересовался
-анализом данных. Позже, готовясь к олимпиаде НТО БДИМО, я начал углубленно изучать ML и участвовать в
-тематических мероприятиях.
-Ключевые события, укрепившие интерес к ML:
-•
-•
-•
-Data Dojo (Яндекс, 2024) — разбор решений победителей ML-соревнований
-Moscow AI №0 (МТС, 2024) — обсуждение AI-агентов, генерации видео, моделей типа Kandinsky
-День студента (Сбер, 2025) — лекции о DeepSeek R1 и концепции Scheming у AI
-Соревнования и достижения
-Олимпиады:
-•
- Олимпиада DANO 2023 — финалист
-•
- Олимпиада НТО БДИМО (RecSys) 2024 — финалист
-•
- Олимпиада Изумруд по математике 2024 — призер 3 степени
-Хакатоны (https://github.com/RetRoBich921 пара проектов выложены на моём гите):
-•
- AI-ARROW 2024 — победитель в специальной номинации
-•
- Цифровой прорыв (Международный, CV) 2024 — 12 место
-•
- Alfa Hack (бинарная классификация) 2024 — 5 место
-•
- ФИЦ (Time Series) 2024 — 4 место
-•
- Норникель: интеллектуальные горизонты 2024 — 5 место**
-* **Время (минут):5**
-Текущее время: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
----
-
-### **План Действий**
-
-**1. Внутренний анализ (перед первым вопросом):**
-* Выдели из вакансии 5-7 ключевых компетенций.
-* Сопоставь их с резюме, определи главные темы для проверки.
-
-**2. Проведение интервью (взаимодействие с кандидатом):**
-* **Структура по времени:** Придерживайся плана: Вступление (~5%), Основные вопросы (~70%), Вопросы кандидата (~15%), Завершение (~10%).
-* **Начало:** Кратко представься и озвучь план беседы.
-* **Диалог:** Задавай по **одному** вопросу за раз. Если ответ неполный — задавай уточняющие вопросы.
-* **Завершение:** Будь нейтрален. Поблагодари, озвучь следующие шаги (например, «Мы свяжемся с вами в течение N дней») и пожелай хорошего дня. Не давай никаких намеков на решение.
-
-**3. Итоговый отчет (для HR-менеджера):**
-* **Оценка по компетенциям:**
-    * `[Компетенция]`: `[Подтверждена / Частично / Не подтверждена]` — `[Краткое обоснование]`
-* **Сильные стороны:** (список 2-3)
-* **Риски / Зоны роста:** (список 1-2)
-* **Рекомендация:** `[Рекомендовать / Рассмотреть / Не рекомендовать]` с четкой аргументацией.
-Пожалуйста, произноси числительные на русском языке, для этого можешь перевести их в письменную форму, например, 3 - "три
-    """
-    context = OpenAILLMContext(
-    messages=[
-        {
-            "role": "system",
-            "content": system_instruction
-        }    
-    ],
-    tools=tools
-)
-    llm = GeminiMultimodalLiveLLMService(
-        api_key=os.getenv("GOOGLE_API_KEY"),
-        system_instruction=system_instruction,
-        voice_id="Aoede",  # Aoede, Charon, Fenrir, Kore, Puck
-        language=Language.RU_RU,
-        vad=GeminiVADParams(
-                start_sensitivity=StartSensitivity.HIGH,    # Быстро детектируем начало речи
-                end_sensitivity=EndSensitivity.LOW,         # Даем больше времени на паузы
-                prefix_padding_ms=500,                      # Увеличиваем буфер до речи
-                silence_duration_ms=2000,                   # Увеличиваем время тишины до 2 сек
-            ),
-    )
-    context_aggregator = llm.create_context_aggregator(context)
-    llm.register_function(
-    "get_current_datetime",
-    get_current_datetime,
-    cancel_on_interruption=True,  # Cancel if user interrupts (default: True)
-    )
-    simli = SimliVideoService(
-        SimliConfig(
-            apiKey=os.getenv("SIMLI_API_KEY"),
-            faceId=os.getenv("SIMLI_FACE_ID"),
-            handleSilence=True,
-            maxSessionLength=300,
-            maxIdleTime=30,
-        ),
-        use_turn_server=True,
-        latency_interval=0
+    # Промпт собеседования (неизменная часть из кэша, время — на момент подключения)
+    # и Simli из пула, уже подключённый: рукопожатие не задерживает приветствие
+    prompt, simli_lease = await asyncio.gather(
+        prompt_cache.system_instruction(interview_link),
+        simli_pool.claim(),
+        return_exceptions=True,
     )
-    # Build the pipeline
-    pipeline = Pipeline(
-        [
-            pipecat_transport.input(),
-            context_aggregator.user(),
-            llm,
-            simli,
-            pipecat_transport.output(),
-            context_aggregator.assistant()
-        ]
+    if isinstance(simli_lease, BaseException):
+        raise simli_lease
+    if isinstance(prompt, BaseException):
+        # Бэкенд недоступен: сессия отклоняется, Simli ещё не использован и возвращается в пул
+        await simli_pool.release(simli_lease, reusable=True)
+        await webrtc_connection.disconnect()
+        raise prompt
+    # С этого места Simli принадлежит сессии: его нужно вернуть при любом исходе.
+    # Пока StartFrame не прошёл конвейер, Simli не закроется вместе с ним
+    pipeline_started = False
+    latency = None
+    try:
+        interview, system_instruction = prompt
+        simli = simli_lease.value
+        logger.info(f"Simli {'warm' if simli_lease.warm else 'cold'} start: {simli_lease.claim_seconds * 1000:.0f} ms")
+        logger.info(f"Prompt for interview {interview.unique_link}: {len(system_instruction)} chars")
+        # Create the Gemini Multimodal Live LLM service
+        context = OpenAILLMContext(
+        messages=[
+            {
+                "role": "system",
+                "content": system_instruction
+            }    
+        ],
+        tools=tools
     )
-
-    # Configure the pipeline task
-    task = PipelineTask(
-        pipeline,
-        params=PipelineParams(
-            enable_metrics=True,
-            enable_usage_metrics=True,
+        llm = GeminiMultimodalLiveLLMService(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            system_instruction=system_instruction,
+            voice_id="Aoede",  # Aoede, Charon, Fenrir, Kore, Puck
+            language=Language.RU_RU,
+            vad=GeminiVADParams(
+                    start_sensitivity=StartSensitivity.HIGH,    # Быстро детектируем начало речи
+                    end_sensitivity=EndSensitivity.LOW,         # Даем больше времени на паузы
+                    prefix_padding_ms=500,                      # Увеличиваем буфер до речи
+                    silence_duration_ms=2000,                   # Увеличиваем время тишины до 2 сек
+                ),
         )
-    )
-
-    # Handle client connection event
-    @pipecat_transport.event_handler("on_client_connected")
-    async def on_client_connected(transport, client):
-        logger.info(f"Client connected")
-        # Kick off the conversation.
-        await task.queue_frames(
+        context_aggregator = llm.create_context_aggregator(context)
+        llm.register_function(
+        "get_current_datetime",
+        get_current_datetime,
+        cancel_on_interruption=True,  # Cancel if user interrupts (default: True)
+        )
+        transport_input = pipecat_transport.input()
+        transport_output = pipecat_transport.output()
+        # Build the pipeline
+        pipeline = Pipeline(
             [
-                LLMMessagesAppendFrame(
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": f"Поприветствовать пользователя и представиться.",
-                        }
-                    ]
-                )
+                transport_input,
+                context_aggregator.user(),
+                llm,
+                simli,
+                transport_output,
+                context_aggregator.assistant()
             ]
         )
+        # Задержки хода: конец речи кандидата -> LLM -> Simli -> транспорт
+        latency = LatencyObserver(
+            webrtc_connection.pc_id,
+            llm=llm,
+            avatar=simli,
+            output=transport_output,
+            input_transport=transport_input,
+            timeline_dir=LATENCY_TIMELINE_DIR,
+        )
+
+        # Configure the pipeline task
+        task = PipelineTask(
+            pipeline,
+            params=PipelineParams(
+                enable_metrics=True,
+                enable_usage_metrics=True,
+            ),
+            observers=[latency],
+        )
+
+        # Handle client connection event
+        @pipecat_transport.event_handler("on_client_connected")
+        async def on_client_connected(transport, client):
+            logger.info(f"Client connected")
+            # Kick off the conversation.
+            await task.queue_frames(
+                [
+                    LLMMessagesAppendFrame(
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": f"Поприветствовать пользователя и представиться.",
+                            }
+                        ]
+                    )
+                ]
+            )
+
+        # Handle client disconnection events
+        @pipecat_transport.event_handler("on_client_disconnected")
+        async def on_client_disconnected(transport, client):
+            logger.info(f"Client disconnected")
+            await task.cancel()
 
-    # Handle client disconnection events
-    @pipecat_transport.event_handler("on_client_disconnected")
-    async def on_client_disconnected(transport, client):
-        logger.info(f"Client disconnected")
-        await task.cancel()
+        @task.event_handler("on_pipeline_started")
+        async def on_pipeline_started(task, frame):
+            nonlocal pipeline_started
+            pipeline_started = True
 
-    # Run the pipeline
-    runner = PipelineRunner(handle_sigint=False)
-    await runner.run(task)
\ No newline at end of file
+        # Run the pipeline
+        runner = PipelineRunner(handle_sigint=False)
+        await runner.run(task)
+    finally:
+        if latency is not None:
+            # Таймлайн пишется и при обрыве, когда EndFrame/CancelFrame не дошёл до наблюдателя
+            latency.finish()
+        # Запущенный конвейер сам закрывает Simli при остановке; сессия одноразовая
+        await simli_pool.release(simli_lease, close=not pipeline_started)
\ No newline at end of file
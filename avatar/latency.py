@@ -0,0 +1,309 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    CancelFrame,
+    EndFrame,
+    InputAudioRawFrame,
+    LLMFullResponseStartFrame,
+    MetricsFrame,
+    TTSAudioRawFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.metrics.metrics import ProcessingMetricsData, TTFBMetricsData
+from pipecat.observers.base_observer import BaseObserver, FramePushed
+from pipecat.processors.frame_processor import FrameDirection
+
+# Этапы хода: конец речи кандидата -> первый ответ LLM -> первый кадр
+# аватара -> начало воспроизведения в транспорте
+STAGE_LLM = "llm_first_token"
+STAGE_AVATAR = "avatar_first_frame"
+STAGE_OUTPUT = "transport_output"
+STAGE_TOTAL = "turn_total"
+STAGES = (STAGE_LLM, STAGE_AVATAR, STAGE_OUTPUT, STAGE_TOTAL)
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как у Prometheus)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+    def prometheus(self, name: str, labels: str = "") -> List[str]:
+        lines = []
+        cumulative = 0
+        prefix = f"{labels}," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class LatencyRegistry:
+    """Гистограммы задержек всех сессий процесса"""
+
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        # TTFB и время обработки, которые считает сам pipecat (enable_metrics)
+        self.ttfb: Dict[str, Histogram] = {}
+        self.processing: Dict[str, Histogram] = {}
+        self.turns = 0
+        self.sessions = 0
+
+    def observe_pipecat(self, kind: str, processor: str, value: float):
+        histograms = self.ttfb if kind == "ttfb" else self.processing
+        histograms.setdefault(processor, Histogram()).observe(value)
+
+    def summary(self) -> dict:
+        return {
+            "sessions": self.sessions,
+            "turns": self.turns,
+            "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()},
+        }
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP avatar_turn_latency_seconds Per-turn latency of avatar pipeline stages",
+            "# TYPE avatar_turn_latency_seconds histogram",
+        ]
+        for stage, histogram in self.stages.items():
+            lines += histogram.prometheus("avatar_turn_latency_seconds", f'stage="{stage}"')
+        for metric, histograms, help_text in (
+            ("avatar_pipecat_ttfb_seconds", self.ttfb, "Time to first byte reported by pipecat processors"),
+            ("avatar_pipecat_processing_seconds", self.processing, "Processing time reported by pipecat processors"),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for processor, histogram in sorted(histograms.items()):
+                lines += histogram.prometheus(metric, f'processor="{_label(processor)}"')
+        lines += [
+            "# HELP avatar_turns_total Measured conversation turns",
+            "# TYPE avatar_turns_total counter",
+            f"avatar_turns_total {self.turns}",
+            "# HELP avatar_latency_sessions_total Sessions with latency tracking",
+            "# TYPE avatar_latency_sessions_total counter",
+            f"avatar_latency_sessions_total {self.sessions}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+@dataclass
+class _Turn:
+    user_stopped: float
+    marks: Dict[str, float] = field(default_factory=dict)
+
+
+class LatencyObserver(BaseObserver):
+    """Наблюдатель конвейера бота: отметки времени этапов каждого хода.
+
+    Ход начинается, когда кандидат замолкает: по ``UserStoppedSpeakingFrame``
+    или, если VAD в транспорте выключен (речь определяет Gemini Live), по
+    последнему кадру входного аудио громче ``voice_threshold``. Дальше
+    отмечаются начало ответа ``llm``, первое аудио от аватара ``avatar`` и
+    ``BotStartedSpeakingFrame`` от транспорта ``output``. Задержки этапов
+    попадают в гистограммы сессии и процесса (``registry``), а при
+    отключении таймлайн сессии пишется в ``timeline_dir``.
+
+    Наблюдатель видит кадр на каждом переходе между процессорами, поэтому
+    кадр учитывается только у источника: метрики — у процессора, который
+    их посчитал, входное аудио — у входного транспорта ``input_transport``,
+    а начало и конец речи — один раз на кадр.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        llm,
+        avatar,
+        output,
+        input_transport=None,
+        registry: Optional[LatencyRegistry] = None,
+        timeline_dir: Optional[str] = None,
+        voice_threshold: int = 500,
+    ):
+        super().__init__()
+        self.session_id = session_id
+        self._llm = llm
+        self._avatar = avatar
+        self._output = output
+        self._input = input_transport
+        self.registry = registry if registry is not None else latency_registry
+        self.timeline_dir = timeline_dir
+        self.voice_threshold = voice_threshold
+
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.histograms: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self.timeline: List[dict] = []
+        self._turn: Optional[_Turn] = None
+        self._last_voice: Optional[float] = None
+        self._vad_frames = False
+        self._speech_frames: deque = deque(maxlen=16)
+        self._finished = False
+        self.registry.sessions += 1
+
+    async def on_push_frame(self, data: FramePushed):
+        frame = data.frame
+        now = time.perf_counter()
+
+        if isinstance(frame, MetricsFrame):
+            source = getattr(data.source, "name", None)
+            for metrics in frame.data:
+                if metrics.processor != source:
+                    # Метрики другого процессора, проходящие дальше по конвейеру
+                    continue
+                if isinstance(metrics, TTFBMetricsData) and metrics.value:
+                    self.registry.observe_pipecat("ttfb", metrics.processor, metrics.value)
+                elif isinstance(metrics, ProcessingMetricsData) and metrics.value:
+                    self.registry.observe_pipecat("processing", metrics.processor, metrics.value)
+            return
+
+        if isinstance(frame, (EndFrame, CancelFrame)):
+            self.finish()
+            return
+
+        if data.direction != FrameDirection.DOWNSTREAM:
+            return
+
+        if isinstance(frame, (UserStartedSpeakingFrame, UserStoppedSpeakingFrame)):
+            if frame.id in self._speech_frames:
+                return
+            self._speech_frames.append(frame.id)
+            if isinstance(frame, UserStartedSpeakingFrame):
+                self._vad_frames = True
+                self._turn = None
+            else:
+                self._turn = _Turn(now)
+        elif isinstance(frame, InputAudioRawFrame):
+            if self._input is not None and data.source is not self._input:
+                return
+            if not self._vad_frames and self._is_voiced(frame):
+                self._last_voice = now
+        elif data.source is self._llm and isinstance(frame, LLMFullResponseStartFrame):
+            if self._turn is None and not self._vad_frames and self._last_voice is not None:
+                # Без VAD концом речи считается последний громкий кадр перед началом ответа
+                self._turn = _Turn(self._last_voice)
+                self._last_voice = None
+            self._mark(STAGE_LLM, now)
+        elif data.source is self._avatar and isinstance(frame, TTSAudioRawFrame):
+            self._mark(STAGE_AVATAR, now)
+        elif data.source is self._output and isinstance(frame, BotStartedSpeakingFrame):
+            self._mark(STAGE_OUTPUT, now)
+            self._complete_turn()
+
+    def _is_voiced(self, frame: InputAudioRawFrame) -> bool:
+        samples = np.frombuffer(frame.audio, dtype=np.int16)
+        return samples.size > 0 and int(np.abs(samples).max()) >= self.voice_threshold
+
+    def _mark(self, stage: str, now: float):
+        # Этапы отмечаются один раз и по порядку
+        if self._turn is None or stage in self._turn.marks:
+            return
+        expected = STAGES[len(self._turn.marks)]
+        if stage != expected:
+            return
+        self._turn.marks[stage] = now
+
+    def _complete_turn(self):
+        turn, self._turn = self._turn, None
+        if turn is None or STAGE_OUTPUT not in turn.marks:
+            return
+        previous = turn.user_stopped
+        durations = {}
+        for stage in (STAGE_LLM, STAGE_AVATAR, STAGE_OUTPUT):
+            durations[stage] = turn.marks[stage] - previous
+            previous = turn.marks[stage]
+        durations[STAGE_TOTAL] = turn.marks[STAGE_OUTPUT] - turn.user_stopped
+
+        for stage, value in durations.items():
+            self.histograms[stage].observe(value)
+            self.registry.stages[stage].observe(value)
+        self.registry.turns += 1
+        self.timeline.append({
+            "turn": len(self.timeline) + 1,
+            "user_stopped_at": round(turn.user_stopped - self._started, 3),
+            **{f"{stage}_seconds": round(value, 3) for stage, value in durations.items()},
+        })
+        logger.debug(f"Session {self.session_id} turn latency: {durations[STAGE_TOTAL] * 1000:.0f} ms")
+
+    def summary(self) -> dict:
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def finish(self) -> Optional[Path]:
+        """Запись таймлайна сессии (один раз, при отключении)"""
+        if self._finished:
+            return None
+        self._finished = True
+        if not self.timeline_dir:
+            return None
+        directory = Path(self.timeline_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{datetime.fromtimestamp(self.started_at):%Y%m%d_%H%M%S}_{self.session_id}.json"
+        try:
+            path.write_text(json.dumps({
+                "session_id": self.session_id,
+                "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+                "duration_seconds": round(time.perf_counter() - self._started, 3),
+                "summary": self.summary(),
+                "turns": self.timeline,
+            }, ensure_ascii=False, indent=2), encoding="utf-8")
+        except OSError as e:
+            logger.error(f"Не удалось записать таймлайн задержек {path}: {e}")
+            return None
+        logger.info(f"Таймлайн задержек сессии {self.session_id}: {path}")
+        return path
+
+
+# Глобальный экземпляр
+latency_registry = LatencyRegistry()
+LATENCY_TIMELINE_DIR = os.getenv("AVATAR_LATENCY_DIR", "latency")
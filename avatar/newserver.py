@@ -1,5 +1,6 @@
 import os
 import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from loguru import logger
 from fastapi import FastAPI, Request, HTTPException
@@ -18,10 +19,35 @@ from pipecat.transports.base_transport import TransportParams
 from pipecat.transcriptions.language import Language
 from simli import SimliConfig
 from pipecat.services.simli.video import SimliVideoService
+from sessions import RegistryFull, SessionRegistry, new_session_id
 
 load_dotenv(override=True)
 
-app = FastAPI()
+
+async def close_bot_session(session: dict):
+    await session['task'].cancel()
+
+
+# Глобальные переменные для управления ботами: сессии без клиента и
+# завершившиеся без события отключения закрываются по таймаутам
+active_sessions: SessionRegistry[dict] = SessionRegistry(
+    close=close_bot_session,
+    is_active=lambda session: session['client_connected'] and not session['task'].has_finished(),
+    max_entries=int(os.getenv("AVATAR_MAX_CONNECTIONS", "32")),
+    connect_timeout=float(os.getenv("AVATAR_CONNECT_TIMEOUT_SECONDS", "30")),
+    idle_timeout=float(os.getenv("AVATAR_IDLE_TIMEOUT_SECONDS", "60")),
+    reap_interval=float(os.getenv("AVATAR_REAP_INTERVAL_SECONDS", "10")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await active_sessions.start()
+    yield
+    await active_sessions.drain()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,9 +57,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Глобальные переменные для управления ботами
-active_sessions = {}
-
 async def create_bot_session(session_id: str, request_data: dict = None):
     """Создает новую сессию бота"""
     
@@ -91,6 +114,8 @@ async def create_bot_session(session_id: str, request_data: dict = None):
     @transport.event_handler("on_client_connected")
     async def on_client_connected(transport, client):
         logger.info(f"Клиент подключился к сессии {session_id}")
+        session['client_connected'] = True
+        active_sessions.mark_connected(session_id)
         await task.queue_frames([
             LLMMessagesAppendFrame(
                 messages=[{
@@ -103,19 +128,22 @@ async def create_bot_session(session_id: str, request_data: dict = None):
     @transport.event_handler("on_client_disconnected")
     async def on_client_disconnected(transport, client):
         logger.info(f"Клиент отключился от сессии {session_id}")
-        if session_id in active_sessions:
-            del active_sessions[session_id]
+        session['client_connected'] = False
+        active_sessions.pop(session_id)
         await task.cancel()
 
-    # Сохраняем сессию
-    active_sessions[session_id] = {
+    # Сохраняем сессию (RegistryFull — достигнут предел сессий)
+    runner = PipelineRunner(handle_sigint=False)
+    session = {
         'transport': transport,
         'task': task,
-        'runner': PipelineRunner()
+        'runner': runner,
+        'client_connected': False,
     }
+    await active_sessions.add(session_id, session)
     
     # Запускаем задачу в фоне
-    asyncio.create_task(active_sessions[session_id]['runner'].run(task))
+    session['runner_task'] = asyncio.create_task(runner.run(task))
     
     return transport
 
@@ -124,7 +152,7 @@ async def connect_endpoint(request: Request):
     """Endpoint для SmallWebRTC подключения"""
     try:
         body = await request.json()
-        session_id = f"session_{len(active_sessions) + 1}"
+        session_id = new_session_id()
         
         # Создаем новую сессию бота
         transport = await create_bot_session(session_id, body)
@@ -138,6 +166,9 @@ async def connect_endpoint(request: Request):
             "message": "WebRTC session created"
         }
         
+    except RegistryFull as e:
+        logger.warning(f"Сессия отклонена: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка создания сессии: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -147,7 +178,7 @@ async def health_check():
     """Проверка состояния сервера"""
     return {
         "status": "healthy",
-        "active_sessions": len(active_sessions)
+        "active_sessions": active_sessions.stats()
     }
 
 if __name__ == "__main__":
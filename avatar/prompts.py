@@ -0,0 +1,208 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from string import Template
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+PROMPTS_DIR = Path(__file__).parent / "prompt_templates"
+
+# Шаблон разбирается один раз при импорте; подставляются только данные собеседования
+INTERVIEW_TEMPLATE = Template((PROMPTS_DIR / "interview.txt").read_text(encoding="utf-8"))
+
+
+class PromptUnavailable(Exception):
+    """Данные собеседования не удалось получить из бэкенда"""
+
+
+class InterviewNotFound(PromptUnavailable):
+    """Собеседования с такой ссылкой нет"""
+
+
+@dataclass(frozen=True)
+class InterviewContext:
+    """Данные собеседования из бэкенда, нужные для промпта"""
+    unique_link: Optional[str]
+    candidate_name: str
+    position: str
+    recommended_duration: int
+    knowledge_base: Optional[str] = None
+    description: Optional[str] = None
+
+    @classmethod
+    def from_backend(cls, data: dict) -> "InterviewContext":
+        return cls(
+            unique_link=data["unique_link"],
+            candidate_name=data["candidate_name"],
+            position=data["position"],
+            recommended_duration=data["recommended_duration"],
+            knowledge_base=data.get("knowledge_base"),
+            description=data.get("description"),
+        )
+
+
+# Собеседование по умолчанию — для подключений без ссылки (например, /prebuilt)
+DEFAULT_CONTEXT = InterviewContext(
+    unique_link=None,
+    candidate_name="",
+    position="Frontend Developer",
+    recommended_duration=5,
+    knowledge_base="React, TypeScript, JavaScript, HTML/CSS",
+    description="Собеседование на позицию Frontend разработчика с опытом работы от 3 лет",
+)
+DEFAULT_RESUME = (PROMPTS_DIR / "default_resume.txt").read_text(encoding="utf-8").strip()
+
+
+def render_static(context: InterviewContext) -> str:
+    """Неизменная часть промпта собеседования"""
+    vacancy = context.position
+    if context.knowledge_base:
+        vacancy += f", база знаний {context.knowledge_base}"
+    if context.description:
+        vacancy += f", описание: {context.description}"
+
+    if context is DEFAULT_CONTEXT:
+        resume = DEFAULT_RESUME
+    else:
+        resume = f"{context.candidate_name} (резюме не приложено, уточняй опыт у кандидата)"
+
+    return INTERVIEW_TEMPLATE.substitute(
+        vacancy=vacancy,
+        resume=resume,
+        duration=context.recommended_duration,
+    ).strip()
+
+
+def render_dynamic() -> str:
+    """Изменяемая часть промпта: только поля времени, вычисляются при каждом подключении"""
+    return f"Текущее время: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class PromptCache:
+    """Промпты собеседований по ``unique_link``.
+
+    Данные собеседования запрашиваются у бэкенда
+    (``GET {backend_url}/interviews/{unique_link}``), а отрендеренная
+    неизменная часть промпта хранится ``ttl`` секунд: переподключение
+    кандидата не ходит в бэкенд и не рендерит шаблон заново. Время
+    дописывается в конец при каждом вызове, так что неизменная часть
+    остаётся одинаковой между подключениями. Одновременные подключения к
+    одному собеседованию разделяют один запрос к бэкенду.
+
+    Собеседование по умолчанию выдаётся только подключениям без ссылки.
+    Если бэкенд не ответил и после ``retries`` повторов, ``get`` выбрасывает
+    ``PromptUnavailable``: кандидат не должен попасть на чужое собеседование.
+    """
+
+    def __init__(
+        self,
+        backend_url: str,
+        ttl: float = 600.0,
+        max_size: int = 256,
+        timeout: float = 3.0,
+        retries: int = 2,
+        retry_delay: float = 0.5,
+    ):
+        self.backend_url = backend_url.rstrip("/")
+        self.ttl = ttl
+        self.max_size = max_size
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+        self._entries: "OrderedDict[str, Tuple[float, InterviewContext, str]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._default_static = render_static(DEFAULT_CONTEXT)
+
+        # Счётчики для мониторинга
+        self.hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+        self.render_seconds = 0.0
+
+    async def _fetch(self, unique_link: str) -> InterviewContext:
+        url = f"{self.backend_url}/interviews/{unique_link}"
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            async with session.get(url) as response:
+                if response.status == 404:
+                    raise InterviewNotFound(f"Собеседование {unique_link} не найдено")
+                response.raise_for_status()
+                return InterviewContext.from_backend(await response.json())
+
+    async def _fetch_with_retries(self, unique_link: str) -> InterviewContext:
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._fetch(unique_link)
+            except InterviewNotFound:
+                raise
+            except Exception as e:
+                self.fetch_errors += 1
+                if attempt == self.retries:
+                    raise PromptUnavailable(f"Бэкенд не вернул собеседование {unique_link}: {e}") from e
+                logger.warning(f"Не удалось получить собеседование {unique_link} из бэкенда, повтор: {e}")
+                await asyncio.sleep(self.retry_delay * (attempt + 1))
+
+    async def _load(self, unique_link: str) -> Tuple[InterviewContext, str]:
+        context = await self._fetch_with_retries(unique_link)
+        started = time.perf_counter()
+        static = render_static(context)
+        self.render_seconds += time.perf_counter() - started
+
+        self._entries[unique_link] = (time.monotonic() + self.ttl, context, static)
+        self._entries.move_to_end(unique_link)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return context, static
+
+    async def get(self, unique_link: Optional[str]) -> Tuple[InterviewContext, str]:
+        """Данные собеседования и неизменная часть промпта; ``PromptUnavailable`` при ошибке бэкенда"""
+        if not unique_link:
+            return DEFAULT_CONTEXT, self._default_static
+
+        entry = self._entries.get(unique_link)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(unique_link)
+            return entry[1], entry[2]
+
+        self.misses += 1
+        task = self._loading.get(unique_link)
+        if task is None:
+            task = self._loading[unique_link] = asyncio.create_task(self._load(unique_link))
+            task.add_done_callback(lambda _: self._loading.pop(unique_link, None))
+        try:
+            return await asyncio.shield(task)
+        except PromptUnavailable as e:
+            logger.error(f"Промпт собеседования {unique_link} недоступен: {e}")
+            raise
+
+    async def system_instruction(self, unique_link: Optional[str]) -> Tuple[InterviewContext, str]:
+        """Данные собеседования и полный промпт для подключения"""
+        context, static = await self.get(unique_link)
+        return context, f"{static}\n\n{render_dynamic()}"
+
+    def invalidate(self, unique_link: str):
+        self._entries.pop(unique_link, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetch_errors": self.fetch_errors,
+            "render_ms_total": round(self.render_seconds * 1000, 3),
+        }
+
+
+# Глобальный экземпляр
+prompt_cache = PromptCache(
+    backend_url=os.getenv("BACKEND_URL", "http://localhost:8000/api/v1"),
+    ttl=float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "600")),
+    retries=int(os.getenv("PROMPT_FETCH_RETRIES", "2")),
+)
@@ -0,0 +1,251 @@
+import asyncio
+import math
+import os
+import resource
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+# Состояния сессии
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_REJECTED = "rejected"
+
+SessionFactory = Callable[[], Awaitable[None]]
+
+
+@dataclass
+class Admission:
+    """Решение о приёме сессии, которое возвращается клиенту"""
+    status: str
+    position: int = 0
+    estimated_wait_seconds: float = 0.0
+    reason: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "position": self.position,
+            "estimated_wait_seconds": round(self.estimated_wait_seconds, 1),
+            "reason": self.reason,
+        }
+
+
+@dataclass
+class _Session:
+    session_id: str
+    factory: SessionFactory
+    queued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def state(self) -> str:
+        return STATE_RUNNING if self.started_at is not None else STATE_QUEUED
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "session_id": self.session_id,
+            "state": self.state,
+            "queued_seconds": round((self.started_at or now) - self.queued_at, 1),
+            "running_seconds": round(now - self.started_at, 1) if self.started_at is not None else 0.0,
+        }
+
+
+class SessionScheduler:
+    """Ограничение числа одновременных сессий бота в процессе.
+
+    Каждая сессия держит соединения с Gemini Live, Simli и WebRTC, поэтому
+    больше ``max_sessions`` сессий одновременно не запускается. Лишние
+    ждут в очереди (не длиннее ``max_queue``) и запускаются по мере
+    освобождения мест; клиент получает позицию и оценку ожидания. Если
+    очередь полна или ожидание превысит ``max_wait_seconds``, сессия
+    отклоняется сразу — до создания WebRTC-соединения.
+
+    Оценка ожидания строится по средней длительности завершённых сессий
+    (до первых завершений — ``expected_session_seconds``).
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 4,
+        max_queue: int = 16,
+        max_wait_seconds: float = 600.0,
+        expected_session_seconds: float = 300.0,
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_seconds = max_wait_seconds
+        self.expected_session_seconds = expected_session_seconds
+
+        self._running: Dict[str, _Session] = {}
+        self._queue: "OrderedDict[str, _Session]" = OrderedDict()
+        self._avg_duration: Optional[float] = None
+
+        # Счётчики для мониторинга
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.abandoned = 0
+        self.total_wait_seconds = 0.0
+
+    @property
+    def session_seconds(self) -> float:
+        return self._avg_duration if self._avg_duration is not None else self.expected_session_seconds
+
+    def estimate_wait(self, position: int) -> float:
+        """Оценка ожидания для позиции в очереди (1 — первая)"""
+        if position <= 0:
+            return 0.0
+        now = time.monotonic()
+        remaining = sorted(
+            max(0.0, self.session_seconds - (now - session.started_at))
+            for session in self._running.values()
+        )
+        # Свободные места считаются освободившимися сразу
+        remaining = [0.0] * (self.max_sessions - len(remaining)) + remaining
+        rounds, slot = divmod(position - 1, self.max_sessions)
+        return remaining[slot] + rounds * self.session_seconds
+
+    def check(self) -> Admission:
+        """Решение для новой сессии без постановки в очередь"""
+        if len(self._running) < self.max_sessions and not self._queue:
+            return Admission(STATE_RUNNING)
+        position = len(self._queue) + 1
+        wait = self.estimate_wait(position)
+        if len(self._queue) >= self.max_queue:
+            return Admission(STATE_REJECTED, position, wait, "Очередь сессий заполнена")
+        if wait > self.max_wait_seconds:
+            return Admission(STATE_REJECTED, position, wait, "Ожидание превысит допустимое")
+        return Admission(STATE_QUEUED, position, wait)
+
+    def submit(self, session_id: str, factory: SessionFactory) -> Admission:
+        """Запуск сессии или постановка в очередь; ``factory`` создаёт корутину бота"""
+        admission = self.check()
+        if admission.status == STATE_REJECTED:
+            self.rejected += 1
+            logger.warning(f"Сессия {session_id} отклонена: {admission.reason}")
+            return admission
+
+        session = _Session(session_id, factory)
+        if admission.status == STATE_RUNNING:
+            self._start(session)
+        else:
+            self._queue[session_id] = session
+            self.queued += 1
+            logger.info(
+                f"Сессия {session_id} в очереди: позиция {admission.position}, "
+                f"ожидание ~{admission.estimated_wait_seconds:.0f} с"
+            )
+        return admission
+
+    def status(self, session_id: str) -> Optional[Admission]:
+        """Текущее положение сессии (для опроса клиентом из очереди)"""
+        if session_id in self._running:
+            return Admission(STATE_RUNNING)
+        for position, queued_id in enumerate(self._queue, start=1):
+            if queued_id == session_id:
+                return Admission(STATE_QUEUED, position, self.estimate_wait(position))
+        return None
+
+    def cancel(self, session_id: str):
+        """Клиент ушёл: сессия удаляется из очереди или останавливается"""
+        if self._queue.pop(session_id, None) is not None:
+            self.abandoned += 1
+            logger.info(f"Сессия {session_id} покинула очередь")
+            return
+        session = self._running.get(session_id)
+        if session is not None and session.task is not None:
+            session.task.cancel()
+
+    def _start(self, session: _Session):
+        session.started_at = time.monotonic()
+        self.total_wait_seconds += session.started_at - session.queued_at
+        self._running[session.session_id] = session
+        self.admitted += 1
+        session.task = asyncio.create_task(self._run(session), name=f"bot-{session.session_id}")
+
+    async def _run(self, session: _Session):
+        logger.info(f"Сессия {session.session_id} запущена ({len(self._running)}/{self.max_sessions})")
+        try:
+            await session.factory()
+            self.completed += 1
+        except asyncio.CancelledError:
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.exception(f"Сессия {session.session_id} завершилась с ошибкой: {e}")
+        finally:
+            duration = time.monotonic() - session.started_at
+            # Скользящее среднее длительности для оценки ожидания
+            self._avg_duration = duration if self._avg_duration is None else 0.8 * self._avg_duration + 0.2 * duration
+            self._running.pop(session.session_id, None)
+            logger.info(f"Сессия {session.session_id} завершена за {duration:.0f} с")
+            self._admit_next()
+
+    def _admit_next(self):
+        while self._queue and len(self._running) < self.max_sessions:
+            _, session = self._queue.popitem(last=False)
+            self._start(session)
+
+    async def shutdown(self):
+        """Отмена очереди и всех запущенных сессий"""
+        self.abandoned += len(self._queue)
+        self._queue.clear()
+        tasks = [session.task for session in self._running.values() if session.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        """Загрузка планировщика, сессии и ресурсы процесса"""
+        now = time.monotonic()
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "max_sessions": self.max_sessions,
+            "max_queue": self.max_queue,
+            "running": len(self._running),
+            "queued": len(self._queue),
+            "estimated_wait_seconds": round(self.check().estimated_wait_seconds, 1),
+            "avg_session_seconds": round(self.session_seconds, 1),
+            "admitted": self.admitted,
+            "queued_total": self.queued,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+            "avg_queue_wait_seconds": round(self.total_wait_seconds / self.admitted, 1) if self.admitted else 0.0,
+            "sessions": [session.to_dict(now) for session in (*self._running.values(), *self._queue.values())],
+            "process": {
+                "cpu_seconds": round(time.process_time(), 1),
+                "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+                "open_fds": _open_fds(),
+                "tasks": len(asyncio.all_tasks()),
+            },
+        }
+
+
+def _open_fds() -> Optional[int]:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def retry_after(admission: Admission) -> int:
+    """Значение заголовка Retry-After для отклонённой сессии"""
+    return max(1, math.ceil(min(admission.estimated_wait_seconds, 60)))
+
+
+# Глобальный экземпляр
+scheduler = SessionScheduler(
+    max_sessions=int(os.getenv("AVATAR_MAX_SESSIONS", "4")),
+    max_queue=int(os.getenv("AVATAR_MAX_QUEUE", "16")),
+    max_wait_seconds=float(os.getenv("AVATAR_MAX_WAIT_SECONDS", "600")),
+    expected_session_seconds=float(os.getenv("AVATAR_EXPECTED_SESSION_SECONDS", "300")),
+)
@@ -5,25 +5,41 @@
 #
 
 import argparse
-import asyncio
+import os
 import sys
 from contextlib import asynccontextmanager
-from typing import Dict
+from typing import Optional
 
 import uvicorn
-from bot import run_bot
+from bot import run_bot, simli_pool
 from dotenv import load_dotenv
-from fastapi import BackgroundTasks, FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
+from latency import latency_registry
 from loguru import logger
 from pipecat.transports.smallwebrtc.connection import IceServer, SmallWebRTCConnection
 from pipecat_ai_small_webrtc_prebuilt.frontend import SmallWebRTCPrebuiltUI
+from prompts import InterviewNotFound, PromptUnavailable, prompt_cache
+from scheduler import STATE_QUEUED, STATE_REJECTED, retry_after, scheduler
+from sessions import RegistryFull, SessionRegistry, new_session_id
 
 # Load environment variables
 load_dotenv(override=True)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Соединения с Simli прогреваются до первого кандидата
+    await simli_pool.start()
+    await peer_sessions.start()
+    yield  # Run app
+    await scheduler.shutdown()
+    await simli_pool.shutdown()
+    await peer_sessions.drain()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -31,8 +47,48 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-# Store connections by pc_id
-pcs_map: Dict[str, SmallWebRTCConnection] = {}
+
+
+class SessionConnection(SmallWebRTCConnection):
+    """WebRTC-соединение с pc_id из ``new_session_id``.
+
+    Свой pc_id pipecat берёт из счётчика объектов, который начинается
+    заново после перезапуска: клиент со старым pc_id попал бы в чужое
+    соединение. ``name`` подставляется в pc_id и при перезапуске ICE.
+    """
+
+    def __init__(self, session_id: str, ice_servers):
+        self._session_id = session_id
+        super().__init__(ice_servers)
+
+    @property
+    def name(self) -> str:
+        return self._session_id
+
+
+def _peer_active(pc: SmallWebRTCConnection) -> bool:
+    """Клиент на связи: пинги по data channel, а в очереди (бот ещё не подключён) — состояние ICE"""
+    if pc.is_connected():
+        return True
+    admission = scheduler.status(pc.pc_id)
+    return admission is not None and admission.status == STATE_QUEUED and pc.pc.connectionState == "connected"
+
+
+async def _close_peer(pc: SmallWebRTCConnection):
+    scheduler.cancel(pc.pc_id)
+    await pc.disconnect()
+
+
+# Соединения по pc_id: полуоткрытые и пропавшие без закрытия убираются по таймаутам
+peer_sessions: SessionRegistry[SmallWebRTCConnection] = SessionRegistry(
+    close=_close_peer,
+    is_active=_peer_active,
+    max_entries=int(os.getenv("AVATAR_MAX_CONNECTIONS", "32")),
+    connect_timeout=float(os.getenv("AVATAR_CONNECT_TIMEOUT_SECONDS", "30")),
+    idle_timeout=float(os.getenv("AVATAR_IDLE_TIMEOUT_SECONDS", "60")),
+    reap_interval=float(os.getenv("AVATAR_REAP_INTERVAL_SECONDS", "10")),
+    name="peers",
+)
 
 ice_servers = [
     IceServer(
@@ -50,45 +106,122 @@ async def root_redirect():
 
 
 @app.post("/api/offer")
-async def offer(request: dict, background_tasks: BackgroundTasks):
+async def offer(request: dict, interview: Optional[str] = None):
+    """WebRTC offer; ``interview`` — unique_link собеседования (в запросе или в теле как ``interview_link``)"""
     pc_id = request.get("pc_id")
+    interview_link = interview or request.get("interview_link")
     logger.info(f"rofl_answer: {request.get("rofl")}")
-    if pc_id and pc_id in pcs_map:
-        pipecat_connection = pcs_map[pc_id]
+    if pc_id and pc_id in peer_sessions:
+        pipecat_connection = peer_sessions.get(pc_id)
+        peer_sessions.touch(pc_id)
         logger.info(f"Reusing existing connection for pc_id: {pc_id}")
         await pipecat_connection.renegotiate(
             sdp=request["sdp"], type=request["type"], restart_pc=request.get("restart_pc", False)
         )
+        admission = scheduler.status(pc_id)
     else:
-        pipecat_connection = SmallWebRTCConnection(ice_servers)
-        await pipecat_connection.initialize(sdp=request["sdp"], type=request["type"])
+        # Отказ до создания WebRTC-соединения: перегруженный процесс не тратит на него ресурсы
+        admission = scheduler.check()
+        if admission.status == STATE_REJECTED:
+            return JSONResponse(
+                status_code=503,
+                content={"detail": admission.reason, "admission": admission.to_dict()},
+                headers={"Retry-After": str(retry_after(admission))},
+            )
+
+        # Без данных собеседования сессию не начинаем: промпт по умолчанию только для подключений без ссылки
+        try:
+            await prompt_cache.get(interview_link)
+        except InterviewNotFound as e:
+            return JSONResponse(status_code=404, content={"detail": str(e)})
+        except PromptUnavailable as e:
+            return JSONResponse(status_code=503, content={"detail": str(e)}, headers={"Retry-After": "5"})
+
+        pipecat_connection = SessionConnection(new_session_id(), ice_servers)
+        try:
+            await peer_sessions.add(pipecat_connection.pc_id, pipecat_connection)
+        except RegistryFull as e:
+            logger.warning(f"Peer connection rejected: {e}")
+            return JSONResponse(status_code=503, content={"detail": str(e)}, headers={"Retry-After": "30"})
+        try:
+            await pipecat_connection.initialize(sdp=request["sdp"], type=request["type"])
+        except BaseException:
+            await peer_sessions.discard(pipecat_connection.pc_id)
+            raise
+
+        @pipecat_connection.event_handler("connected")
+        async def handle_connected(webrtc_connection: SmallWebRTCConnection):
+            peer_sessions.mark_connected(webrtc_connection.pc_id)
 
         @pipecat_connection.event_handler("closed")
         async def handle_disconnected(webrtc_connection: SmallWebRTCConnection):
             logger.info(f"Discarding peer connection for pc_id: {webrtc_connection.pc_id}")
-            pcs_map.pop(webrtc_connection.pc_id, None)
-
-        background_tasks.add_task(run_bot, pipecat_connection)
+            peer_sessions.pop(webrtc_connection.pc_id)
+            scheduler.cancel(webrtc_connection.pc_id)
+
+        admission = scheduler.submit(pipecat_connection.pc_id, lambda: run_bot(pipecat_connection, interview_link))
+        if admission.status == STATE_REJECTED:
+            await peer_sessions.discard(pipecat_connection.pc_id)
+            return JSONResponse(
+                status_code=503,
+                content={"detail": admission.reason, "admission": admission.to_dict()},
+                headers={"Retry-After": str(retry_after(admission))},
+            )
 
     answer = pipecat_connection.get_answer()
-    # Updating the peer connection inside the map
-    pcs_map[answer["pc_id"]] = pipecat_connection
 
+    # Клиент в очереди видит позицию и оценку ожидания (обновляются через /api/sessions/{pc_id})
+    if admission is not None:
+        answer["admission"] = admission.to_dict()
     return answer
 
-    answer = pipecat_connection.get_answer()
-    # Updating the peer connection inside the map
-    pcs_map[answer["pc_id"]] = pipecat_connection
 
-    return answer
-
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    yield  # Run app
-    coros = [pc.disconnect() for pc in pcs_map.values()]
-    await asyncio.gather(*coros)
-    pcs_map.clear()
+@app.get("/api/sessions/{pc_id}")
+async def session_status(pc_id: str):
+    """Положение сессии: запущена или ждёт в очереди"""
+    admission = scheduler.status(pc_id)
+    # Опрос из очереди — признак, что клиент на связи
+    peer_sessions.touch(pc_id)
+    if admission is None:
+        return JSONResponse(status_code=404, content={"detail": "Сессия не найдена"})
+    return admission.to_dict()
+
+
+@app.get("/health")
+async def health_check():
+    """Состояние сервера: загрузка планировщика и ресурсы сессий"""
+    return {
+        "status": "healthy",
+        "peer_connections": peer_sessions.stats(),
+        "scheduler": scheduler.stats(),
+        "prompts": prompt_cache.stats(),
+        "simli_pool": simli_pool.stats(),
+        "latency": latency_registry.summary(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в текстовом формате Prometheus: задержки этапов, сессии, пул Simli"""
+    sessions = scheduler.stats()
+    pool = simli_pool.stats()
+    gauges = [
+        ("avatar_sessions_running", "gauge", "Running bot sessions", sessions["running"]),
+        ("avatar_sessions_queued", "gauge", "Bot sessions waiting in queue", sessions["queued"]),
+        ("avatar_sessions_rejected_total", "counter", "Rejected bot sessions", sessions["rejected"]),
+        ("avatar_peer_connections", "gauge", "Open WebRTC peer connections", len(peer_sessions)),
+        ("avatar_peer_connections_reaped_total", "counter", "Peer connections closed by the reaper", sum(peer_sessions.reaped.values())),
+        ("avatar_simli_pool_ready", "gauge", "Prewarmed Simli sessions", pool["ready"]),
+        ("avatar_simli_pool_warm_claims_total", "counter", "Sessions started with a warm Simli", pool["warm_claims"]),
+        ("avatar_simli_pool_cold_claims_total", "counter", "Sessions started with a cold Simli", pool["cold_claims"]),
+    ]
+    lines = []
+    for name, kind, help_text, value in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return PlainTextResponse(
+        latency_registry.prometheus() + "\n".join(lines) + "\n",
+        media_type="text/plain; version=0.0.4",
+    )
 
 
 if __name__ == "__main__":
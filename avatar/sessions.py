@@ -0,0 +1,219 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Generic, Iterator, List, Optional, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+# Причины удаления сессии
+REASON_HALF_OPEN = "half_open"
+REASON_IDLE = "idle"
+REASON_SHUTDOWN = "shutdown"
+
+
+class RegistryFull(Exception):
+    """Достигнут предел числа сессий"""
+
+
+def new_session_id() -> str:
+    """Уникальный идентификатор сессии (не повторяется после перезапуска процесса)"""
+    return uuid.uuid4().hex
+
+
+@dataclass
+class _Entry(Generic[T]):
+    session_id: str
+    value: T
+    created_at: float = field(default_factory=time.monotonic)
+    last_activity: float = field(default_factory=time.monotonic)
+    connected: bool = False
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "session_id": self.session_id,
+            "connected": self.connected,
+            "age_seconds": round(now - self.created_at, 1),
+            "idle_seconds": round(now - self.last_activity, 1),
+        }
+
+
+class SessionRegistry(Generic[T]):
+    """Реестр соединений с клиентами с ограничением размера и уборкой.
+
+    Соединение удаляется не только по событию закрытия: клиент может
+    пропасть без него (закрытая вкладка, обрыв сети), и тогда запись и
+    WebRTC-соединение висели бы до перезапуска. Раз в ``reap_interval``
+    секунд реестр закрывает:
+
+    - полуоткрытые соединения — не подключившиеся за ``connect_timeout``
+      секунд после создания (подключение отмечает ``mark_connected`` или
+      первая успешная проверка ``is_active``);
+    - простаивающие — без активности дольше ``idle_timeout`` секунд.
+      Активность отмечается через ``touch`` и проверкой ``is_active``.
+
+    Больше ``max_entries`` записей реестр не принимает (``RegistryFull``),
+    а при остановке сервера ``drain`` закрывает все соединения.
+    """
+
+    def __init__(
+        self,
+        close: Callable[[T], Awaitable[None]],
+        is_active: Optional[Callable[[T], bool]] = None,
+        max_entries: int = 32,
+        connect_timeout: float = 30.0,
+        idle_timeout: float = 60.0,
+        reap_interval: float = 10.0,
+        close_timeout: float = 5.0,
+        name: str = "sessions",
+    ):
+        self.close = close
+        self.is_active = is_active
+        self.max_entries = max(1, max_entries)
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.close_timeout = close_timeout
+        self.name = name
+
+        self._entries: Dict[str, _Entry[T]] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+        # Счётчики для мониторинга
+        self.added = 0
+        self.removed = 0
+        self.rejected = 0
+        self.reaped: Dict[str, int] = {REASON_HALF_OPEN: 0, REASON_IDLE: 0, REASON_SHUTDOWN: 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    @property
+    def full(self) -> bool:
+        return len(self._entries) >= self.max_entries
+
+    async def add(self, session_id: str, value: T):
+        """Регистрация соединения; при заполненном реестре сначала убираются мёртвые записи"""
+        if session_id in self._entries:
+            raise ValueError(f"Сессия {session_id} уже зарегистрирована")
+        if self.full:
+            await self.reap()
+        if self.full:
+            self.rejected += 1
+            raise RegistryFull(f"Достигнут предел соединений: {self.max_entries}")
+        self._entries[session_id] = _Entry(session_id, value)
+        self.added += 1
+
+    def get(self, session_id: str) -> Optional[T]:
+        entry = self._entries.get(session_id)
+        return entry.value if entry is not None else None
+
+    def touch(self, session_id: str):
+        """Отметка активности клиента"""
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry.last_activity = time.monotonic()
+
+    def mark_connected(self, session_id: str):
+        """Клиент подключился: запись больше не полуоткрытая"""
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry.connected = True
+            entry.last_activity = time.monotonic()
+
+    def pop(self, session_id: str) -> Optional[T]:
+        """Удаление записи без закрытия (соединение уже закрыто)"""
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+        self.removed += 1
+        return entry.value
+
+    async def discard(self, session_id: str, reason: Optional[str] = None):
+        """Удаление записи и закрытие соединения"""
+        value = self.pop(session_id)
+        if value is None:
+            return
+        if reason is not None:
+            self.reaped[reason] += 1
+            logger.info(f"Реестр {self.name}: закрытие сессии {session_id} ({reason})")
+        await self._close(session_id, value)
+
+    async def _close(self, session_id: str, value: T):
+        try:
+            await asyncio.wait_for(self.close(value), self.close_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Реестр {self.name}: сессия {session_id} не закрылась за {self.close_timeout} с")
+        except Exception as e:
+            logger.warning(f"Реестр {self.name}: ошибка закрытия сессии {session_id}: {e}")
+
+    def _expired(self, entry: _Entry[T], now: float) -> Optional[str]:
+        if self.is_active is not None:
+            try:
+                if self.is_active(entry.value):
+                    entry.connected = True
+                    entry.last_activity = now
+            except Exception as e:
+                logger.debug(f"Реестр {self.name}: ошибка проверки сессии {entry.session_id}: {e}")
+        if not entry.connected:
+            if now - entry.created_at >= self.connect_timeout:
+                return REASON_HALF_OPEN
+            return None
+        if now - entry.last_activity >= self.idle_timeout:
+            return REASON_IDLE
+        return None
+
+    async def reap(self) -> int:
+        """Закрытие полуоткрытых и простаивающих соединений; возвращает их число"""
+        now = time.monotonic()
+        expired = []
+        for entry in list(self._entries.values()):
+            reason = self._expired(entry, now)
+            if reason is not None:
+                expired.append((entry.session_id, reason))
+        await asyncio.gather(*(self.discard(session_id, reason) for session_id, reason in expired))
+        return len(expired)
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Реестр {self.name}: ошибка уборки: {e}")
+
+    async def start(self):
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop(), name=f"{self.name}-reaper")
+
+    async def drain(self):
+        """Остановка уборки и закрытие всех соединений (при остановке сервера)"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+        session_ids: List[str] = list(self._entries)
+        await asyncio.gather(*(self.discard(session_id, REASON_SHUTDOWN) for session_id in session_ids))
+        if session_ids:
+            logger.info(f"Реестр {self.name}: закрыто {len(session_ids)} сессий при остановке")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "connected": sum(1 for entry in self._entries.values() if entry.connected),
+            "added": self.added,
+            "removed": self.removed,
+            "rejected": self.rejected,
+            "reaped": dict(self.reaped),
+            "sessions": [entry.to_dict(now) for entry in self._entries.values()],
+        }
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+from loguru import logger
+
+
+@dataclass
+class _Item:
+    value: Any
+    warmed_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class Lease:
+    """Выданный из пула сервис; ``warm`` — было ли соединение готово заранее"""
+    value: Any
+    warm: bool
+    claim_seconds: float
+    released: bool = False
+
+
+class WarmPool:
+    """Пул заранее установленных соединений с внешними сервисами.
+
+    ``factory`` создаёт сервис и выполняет рукопожатие с ним — это делается
+    в фоне, пока кандидата ещё нет, и при подключении ``claim`` отдаёт
+    готовый сервис. Если готовых нет, ``claim`` ждёт уже начатый прогрев
+    не дольше ``claim_wait`` секунд, а затем создаёт сервис сам (холодный
+    старт). Соединение, пролежавшее в пуле дольше ``idle_timeout`` секунд,
+    закрывается и заменяется новым: внешние сервисы обрывают простаивающие
+    сессии.
+
+    Сессии собеседования одноразовые, поэтому ``release`` по умолчанию не
+    возвращает сервис в пул, а только закрывает его (если это ещё не
+    сделал конвейер).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        close: Callable[[Any], Awaitable[None]],
+        size: int = 1,
+        idle_timeout: float = 25.0,
+        claim_wait: float = 1.0,
+        retry_delay: float = 5.0,
+        name: str = "pool",
+    ):
+        self.factory = factory
+        self.close = close
+        self.size = max(0, size)
+        self.idle_timeout = idle_timeout
+        self.claim_wait = claim_wait
+        self.retry_delay = retry_delay
+        self.name = name
+
+        self._ready: List[_Item] = []
+        self._warming: Set[asyncio.Task] = set()
+        self._ready_event = asyncio.Event()
+        self._reaper: Optional[asyncio.Task] = None
+        self._closing: Set[asyncio.Task] = set()
+        self._failed_at = 0.0
+        self._running = False
+
+        # Счётчики для мониторинга
+        self.warmed = 0
+        self.warm_claims = 0
+        self.cold_claims = 0
+        self.recycled = 0
+        self.failures = 0
+        self.warmup_seconds = 0.0
+        self.warm_claim_seconds = 0.0
+        self.cold_claim_seconds = 0.0
+
+    async def start(self):
+        if self._running or self.size == 0:
+            return
+        self._running = True
+        self._fill()
+        self._reaper = asyncio.create_task(self._reap(), name=f"{self.name}-reaper")
+        logger.info(f"Пул {self.name}: прогрев {self.size} соединений")
+
+    async def shutdown(self):
+        """Остановка прогрева и закрытие всех готовых соединений"""
+        self._running = False
+        tasks = [*self._warming, *([self._reaper] if self._reaper else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._reaper = None
+        items, self._ready = self._ready, []
+        await asyncio.gather(*(self._close(item.value) for item in items), *self._closing, return_exceptions=True)
+
+    def _fill(self):
+        """Запуск прогрева до ``size`` готовых и прогреваемых соединений"""
+        if not self._running:
+            return
+        if time.monotonic() - self._failed_at < self.retry_delay:
+            # После ошибки прогрева не долбим внешний сервис в цикле
+            return
+        while len(self._ready) + len(self._warming) < self.size:
+            task = asyncio.create_task(self._warm_one(), name=f"{self.name}-warmup")
+            self._warming.add(task)
+            task.add_done_callback(self._warming.discard)
+
+    async def _warm_one(self):
+        started = time.monotonic()
+        try:
+            value = await self.factory()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            self._failed_at = time.monotonic()
+            logger.error(f"Пул {self.name}: ошибка прогрева соединения: {e}")
+            return
+        self.warmed += 1
+        self.warmup_seconds += time.monotonic() - started
+        if not self._running:
+            await self._close(value)
+            return
+        self._ready.append(_Item(value))
+        self._ready_event.set()
+
+    def _take(self) -> Optional[_Item]:
+        now = time.monotonic()
+        while self._ready:
+            # Самое свежее соединение дольше проживёт у кандидата
+            item = self._ready.pop()
+            if now - item.warmed_at < self.idle_timeout:
+                return item
+            self._recycle(item)
+        self._ready_event.clear()
+        return None
+
+    async def claim(self) -> Lease:
+        """Готовый сервис из пула или, если его нет, созданный на месте"""
+        started = time.monotonic()
+        item = self._take()
+        if item is None and self._warming and self.claim_wait > 0:
+            # Прогрев уже идёт: дождаться его обычно быстрее холодного старта
+            try:
+                await asyncio.wait_for(self._ready_event.wait(), self.claim_wait)
+            except asyncio.TimeoutError:
+                pass
+            item = self._take()
+
+        if item is not None:
+            self._fill()
+            elapsed = time.monotonic() - started
+            self.warm_claims += 1
+            self.warm_claim_seconds += elapsed
+            return Lease(item.value, warm=True, claim_seconds=elapsed)
+
+        self._fill()
+        value = await self.factory()
+        elapsed = time.monotonic() - started
+        self.cold_claims += 1
+        self.cold_claim_seconds += elapsed
+        logger.warning(f"Пул {self.name}: холодный старт за {elapsed * 1000:.0f} мс")
+        return Lease(value, warm=False, claim_seconds=elapsed)
+
+    async def release(self, lease: Lease, reusable: bool = False, close: bool = True):
+        """Возврат сервиса после сессии.
+
+        ``reusable`` — сервис можно выдать повторно (вернётся в пул как
+        свежий); ``close=False`` — сервис уже закрыт владельцем.
+        """
+        if lease.released:
+            return
+        lease.released = True
+        if reusable and self._running and len(self._ready) < self.size:
+            self._ready.append(_Item(lease.value))
+            self._ready_event.set()
+            return
+        if close:
+            await self._close(lease.value)
+
+    def _recycle(self, item: _Item):
+        self.recycled += 1
+        task = asyncio.create_task(self._close(item.value))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, value: Any):
+        try:
+            await self.close(value)
+        except Exception as e:
+            logger.warning(f"Пул {self.name}: ошибка закрытия соединения: {e}")
+
+    async def _reap(self):
+        """Замена соединений, простоявших дольше ``idle_timeout``"""
+        interval = max(0.1, self.idle_timeout / 5)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            expired = [item for item in self._ready if now - item.warmed_at >= self.idle_timeout]
+            if expired:
+                self._ready = [item for item in self._ready if item not in expired]
+                for item in expired:
+                    self._recycle(item)
+                logger.debug(f"Пул {self.name}: пересоздание {len(expired)} простаивающих соединений")
+            self._fill()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "ready": len(self._ready),
+            "warming": len(self._warming),
+            "warmed": self.warmed,
+            "warm_claims": self.warm_claims,
+            "cold_claims": self.cold_claims,
+            "recycled": self.recycled,
+            "failures": self.failures,
+            "avg_warmup_ms": round(self.warmup_seconds / self.warmed * 1000, 1) if self.warmed else 0.0,
+            "avg_warm_claim_ms": round(self.warm_claim_seconds / self.warm_claims * 1000, 1) if self.warm_claims else 0.0,
+            "avg_cold_claim_ms": round(self.cold_claim_seconds / self.cold_claims * 1000, 1) if self.cold_claims else 0.0,
+        }
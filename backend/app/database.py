@@ -1,29 +1,143 @@
-from sqlmodel import SQLModel, create_engine, Session
-from typing import Annotated
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from typing import Annotated, AsyncIterator
 from fastapi import Depends
 import os
 
 # Настройка базы данных
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./interviews.db")
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./interviews.db")
 
-# Создание движка базы данных
-engine = create_engine(
-    DATABASE_URL,
-    echo=True,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# Профиль: development — лог всех SQL-запросов и настройки SQLite по умолчанию,
+# production — без лога запросов и с PRAGMA для конкурентной нагрузки
+DB_PROFILE = os.getenv("DB_PROFILE", "development")
+PROFILE_PRODUCTION = "production"
 
+# PRAGMA, выполняемые на каждом новом соединении SQLite в production-профиле.
+# WAL позволяет читателям не ждать писателя; synchronous=NORMAL в режиме WAL
+# делает fsync только при checkpoint, а не на каждом commit
+SQLITE_PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("DB_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Отрицательное значение — размер кэша в КиБ
+    "cache_size": -int(os.getenv("DB_SQLITE_CACHE_KB", "65536")),
+    "busy_timeout": int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY"
+}
 
-def create_db_and_tables():
+# Синхронные драйверы заменяются на асинхронные аналоги
+ASYNC_DRIVERS = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgres://": "postgresql+asyncpg://"
+}
+
+
+def _async_url(url: str) -> str:
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+def _engine_options(url: str, profile: str) -> dict:
+    """Параметры пула соединений из переменных окружения"""
+    default_echo = "false" if profile == PROFILE_PRODUCTION else "true"
+    options = {
+        "echo": os.getenv("DB_ECHO", default_echo).lower() in ("1", "true", "yes"),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    }
+
+    if url.startswith("sqlite") and (":memory:" in url or url.endswith("://")):
+        # База в памяти живёт только внутри одного соединения
+        options["poolclass"] = StaticPool
+        options["connect_args"] = {"check_same_thread": False}
+        return options
+
+    options.update(
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    )
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def _install_sqlite_pragmas(engine: AsyncEngine, pragmas: dict):
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def build_engine(url: str, profile: str = DB_PROFILE) -> AsyncEngine:
+    """Создание асинхронного движка с параметрами выбранного профиля"""
+    url = _async_url(url)
+    engine = create_async_engine(url, **_engine_options(url, profile))
+    if profile == PROFILE_PRODUCTION and url.startswith("sqlite"):
+        _install_sqlite_pragmas(engine, SQLITE_PRODUCTION_PRAGMAS)
+    return engine
+
+
+ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+
+# Создание асинхронного движка базы данных
+engine = build_engine(ASYNC_DATABASE_URL)
+
+# expire_on_commit=False: после commit атрибуты объектов остаются доступны
+# без повторного (блокирующего в async-коде) обращения к базе
+async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def _create_missing_indexes(connection):
+    """Индексы, добавленные в модели после создания таблиц.
+
+    ``create_all`` создаёт индексы только вместе с новой таблицей, поэтому
+    для уже существующей базы недостающие индексы создаются отдельно.
+    """
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def _add_missing_columns(connection):
+    """Необязательные колонки, добавленные в модели после создания таблиц"""
+    inspector = inspect(connection)
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+
+
+async def create_db_and_tables():
     """Создание всех таблиц в базе данных"""
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
+
+
+async def dispose_engine():
+    """Закрытие всех соединений пула"""
+    await engine.dispose()
 
 
-def get_session():
+async def get_session() -> AsyncIterator[AsyncSession]:
     """Получение сессии базы данных"""
-    with Session(engine) as session:
+    async with async_session_maker() as session:
         yield session
 
 
 # Тип зависимости для сессии
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
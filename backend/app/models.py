@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from enum import Enum
 
 
@@ -68,6 +69,12 @@ class ChatMessageBase(SQLModel):
 
 
 class ChatMessage(ChatMessageBase, table=True):
+    # История собеседования читается по порядку (timestamp, id) —
+    # составной индекс покрывает и фильтр, и сортировку, и курсор
+    __table_args__ = (
+        Index("ix_chatmessage_interview_timestamp_id", "interview_id", "timestamp", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     interview_id: int = Field(foreign_key="interview.id")
     
@@ -75,6 +82,12 @@ class ChatMessage(ChatMessageBase, table=True):
     interview: Optional[Interview] = Relationship(back_populates="chat_messages")
 
 
+class IdSequence(SQLModel, table=True):
+    """Общий для всех процессов backend счётчик id (выдаётся блоками)"""
+    name: str = Field(primary_key=True)
+    next_value: int
+
+
 class ChatMessageCreate(SQLModel):
     content: str
     role: MessageRole
@@ -90,4 +103,36 @@ class SpeechRecognitionResult(SQLModel):
     text: str
     language: str
     confidence: float
+    # Уровень качества декодирования: full, greedy или fast
+    tier: str = "full"
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+
+class TranscriptJobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class TranscriptJobBase(SQLModel):
+    interview_id: int = Field(foreign_key="interview.id", unique=True)
+    status: TranscriptJobStatus = Field(default=TranscriptJobStatus.PENDING)
+    attempts: int = 0
+    last_error: Optional[str] = None
+    # sha256 канонической транскрипции в хранилище и адрес сжатого объекта
+    content_key: Optional[str] = None
+    storage_path: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Время захвата задачи воркером; по нему находятся задачи упавших воркеров
+    claimed_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class TranscriptJob(TranscriptJobBase, table=True):
+    # Одна задача на собеседование: повторный finish возвращает ту же задачу
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+
+class TranscriptJobPublic(TranscriptJobBase):
+    id: int
@@ -1,87 +1,65 @@
-from fastapi import APIRouter, HTTPException, status, WebSocket, WebSocketDisconnect
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, status, WebSocket, WebSocketDisconnect, Query, Response
+from typing import List, Optional
+from datetime import datetime
 import json
 import logging
 
-from ..database import SessionDep, get_session
-from ..models import ChatMessageCreate, ChatMessagePublic, MessageRole, ChatMessage, Interview
+from ..database import SessionDep
+from ..models import ChatMessageCreate, ChatMessagePublic, MessageRole, ChatMessage
+from ..services.chat_service import ChatService
+from ..services.broadcast import broadcast
+from ..services.connection_manager import build_connection_manager
+from ..services.interview_cache import interview_cache
+from ..services.message_writer import message_writer
+from ..services import ws_protocol
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 logger = logging.getLogger(__name__)
 
-# Хранение активных WebSocket соединений
-active_connections: Dict[int, List[WebSocket]] = {}
-
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-    
-    async def connect(self, websocket: WebSocket, interview_id: int):
-        await websocket.accept()
-        if interview_id not in self.active_connections:
-            self.active_connections[interview_id] = []
-        self.active_connections[interview_id].append(websocket)
-        logger.info(f"WebSocket подключение для собеседования {interview_id}")
-    
-    def disconnect(self, websocket: WebSocket, interview_id: int):
-        if interview_id in self.active_connections:
-            self.active_connections[interview_id].remove(websocket)
-            if not self.active_connections[interview_id]:
-                del self.active_connections[interview_id]
-        logger.info(f"WebSocket отключение для собеседования {interview_id}")
-    
-    async def send_message_to_interview(self, message: dict, interview_id: int):
-        if interview_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[interview_id]:
-                try:
-                    await connection.send_text(json.dumps(message, ensure_ascii=False))
-                except:
-                    disconnected.append(connection)
-            
-            # Удаление отключенных соединений
-            for connection in disconnected:
-                self.disconnect(connection, interview_id)
-
-
-manager = ConnectionManager()
+# Соединения чата; сообщения доходят до участников на всех воркерах
+manager = build_connection_manager("chat", broadcast)
 
 
 @router.websocket("/{interview_id}/ws")
 async def websocket_endpoint(websocket: WebSocket, interview_id: int):
-    """WebSocket соединение для чата"""
+    """WebSocket соединение для чата.
+
+    Подпротокол ``vtb.msgpack.v1`` — бинарные msgpack-кадры, без него —
+    текстовые JSON-кадры (см. ``ws_protocol``).
+    """
     await manager.connect(websocket, interview_id)
     
     try:
         while True:
-            data = await websocket.receive_text()
             try:
-                message_data = json.loads(data)
-                
+                message_data = await ws_protocol.receive(websocket)
+            except json.JSONDecodeError:
+                manager.send_to_connection(websocket, {
+                    "error": "Неверный формат JSON"
+                })
+                continue
+            except ValueError as e:
+                manager.send_to_connection(websocket, {
+                    "error": str(e)
+                })
+                continue
+            
+            try:
                 # Проверка обязательных полей
                 if "content" not in message_data or "role" not in message_data:
-                    await websocket.send_text(json.dumps({
+                    manager.send_to_connection(websocket, {
                         "error": "Отсутствуют обязательные поля: content, role"
-                    }))
+                    })
                     continue
                 
-                # Создание сообщения в базе данных
-                session_gen = get_session()
-                session = next(session_gen)
-                
                 try:
-                    # Создание сообщения в базе данных
-                    saved_message = ChatMessage(
-                        content=message_data["content"],
-                        role=MessageRole(message_data["role"]),
-                        interview_id=interview_id
+                    # Сообщение получает id сразу, а в базу попадёт пакетом позже
+                    saved_message = await message_writer.write(
+                        interview_id,
+                        message_data["content"],
+                        MessageRole(message_data["role"])
                     )
                     
-                    session.add(saved_message)
-                    session.commit()
-                    session.refresh(saved_message)
-                    
                     # Отправка всем подключенным клиентам
                     response_message = {
                         "id": saved_message.id,
@@ -98,37 +76,65 @@ async def websocket_endpoint(websocket: WebSocket, interview_id: int):
                     
                 except Exception as e:
                     logger.error(f"Ошибка при сохранении сообщения: {e}")
-                    await websocket.send_text(json.dumps({
+                    manager.send_to_connection(websocket, {
                         "error": f"Ошибка при сохранении сообщения: {str(e)}"
-                    }))
-                finally:
-                    session.close()
+                    })
                     
-            except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
-                    "error": "Неверный формат JSON"
-                }))
             except ValueError as e:
-                await websocket.send_text(json.dumps({
+                manager.send_to_connection(websocket, {
                     "error": f"Неверное значение роли: {str(e)}"
-                }))
+                })
                 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, interview_id)
+        pass
+    finally:
+        await manager.disconnect(websocket, interview_id)
+
+
+# Заголовок с курсором следующей страницы истории
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
 
 @router.get("/{interview_id}/messages", response_model=List[ChatMessagePublic])
-async def get_chat_messages(interview_id: int, session: SessionDep):
-    """Получение всех сообщений чата для собеседования"""
+async def get_chat_messages(
+    interview_id: int,
+    session: SessionDep,
+    response: Response,
+    after_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    limit: int = Query(200, ge=1, le=1000)
+):
+    """Получение сообщений чата для собеседования (постранично).
+
+    Если страница заполнена целиком, id её последнего сообщения возвращается
+    в заголовке ``X-Next-Cursor`` — его нужно передать как ``after_id``.
+    Переподключившийся клиент может запросить только новые сообщения через
+    ``after_id`` (последний полученный id) или ``since`` (время).
+    """
     # Проверка существования собеседования
-    interview = session.query(Interview).filter(Interview.id == interview_id).first()
-    if not interview:
+    if not await interview_cache.exists(interview_id, session):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Собеседование не найдено"
         )
     
-    messages = session.query(ChatMessage).filter(ChatMessage.interview_id == interview_id).order_by(ChatMessage.timestamp).all()
+    # Все принятые сообщения должны быть в базе до чтения истории
+    await message_writer.flush()
+    
+    after = None
+    if after_id is not None:
+        after = await session.get(ChatMessage, after_id)
+        if not after or after.interview_id != interview_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Неизвестный курсор after_id"
+            )
+    
+    messages = await ChatService.get_interview_messages(
+        interview_id, session, after=after, since=since, limit=limit
+    )
+    if len(messages) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(messages[-1].id)
     return messages
 
 
@@ -136,23 +142,14 @@ async def get_chat_messages(interview_id: int, session: SessionDep):
 async def send_message(interview_id: int, message_data: ChatMessageCreate, session: SessionDep):
     """Отправка сообщения в чат (альтернатива WebSocket)"""
     # Проверка существования собеседования
-    interview = session.query(Interview).filter(Interview.id == interview_id).first()
-    if not interview:
+    if not await interview_cache.exists(interview_id, session):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Собеседование не найдено"
         )
     
     # Создание сообщения
-    message = ChatMessage(
-        content=message_data.content,
-        role=message_data.role,
-        interview_id=interview_id
-    )
-    
-    session.add(message)
-    session.commit()
-    session.refresh(message)
+    message = await message_writer.write(interview_id, message_data.content, message_data.role)
     
     # Отправка через WebSocket всем подключенным клиентам
     response_message = {
@@ -172,8 +169,7 @@ async def send_message(interview_id: int, message_data: ChatMessageCreate, sessi
 async def send_ai_message(interview_id: int, content: dict, session: SessionDep):
     """Отправка сообщения от AI HR (заглушка)"""
     # Проверка существования собеседования
-    interview = session.query(Interview).filter(Interview.id == interview_id).first()
-    if not interview:
+    if not await interview_cache.exists(interview_id, session):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Собеседование не найдено"
@@ -186,15 +182,7 @@ async def send_ai_message(interview_id: int, content: dict, session: SessionDep)
         )
     
     # Создание сообщения от AI
-    message = ChatMessage(
-        content=content["message"],
-        role=MessageRole.AI_HR,
-        interview_id=interview_id
-    )
-    
-    session.add(message)
-    session.commit()
-    session.refresh(message)
+    message = await message_writer.write(interview_id, content["message"], MessageRole.AI_HR)
     
     # Отправка через WebSocket
     response_message = {
@@ -1,24 +1,40 @@
-from fastapi import APIRouter, HTTPException, status, WebSocket, WebSocketDisconnect
-from typing import List, Dict
+from fastapi import APIRouter, Header, HTTPException, Query, status, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Dict, Optional
+from contextlib import aclosing
 from datetime import datetime
+import asyncio
 import json
 import uuid
 
-from ..database import SessionDep
+
+from ..database import SessionDep, async_session_maker
 from ..models import (
     InterviewCreate, 
     InterviewPublic, 
     InterviewStatus,
     Interview,
-    ChatMessage,
-    ChatMessageCreate,
-    MessageRole
+    TranscriptJob,
+    TranscriptJobPublic
+)
+from ..services.broadcast import broadcast
+from ..services.connection_manager import build_connection_manager
+from ..services.interview_cache import interview_cache
+from ..services.interview_events import (
+    EVENT_ASR_FINAL, EVENT_ASR_PARTIAL, EVENT_STATUS, EVENT_TRANSCRIPT_FAILED, EVENT_TRANSCRIPT_READY,
+    interview_events
 )
+from ..services.message_writer import message_writer
+from ..services.transcript_exporter import FORMAT_NDJSON, MEDIA_TYPES, export_transcript
+from ..services.transcript_jobs import transcript_jobs
+from ..services.transcript_service import transcript_service
+from ..services.streaming_asr import StreamingTranscriber
+from ..services import ws_protocol
 
 router = APIRouter(prefix="/interviews", tags=["interviews"])
 
-# Хранилище активных WebSocket соединений
-active_connections: Dict[str, List[WebSocket]] = {}
+# Соединения собеседований; события доходят до участников на всех воркерах
+connections = build_connection_manager("interview", broadcast)
 
 
 @router.post("/", response_model=InterviewPublic)
@@ -39,8 +55,9 @@ async def create_interview(interview_data: InterviewCreate, session: SessionDep)
         )
         
         session.add(interview)
-        session.commit()
-        session.refresh(interview)
+        await session.commit()
+        await session.refresh(interview)
+        await interview_cache.put(interview)
         
         # Возвращаем интервью с полной ссылкой
         response_data = {
@@ -58,7 +75,7 @@ async def create_interview(interview_data: InterviewCreate, session: SessionDep)
 @router.get("/{unique_link}", response_model=InterviewPublic)
 async def get_interview_by_link(unique_link: str, session: SessionDep):
     """Получение собеседования по уникальной ссылке"""
-    interview = session.query(Interview).filter(Interview.unique_link == unique_link).first()
+    interview = await interview_cache.get_by_link(unique_link, session)
     if not interview:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -70,7 +87,7 @@ async def get_interview_by_link(unique_link: str, session: SessionDep):
 @router.patch("/{interview_id}/start")
 async def start_interview(interview_id: int, session: SessionDep):
     """Начало собеседования"""
-    interview = session.query(Interview).filter(Interview.id == interview_id).first()
+    interview = await session.get(Interview, interview_id)
     if not interview:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -79,103 +96,264 @@ async def start_interview(interview_id: int, session: SessionDep):
     
     interview.status = InterviewStatus.STARTED
     interview.started_at = datetime.utcnow()
-    session.commit()
+    await session.commit()
+    await _interview_changed(interview)
+    
+    await interview_events.publish(interview_id, EVENT_STATUS, _status_data(interview))
     
     return {"message": "Собеседование начато", "interview_id": interview_id}
 
 
 @router.patch("/{interview_id}/finish")
 async def finish_interview(interview_id: int, session: SessionDep):
-    """Завершение собеседования и создание транскрипции"""
-    interview = session.query(Interview).filter(Interview.id == interview_id).first()
+    """Завершение собеседования и постановка задачи на создание транскрипции.
+
+    Транскрипция создаётся в фоне; о готовности сообщает событие
+    ``transcript_ready`` в WebSocket собеседования, статус доступен по
+    ``/interviews/transcript-jobs/{job_id}``. Повторный вызов идемпотентен.
+    """
+    interview = await session.get(Interview, interview_id)
     if not interview:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Собеседование не найдено"
         )
     
-    # Вычисление фактической длительности
-    actual_duration = None
-    if interview.started_at:
-        duration_delta = datetime.utcnow() - interview.started_at
-        actual_duration = int(duration_delta.total_seconds())
-    
-    # Обновление статуса
-    interview.status = InterviewStatus.FINISHED
-    interview.finished_at = datetime.utcnow()
-    interview.actual_duration = actual_duration
-    session.commit()
-    
-    # Получение сообщений чата
-    messages = session.query(ChatMessage).filter(ChatMessage.interview_id == interview_id).all()
-    
-    # Создание простого текстового файла транскрипции
-    try:
-        import os
-        transcript_dir = "transcripts"
-        os.makedirs(transcript_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"interview_{interview_id}_{interview.unique_link[:8]}_{timestamp}"
-        
-        # JSON файл
-        json_path = os.path.join(transcript_dir, f"{filename}.json")
-        transcript_data = {
-            "interview_id": interview_id,
-            "candidate_name": interview.candidate_name,
-            "position": interview.position,
-            "start_time": interview.started_at.isoformat() if interview.started_at else None,
-            "end_time": interview.finished_at.isoformat() if interview.finished_at else None,
-            "duration_seconds": actual_duration,
-            "messages": [
-                {
-                    "role": msg.role.value,
-                    "content": msg.content,
-                    "timestamp": msg.timestamp.isoformat()
-                }
-                for msg in messages
-            ]
-        }
-        
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(transcript_data, f, ensure_ascii=False, indent=2)
+    if interview.status != InterviewStatus.FINISHED:
+        # Вычисление фактической длительности
+        actual_duration = None
+        if interview.started_at:
+            duration_delta = datetime.utcnow() - interview.started_at
+            actual_duration = int(duration_delta.total_seconds())
         
-        # Текстовый файл
-        txt_path = os.path.join(transcript_dir, f"{filename}.txt")
-        with open(txt_path, 'w', encoding='utf-8') as f:
-            f.write(f"ТРАНСКРИПЦИЯ СОБЕСЕДОВАНИЯ\n")
-            f.write(f"Кандидат: {interview.candidate_name}\n")
-            f.write(f"Позиция: {interview.position}\n")
-            f.write(f"Время начала: {interview.started_at}\n")
-            f.write(f"Время окончания: {interview.finished_at}\n")
-            f.write(f"Длительность: {actual_duration} секунд\n")
-            f.write("="*50 + "\n\n")
-            
-            for msg in messages:
-                role_name = "AI HR" if msg.role == MessageRole.AI_HR else "Кандидат" if msg.role == MessageRole.CANDIDATE else "Рекрутер"
-                f.write(f"[{msg.timestamp.strftime('%H:%M:%S')}] {role_name}: {msg.content}\n")
+        # Обновление статуса
+        interview.status = InterviewStatus.FINISHED
+        interview.finished_at = datetime.utcnow()
+        interview.actual_duration = actual_duration
+        await session.commit()
+        await _interview_changed(interview)
         
-        interview.transcript_file_path = json_path
-        session.commit()
-        
-        return {
-            "message": "Собеседование завершено",
-            "interview_id": interview_id,
-            "actual_duration": actual_duration,
-            "transcript_path": json_path,
-            "text_transcript_path": txt_path
-        }
+        await interview_events.publish(interview_id, EVENT_STATUS, _status_data(interview))
+    
+    # Журнал запечатывает задача транскрипции (с ожиданием остальных
+    # воркеров), поэтому ответ не ждёт seal_settle
+    try:
+        job = await transcript_jobs.submit(interview_id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Ошибка при создании транскрипции: {str(e)}"
+            detail=f"Ошибка при создании задачи транскрипции: {str(e)}"
+        )
+    
+    return {
+        "message": "Собеседование завершено",
+        "interview_id": interview_id,
+        "actual_duration": interview.actual_duration,
+        "transcript_job_id": job.id,
+        "transcript_status": job.status
+    }
+
+
+@router.get("/transcript-jobs/{job_id}", response_model=TranscriptJobPublic)
+async def get_transcript_job(job_id: int):
+    """Статус задачи создания транскрипции"""
+    job = await transcript_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача транскрипции не найдена"
+        )
+    return job
+
+
+def _parse_range(range_header: str, size: int) -> tuple:
+    """Разбор заголовка Range вида bytes=start-end, bytes=start- или bytes=-suffix"""
+    try:
+        unit, spec = range_header.split("=", 1)
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError
+        start_text, end_text = spec.strip().split("-", 1)
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text) + 1, size) if end_text else size
+        else:
+            start, end = max(size - int(end_text), 0), size
+    except ValueError:
+        start, end = size, size
+
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Запрошенный диапазон вне транскрипции",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+@router.get("/transcript-jobs/{job_id}/content")
+async def get_stored_transcript(job_id: int, format: str = FORMAT_NDJSON, range_header: Optional[str] = Header(default=None, alias="Range")):
+    """Готовая транскрипция из хранилища.
+
+    ndjson отдаётся как есть и поддерживает заголовок Range для чтения
+    части большой транскрипции; json и txt строятся на лету.
+    """
+    if format not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестный формат транскрипции. Доступные форматы: {', '.join(MEDIA_TYPES)}"
+        )
+    
+    job = await transcript_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача транскрипции не найдена"
+        )
+    if not job.content_key:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Транскрипция ещё не готова"
+        )
+    
+    filename = f"interview_{job.interview_id}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    if format == FORMAT_NDJSON:
+        headers["Accept-Ranges"] = "bytes"
+        headers["ETag"] = f'"{job.content_key}"'
+        if range_header:
+            size = await transcript_service.size(job.content_key)
+            start, end = _parse_range(range_header, size)
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+            return Response(
+                content=await transcript_service.read_range(job.content_key, start, end),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=MEDIA_TYPES[format],
+                headers=headers
+            )
+    
+    return StreamingResponse(
+        transcript_service.render(job.content_key, format),
+        media_type=MEDIA_TYPES[format],
+        headers=headers
+    )
+
+
+@router.get("/{interview_id}/transcript")
+async def download_transcript(interview_id: int, session: SessionDep, format: str = "json"):
+    """Скачивание транскрипции потоком (json, ndjson или txt) без создания файла"""
+    if format not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестный формат транскрипции. Доступные форматы: {', '.join(MEDIA_TYPES)}"
         )
+    
+    interview = await interview_cache.get_by_id(interview_id, session)
+    if not interview:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Собеседование не найдено"
+        )
+    
+    # Отложенные сообщения чата должны попасть в выгрузку
+    await message_writer.flush()
+    
+    async def body():
+        # Сессия зависимости закрывается до отправки тела ответа,
+        # поэтому курсор открывается в собственной сессии
+        async with async_session_maker() as stream_session:
+            async for chunk in export_transcript(interview, stream_session, format):
+                yield chunk.encode("utf-8")
+    
+    filename = f"interview_{interview_id}_{interview.unique_link[:8]}.{format}"
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+async def _interview_changed(interview: Interview):
+    """Сброс устаревших копий собеседования в кэшах всех воркеров"""
+    await interview_cache.invalidate(interview.id, interview.unique_link)
+    await interview_cache.put(interview)
+
+
+def _status_data(interview: InterviewPublic) -> dict:
+    """Состояние собеседования для событий status и snapshot"""
+    return {
+        "status": interview.status.value,
+        "started_at": interview.started_at.isoformat() if interview.started_at else None,
+        "finished_at": interview.finished_at.isoformat() if interview.finished_at else None,
+        "actual_duration": interview.actual_duration,
+        "recommended_duration": interview.recommended_duration
+    }
+
+
+async def _event_snapshot(interview_id: int) -> dict:
+    interview = await interview_cache.get_by_id(interview_id)
+    if not interview:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Собеседование не найдено"
+        )
+    return _status_data(interview)
+
+
+def _sse(event: Optional[dict]) -> str:
+    """Событие в формате text/event-stream; None — комментарий для поддержания соединения"""
+    if event is None:
+        return ": keepalive\n\n"
+    lines = []
+    if event["id"] is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/{interview_id}/events")
+async def interview_event_stream(
+    interview_id: int,
+    last_event_id: Optional[int] = Query(default=None),
+    last_event_id_header: Optional[str] = Header(default=None, alias="Last-Event-ID")
+):
+    """Поток событий собеседования (Server-Sent Events) вместо опроса ``/status``.
+
+    События: ``snapshot`` (текущее состояние), ``status`` (начало и
+    завершение), ``tick`` (длительность идущего собеседования),
+    ``transcript_ready``/``transcript_failed``, ``asr_partial``/``asr_final``.
+    EventSource при переподключении сам передаёт заголовок Last-Event-ID и
+    получает только пропущенные события; ``last_event_id`` в запросе — то же
+    для клиентов, которые не умеют задавать заголовки.
+    """
+    if last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    # Проверка существования до ответа; снимок для потока читается после подписки
+    await _event_snapshot(interview_id)
+
+    async def body():
+        # Клиент переподключается через 3 секунды после обрыва
+        yield "retry: 3000\n\n"
+        # aclosing: при обрыве соединения слушатель снимается сразу, а не при сборке мусора
+        async with aclosing(
+            interview_events.stream(interview_id, lambda: _event_snapshot(interview_id), last_event_id)
+        ) as events:
+            async for event in events:
+                yield _sse(event)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/{interview_id}/status")
 async def get_interview_status(interview_id: int, session: SessionDep):
-    """Получение статуса собеседования"""
-    interview = session.query(Interview).filter(Interview.id == interview_id).first()
+    """Получение статуса собеседования (для разового запроса; для
+    отслеживания изменений — поток ``/events``)"""
+    interview = await interview_cache.get_by_id(interview_id, session)
     if not interview:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -191,43 +369,118 @@ async def get_interview_status(interview_id: int, session: SessionDep):
     }
 
 
+async def _broadcast_to_interview(interview_id: int, message: dict):
+    """Отправка события всем подключенным клиентам собеседования"""
+    # Из промежуточных результатов распознавания медленному клиенту нужен только последний
+    coalesce_key = "asr_partial" if message.get("type") == "asr_partial" else None
+    await connections.send_message_to_interview(message, interview_id, coalesce_key=coalesce_key)
+
+    # Результаты распознавания дублируются в поток событий; промежуточные
+    # не буферизуются — после переподключения они уже не нужны
+    if message.get("type") in (EVENT_ASR_PARTIAL, EVENT_ASR_FINAL):
+        await interview_events.publish(
+            interview_id, message["type"], message, durable=message["type"] == EVENT_ASR_FINAL
+        )
+
+
+async def _notify_transcript_finished(job: TranscriptJob):
+    """Уведомление участников собеседования о готовности транскрипции"""
+    event_type = EVENT_TRANSCRIPT_READY if job.content_key else EVENT_TRANSCRIPT_FAILED
+    message = {
+        "type": event_type,
+        "interview_id": job.interview_id,
+        "job_id": job.id,
+        "status": job.status,
+        "content_key": job.content_key,
+        "transcript_url": f"/api/v1/interviews/transcript-jobs/{job.id}/content" if job.content_key else None,
+        "error": job.last_error
+    }
+    await _broadcast_to_interview(job.interview_id, message)
+    await interview_events.publish(job.interview_id, event_type, message)
+
+
+transcript_jobs.on_finished = _notify_transcript_finished
+
+
+@router.websocket("/{interview_id}/events/ws")
+async def interview_event_websocket(websocket: WebSocket, interview_id: int, last_event_id: Optional[int] = None):
+    """Поток событий собеседования через WebSocket (те же события, что и SSE).
+
+    Соединение только на отправку; для продолжения после обрыва клиент
+    передаёт id последнего полученного события в ``last_event_id``.
+    """
+    try:
+        await _event_snapshot(interview_id)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    protocol = await ws_protocol.accept(websocket)
+
+    async def pump():
+        async with aclosing(
+            interview_events.stream(interview_id, lambda: _event_snapshot(interview_id), last_event_id)
+        ) as events:
+            async for event in events:
+                if event is not None:
+                    await ws_protocol.send(websocket, event, protocol)
+        # Поток прерван (переполнение или остановка) — клиент переподключится
+        await websocket.close(code=1013)
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        # Входящие кадры не нужны, но без чтения не узнать об отключении клиента
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
+        pump_task.cancel()
+
+
 @router.websocket("/{interview_id}/ws")
 async def websocket_endpoint(websocket: WebSocket, interview_id: int):
-    """WebSocket соединение для интервью"""
-    await websocket.accept()
-    
-    # Добавляем соединение в список активных
-    if str(interview_id) not in active_connections:
-        active_connections[str(interview_id)] = []
-    active_connections[str(interview_id)].append(websocket)
+    """WebSocket соединение для интервью.
+
+    С подпротоколом ``vtb.msgpack.v1`` аудио передаётся в поле ``data``
+    сырыми байтами, без него — в JSON строкой base64.
+    """
+    await connections.connect(websocket, interview_id)
+
+    # Потоковое распознавание речи этого участника (создаётся при первом аудио)
+    transcriber: Optional[StreamingTranscriber] = None
     
     try:
         while True:
             # Получаем данные от клиента
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = await ws_protocol.receive(websocket)
             
             # Обрабатываем разные типы сообщений
             if message_data["type"] == "chat_message":
-                # Отправляем сообщение всем подключенным клиентам
-                for connection in active_connections[str(interview_id)]:
-                    if connection != websocket:  # Не отправляем отправителю
-                        try:
-                            await connection.send_text(data)
-                        except:
-                            # Удаляем неактивные соединения
-                            active_connections[str(interview_id)].remove(connection)
+                # Отправляем сообщение всем подключенным клиентам, кроме отправителя
+                await connections.send_message_to_interview(message_data, interview_id, exclude=websocket)
             
             elif message_data["type"] == "audio_data":
-                # Обработка аудиоданных для транскрипции
-                # Здесь можно интегрировать с Whisper сервисом
-                pass
+                # Аудио приходит как s16le PCM (байты или base64); результаты
+                # распознавания рассылаются всем участникам собеседования
+                if transcriber is None:
+                    transcriber = StreamingTranscriber(
+                        interview_id,
+                        send=lambda event: _broadcast_to_interview(interview_id, event),
+                        language=message_data.get("language"),
+                        sample_rate=message_data.get("sample_rate", 16000)
+                    )
+                    transcriber.start()
+                transcriber.feed(ws_protocol.binary_field(message_data["data"]))
             
             elif message_data["type"] == "video_data":
                 # Обработка видеоданных
                 pass
                 
     except WebSocketDisconnect:
+        pass
+    finally:
         # Удаляем соединение при отключении
-        if str(interview_id) in active_connections:
-            active_connections[str(interview_id)].remove(websocket)
+        await connections.disconnect(websocket, interview_id)
+        if transcriber is not None:
+            # close дожидается цикла распознавания и распознаёт остаток
+            await transcriber.close()
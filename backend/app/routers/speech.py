@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, WebSocket, WebSocketDisconnect
 from typing import Optional
+import json
 import logging
 
 from ..database import SessionDep
 from ..models import SpeechRecognitionResult
 from ..services.whisper_service import whisper_service
-from ..services.interview_service import InterviewService
+from ..services.batch_scheduler import DeadlineExceeded
+from ..services.streaming_asr import StreamingTranscriber
+from ..services.interview_cache import interview_cache
 
 router = APIRouter(prefix="/speech", tags=["speech"])
 logger = logging.getLogger(__name__)
@@ -21,8 +24,7 @@ async def transcribe_audio(
     """Распознавание речи из аудио файла"""
     
     # Проверка существования собеседования
-    interview = InterviewService.get_interview_by_id(interview_id, session)
-    if not interview:
+    if not await interview_cache.exists(interview_id, session):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Собеседование не найдено"
@@ -46,15 +48,16 @@ async def transcribe_audio(
             )
         
         # Распознавание речи
-        text, detected_language, confidence = await whisper_service.transcribe_audio(
-            audio_data, language
+        text, detected_language, confidence, tier = await whisper_service.transcribe_audio(
+            audio_data, language, content_type=audio_file.content_type
         )
         
         # Создание результата
         result = SpeechRecognitionResult(
             text=text,
             language=detected_language,
-            confidence=confidence
+            confidence=confidence,
+            tier=tier
         )
         
         # Логирование результата
@@ -66,6 +69,14 @@ async def transcribe_audio(
             "success": True
         }
         
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        logger.warning(f"Превышено время ожидания распознавания (собеседование {interview_id}): {e}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Превышено время ожидания распознавания речи"
+        )
     except Exception as e:
         logger.error(f"Ошибка при распознавании речи: {e}")
         raise HTTPException(
@@ -84,8 +95,7 @@ async def transcribe_realtime_audio(
     """Распознавание речи в реальном времени (для WebRTC потоков)"""
     
     # Проверка существования собеседования
-    interview = InterviewService.get_interview_by_id(interview_id, session)
-    if not interview:
+    if not await interview_cache.exists(interview_id, session):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Собеседование не найдено"
@@ -99,7 +109,7 @@ async def transcribe_realtime_audio(
     
     try:
         # Распознавание речи
-        text, detected_language, confidence = await whisper_service.transcribe_audio(
+        text, detected_language, confidence, tier = await whisper_service.transcribe_audio(
             audio_data, language
         )
         
@@ -107,7 +117,8 @@ async def transcribe_realtime_audio(
         result = SpeechRecognitionResult(
             text=text,
             language=detected_language,
-            confidence=confidence
+            confidence=confidence,
+            tier=tier
         )
         
         # Логирование результата
@@ -120,6 +131,12 @@ async def transcribe_realtime_audio(
             "success": True
         }
         
+    except DeadlineExceeded as e:
+        logger.warning(f"Превышено время ожидания распознавания (собеседование {interview_id}): {e}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Превышено время ожидания распознавания речи"
+        )
     except Exception as e:
         logger.error(f"Ошибка при распознавании речи в реальном времени: {e}")
         raise HTTPException(
@@ -128,18 +145,79 @@ async def transcribe_realtime_audio(
         )
 
 
+@router.websocket("/stream/{interview_id}")
+async def stream_transcription(
+    websocket: WebSocket,
+    interview_id: int,
+    language: Optional[str] = None,
+    sample_rate: int = 16000
+):
+    """Потоковое распознавание речи.
+
+    Клиент отправляет бинарные кадры s16le PCM (моно, ``sample_rate`` Гц),
+    сервер отвечает событиями ``asr_partial`` по мере поступления аудио и
+    ``asr_final`` на конце каждой фразы. Текстовое сообщение
+    ``{"type": "stop"}`` завершает поток с финальным распознаванием остатка.
+    """
+    # Проверка существования собеседования до принятия соединения
+    if not await interview_cache.exists(interview_id):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def send_event(event: dict):
+        await websocket.send_text(json.dumps(event, ensure_ascii=False))
+
+    transcriber = StreamingTranscriber(
+        interview_id,
+        send=send_event,
+        language=language,
+        sample_rate=sample_rate
+    )
+    transcriber.start()
+    logger.info(f"Потоковое распознавание запущено (собеседование {interview_id})")
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes"):
+                transcriber.feed(message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except json.JSONDecodeError:
+                    await send_event({"error": "Неверный формат JSON"})
+                    continue
+                if control.get("type") == "stop":
+                    await transcriber.close()
+                    await websocket.close()
+                    break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # close() дожидается цикла распознавания и дописывает остаток
+        await transcriber.close()
+        logger.info(f"Потоковое распознавание завершено (собеседование {interview_id})")
+
+
 @router.get("/health")
 async def speech_health_check():
     """Проверка состояния сервиса распознавания речи"""
     try:
         # Инициализация модели если ещё не инициализирована
-        if whisper_service.model is None:
+        if not whisper_service.model_loaded:
             whisper_service.initialize_model()
         
         return {
             "status": "healthy",
-            "model_loaded": whisper_service.model is not None,
-            "model_size": whisper_service.model_size
+            "model_loaded": whisper_service.model_loaded,
+            "model_size": whisper_service.model_size,
+            "warmed_up": whisper_service.warmed_up,
+            "startup_timings": whisper_service.startup_timings,
+            "scheduler": whisper_service.stats()
         }
     except Exception as e:
         logger.error(f"Ошибка при проверке состояния сервиса речи: {e}")
@@ -0,0 +1,162 @@
+import io
+import struct
+from typing import Optional
+
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16000
+
+# Коды форматов из заголовка WAV
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+RAW_PCM_CONTENT_TYPES = ("audio/pcm", "audio/l16", "audio/x-raw", "audio/s16le")
+
+
+class AudioDecodeError(Exception):
+    """Аудио не удалось декодировать в памяти"""
+
+
+def _to_mono(samples: np.ndarray, channels: int) -> np.ndarray:
+    if channels == 1:
+        return samples
+    return samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+
+def resample(audio: np.ndarray, sample_rate: int, target_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Передискретизация float32 сигнала в памяти.
+
+    Для кратных частот (48 кГц, 32 кГц -> 16 кГц) используется усреднение
+    по окну с прореживанием, для остальных — линейная интерполяция.
+    """
+    if sample_rate == target_rate or len(audio) == 0:
+        return audio
+
+    if sample_rate > target_rate and sample_rate % target_rate == 0:
+        factor = sample_rate // target_rate
+        usable = len(audio) - len(audio) % factor
+        return audio[:usable].reshape(-1, factor).mean(axis=1, dtype=np.float32)
+
+    duration = len(audio) / sample_rate
+    target_length = int(round(duration * target_rate))
+    source_positions = np.arange(target_length, dtype=np.float64) * (sample_rate / target_rate)
+    return np.interp(source_positions, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def _pcm_to_float32(data: memoryview, bits_per_sample: int, format_tag: int) -> np.ndarray:
+    """Преобразование сырых сэмплов в float32 без промежуточных копий байтов"""
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        if bits_per_sample == 32:
+            return np.frombuffer(data, dtype="<f4")
+        if bits_per_sample == 64:
+            return np.frombuffer(data, dtype="<f8").astype(np.float32)
+        raise AudioDecodeError(f"Неподдерживаемая разрядность float WAV: {bits_per_sample}")
+
+    if bits_per_sample == 16:
+        return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    if bits_per_sample == 32:
+        return (np.frombuffer(data, dtype="<i4") / 2147483648.0).astype(np.float32)
+    if bits_per_sample == 8:
+        return (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if bits_per_sample == 24:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        samples = (
+            raw[:, 0].astype(np.int32)
+            | (raw[:, 1].astype(np.int32) << 8)
+            | (raw[:, 2].astype(np.int32) << 16)
+        )
+        samples = np.where(samples >= 1 << 23, samples - (1 << 24), samples)
+        return samples.astype(np.float32) / 8388608.0
+
+    raise AudioDecodeError(f"Неподдерживаемая разрядность PCM: {bits_per_sample}")
+
+
+def decode_wav(audio_data: bytes) -> np.ndarray:
+    """Разбор RIFF/WAVE напрямую из байтов"""
+    view = memoryview(audio_data)
+    if len(view) < 12 or view[0:4] != b"RIFF" or view[8:12] != b"WAVE":
+        raise AudioDecodeError("Нет заголовка RIFF/WAVE")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", view, offset + 4)[0]
+        body_start = offset + 8
+
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or body_start + 16 > len(view):
+                raise AudioDecodeError("Усечённый чанк fmt")
+            format_tag, channels, sample_rate = struct.unpack_from("<HHI", view, body_start)
+            bits_per_sample = struct.unpack_from("<H", view, body_start + 14)[0]
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40 and body_start + 26 <= len(view):
+                # Реальный формат лежит в первых двух байтах SubFormat GUID
+                format_tag = struct.unpack_from("<H", view, body_start + 24)[0]
+            if channels == 0 or sample_rate == 0 or bits_per_sample == 0 or bits_per_sample % 8:
+                raise AudioDecodeError(
+                    f"Некорректный заголовок WAV: каналов {channels}, "
+                    f"частота {sample_rate}, разрядность {bits_per_sample}"
+                )
+            fmt = (format_tag, channels, sample_rate, bits_per_sample)
+
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioDecodeError("Чанк data идёт раньше fmt")
+            format_tag, channels, sample_rate, bits_per_sample = fmt
+            if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+                raise AudioDecodeError(f"Сжатый WAV (формат {format_tag:#x})")
+
+            # Потоковые записи часто пишут размер 0 или 0xFFFFFFFF
+            data_end = len(view) if chunk_size in (0, 0xFFFFFFFF) else min(len(view), body_start + chunk_size)
+            frame_size = channels * bits_per_sample // 8
+            data_end -= (data_end - body_start) % frame_size
+
+            samples = _pcm_to_float32(view[body_start:data_end], bits_per_sample, format_tag)
+            return resample(_to_mono(samples, channels), sample_rate)
+
+        # Чанки выровнены по чётной границе
+        offset = body_start + chunk_size + (chunk_size & 1)
+
+    raise AudioDecodeError("В WAV не найден чанк data")
+
+
+def decode_pcm(audio_data: bytes, sample_rate: int = TARGET_SAMPLE_RATE, channels: int = 1) -> np.ndarray:
+    """Декодирование сырого s16le PCM"""
+    usable = len(audio_data) - len(audio_data) % (2 * channels)
+    samples = _pcm_to_float32(memoryview(audio_data)[:usable], 16, WAVE_FORMAT_PCM)
+    return resample(_to_mono(samples, channels), sample_rate)
+
+
+def decode_container(audio_data: bytes) -> np.ndarray:
+    """Декодирование Opus/WebM/Ogg/MP3 через PyAV из буфера в памяти"""
+    # Импорт здесь: PyAV тяжёлый и нужен только для сжатых форматов
+    from faster_whisper.audio import decode_audio
+
+    try:
+        return decode_audio(io.BytesIO(audio_data), sampling_rate=TARGET_SAMPLE_RATE)
+    except Exception as e:
+        raise AudioDecodeError(f"PyAV не смог декодировать поток: {e}") from e
+
+
+def decode_audio_bytes(
+    audio_data: bytes,
+    content_type: Optional[str] = None,
+    pcm_sample_rate: int = TARGET_SAMPLE_RATE
+) -> np.ndarray:
+    """Декодирование аудио в float32 массив 16 кГц без временных файлов.
+
+    Выбрасывает ``AudioDecodeError``, если формат нельзя разобрать в памяти —
+    в этом случае вызывающий код может откатиться на путь через файл.
+    """
+    if not audio_data:
+        raise AudioDecodeError("Пустые аудио данные")
+
+    if audio_data[:4] == b"RIFF":
+        return decode_wav(audio_data)
+
+    if content_type and content_type.split(";")[0].strip().lower() in RAW_PCM_CONTENT_TYPES:
+        return decode_pcm(audio_data, sample_rate=pcm_sample_rate)
+
+    # Ogg/Opus, WebM, MP3 и прочее — формат определяет сам PyAV
+    return decode_container(audio_data)
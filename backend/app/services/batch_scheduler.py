@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """Запрос не был обработан до истечения дедлайна"""
+
+
+@dataclass
+class _PendingRequest:
+    payload: Any
+    future: asyncio.Future
+    enqueued_at: float
+    deadline: Optional[float]
+
+
+class BatchScheduler:
+    """Планировщик, собирающий запросы из разных корутин в пакеты.
+
+    Запросы копятся в очереди в течение короткого окна (не дольше
+    ``max_wait_ms``) или до достижения ``max_batch_size``, после чего весь
+    пакет одним вызовом ``batch_fn`` выполняется в пуле потоков. Результаты
+    раздаются ожидающим корутинам в том же порядке.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        executor: Executor,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_concurrent_batches: int = 1,
+        name: str = "batch",
+        on_dispatch: Optional[Callable[[List[float]], None]] = None
+    ):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.name = name
+        # Вызывается с временами ожидания в очереди для каждого пакета
+        self.on_dispatch = on_dispatch
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+        # Счётчики для мониторинга
+        self.batches_dispatched = 0
+        self.requests_dispatched = 0
+        self.requests_expired = 0
+        self.total_queue_wait = 0.0
+
+    def _ensure_worker(self):
+        """Ленивый запуск фоновой задачи в текущем event loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.create_task(self._run(), name=f"{self.name}-scheduler")
+
+    async def submit(self, payload: Any, timeout: Optional[float] = None) -> Any:
+        """Постановка запроса в очередь и ожидание результата.
+
+        Если ``timeout`` задан и результат не готов к дедлайну,
+        выбрасывается ``DeadlineExceeded``; запрос, ещё не попавший
+        в пакет, при этом не будет обработан.
+        """
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        request = _PendingRequest(
+            payload=payload,
+            future=loop.create_future(),
+            enqueued_at=now,
+            deadline=now + timeout if timeout else None
+        )
+        self._queue.put_nowait(request)
+
+        try:
+            return await asyncio.wait_for(request.future, timeout)
+        except asyncio.TimeoutError:
+            self.requests_expired += 1
+            raise DeadlineExceeded(f"Запрос не обработан за {timeout:.2f} с")
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+
+            # Пока все слоты заняты, новые запросы продолжают копиться в очереди
+            await self._slots.acquire()
+
+            batch = [first]
+            window_end = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[_PendingRequest]):
+        try:
+            now = time.monotonic()
+            live = []
+            for request in batch:
+                # Корутина уже отменена или истёк её дедлайн
+                if request.future.done():
+                    continue
+                if request.deadline is not None and now > request.deadline:
+                    request.future.set_exception(DeadlineExceeded("Дедлайн истёк в очереди"))
+                    continue
+                live.append(request)
+
+            if not live:
+                return
+
+            self.batches_dispatched += 1
+            self.requests_dispatched += len(live)
+            waits = [now - r.enqueued_at for r in live]
+            self.total_queue_wait += sum(waits)
+            if self.on_dispatch is not None:
+                try:
+                    self.on_dispatch(waits)
+                except Exception as e:
+                    logger.error(f"Ошибка в обработчике on_dispatch {self.name}: {e}")
+
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(
+                    self.executor,
+                    self.batch_fn,
+                    [r.payload for r in live]
+                )
+            except Exception as e:
+                logger.error(f"Ошибка при обработке пакета {self.name}: {e}")
+                for request in live:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                return
+
+            for request, result in zip(live, results):
+                if request.future.done():
+                    continue
+                if isinstance(result, Exception):
+                    request.future.set_exception(result)
+                else:
+                    request.future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика планировщика"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batches_inflight": len(self._inflight),
+            "batches_dispatched": self.batches_dispatched,
+            "requests_dispatched": self.requests_dispatched,
+            "requests_expired": self.requests_expired,
+            "avg_batch_size": (
+                self.requests_dispatched / self.batches_dispatched if self.batches_dispatched else 0.0
+            ),
+            "avg_queue_wait_ms": (
+                self.total_queue_wait / self.requests_dispatched * 1000 if self.requests_dispatched else 0.0
+            ),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
+    async def shutdown(self):
+        """Остановка фоновой задачи"""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        self._worker = None
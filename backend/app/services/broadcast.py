@@ -0,0 +1,279 @@
+import asyncio
+from abc import ABC, abstractmethod
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Обработчик сообщения канала: получает текст опубликованного сообщения
+MessageCallback = Callable[[str], Awaitable[None]]
+
+# Идентификатор процесса: отличает соединения разных воркеров uvicorn
+NODE_ID = uuid.uuid4().hex[:12]
+
+
+class BroadcastBackend(ABC):
+    """Публикация сообщений по каналам между процессами.
+
+    Каждый воркер подписывается на каналы тех собеседований, у которых есть
+    его локальные соединения; сообщение, опубликованное любым воркером,
+    получают все подписанные воркеры, включая отправителя. ``increment`` —
+    счётчик, общий для тех же процессов (например, id событий собеседования).
+    """
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    @abstractmethod
+    async def subscribe(self, channel: str, callback: MessageCallback):
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str):
+        ...
+
+    @abstractmethod
+    async def increment(self, key: str) -> int:
+        """Общий для всех процессов счётчик: следующее значение (с 1)"""
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "node_id": NODE_ID}
+
+
+class InMemoryBroadcast(BroadcastBackend):
+    """Рассылка внутри одного процесса (один воркер uvicorn)"""
+
+    def __init__(self):
+        self._callbacks: Dict[str, MessageCallback] = {}
+        self._counters: Dict[str, int] = {}
+
+    async def subscribe(self, channel: str, callback: MessageCallback):
+        self._callbacks[channel] = callback
+
+    async def unsubscribe(self, channel: str):
+        self._callbacks.pop(channel, None)
+
+    async def publish(self, channel: str, message: str):
+        callback = self._callbacks.get(channel)
+        if callback is not None:
+            await callback(message)
+
+    async def increment(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    def stats(self) -> dict:
+        return {**super().stats(), "channels": len(self._callbacks)}
+
+
+class RedisBroadcast(BroadcastBackend):
+    """Рассылка через Redis pub/sub для нескольких воркеров и узлов.
+
+    ``client`` — асинхронный клиент с интерфейсом ``redis.asyncio``
+    (``publish`` и ``pubsub``); если не передан, создаётся по ``url``.
+    Все подписки воркера обслуживает одно соединение pub/sub и одна
+    фоновая задача чтения.
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None, poll_timeout: float = 1.0):
+        self.url = url
+        self.poll_timeout = poll_timeout
+        self._client = client
+        self._pubsub = None
+        self._callbacks: Dict[str, MessageCallback] = {}
+        self._subscribed = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+
+        # Счётчики для мониторинга
+        self.published = 0
+        self.received = 0
+
+    async def connect(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("Для рассылки через Redis нужен пакет redis")
+            self._client = redis.from_url(self.url, decode_responses=True)
+        self._pubsub = self._client.pubsub()
+        self._reader = asyncio.create_task(self._read(), name="broadcast-redis")
+        logger.info(f"Рассылка WebSocket через Redis подключена (узел {NODE_ID})")
+
+    async def disconnect(self):
+        if self._reader and not self._reader.done():
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def subscribe(self, channel: str, callback: MessageCallback):
+        self._callbacks[channel] = callback
+        await self._pubsub.subscribe(channel)
+        self._subscribed.set()
+
+    async def unsubscribe(self, channel: str):
+        self._callbacks.pop(channel, None)
+        await self._pubsub.unsubscribe(channel)
+        if not self._callbacks:
+            self._subscribed.clear()
+
+    async def publish(self, channel: str, message: str):
+        await self._client.publish(channel, message)
+        self.published += 1
+
+    async def increment(self, key: str) -> int:
+        return int(await self._client.incr(key))
+
+    async def _read(self):
+        while True:
+            # Без подписок соединение pub/sub не читается
+            await self._subscribed.wait()
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=self.poll_timeout
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка чтения из Redis pub/sub: {e}")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+
+            if message is None or message.get("type") != "message":
+                continue
+
+            channel, data = message["channel"], message["data"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            if isinstance(data, bytes):
+                data = data.decode("utf-8")
+
+            callback = self._callbacks.get(channel)
+            if callback is None:
+                continue
+            self.received += 1
+            try:
+                await callback(data)
+            except Exception as e:
+                logger.error(f"Ошибка доставки сообщения канала {channel}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "channels": len(self._callbacks),
+            "published": self.published,
+            "received": self.received
+        }
+
+
+class InMemoryRedis:
+    """Заглушка Redis в памяти: pub/sub и строковые ключи с TTL.
+
+    Несколько ``RedisBroadcast`` с общим экземпляром ведут себя как воркеры,
+    подключённые к одному серверу Redis. Поддерживает подмножество API
+    ``redis.asyncio``, нужное ``RedisBroadcast`` и общему кэшу собеседований.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set["_InMemoryPubSub"]] = {}
+        self._values: Dict[str, tuple] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ex: Optional[float] = None) -> bool:
+        self._values[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._values.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        expires_at = self._values[key][1] if key in self._values else None
+        self._values[key] = (str(value), expires_at)
+        return value
+
+    def pubsub(self) -> "_InMemoryPubSub":
+        return _InMemoryPubSub(self)
+
+    async def publish(self, channel: str, message: str) -> int:
+        subscribers = self._subscribers.get(channel, set())
+        for pubsub in subscribers:
+            pubsub.queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(subscribers)
+
+    async def aclose(self):
+        pass
+
+
+class _InMemoryPubSub:
+    def __init__(self, server: InMemoryRedis):
+        self.server = server
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self.server._subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels:
+            subscribers = self.server._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(self)
+                if not subscribers:
+                    del self.server._subscribers[channel]
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        await self.unsubscribe(*[
+            channel for channel, subscribers in self.server._subscribers.items() if self in subscribers
+        ])
+
+
+def build_broadcast() -> BroadcastBackend:
+    """Бэкенд рассылки по переменной окружения BROADCAST_URL.
+
+    ``memory://`` (по умолчанию) — один процесс, ``redis://host:port/db`` —
+    несколько воркеров и узлов через Redis pub/sub.
+    """
+    url = os.getenv("BROADCAST_URL", "memory://")
+    if url.startswith("memory://"):
+        return InMemoryBroadcast()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBroadcast(url)
+    raise ValueError(f"Неизвестный бэкенд рассылки: {url}")
+
+
+# Глобальный экземпляр
+broadcast = build_broadcast()
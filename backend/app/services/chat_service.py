@@ -1,5 +1,7 @@
-from typing import List
-from sqlmodel import Session, select
+from typing import List, Optional
+from sqlalchemy import tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from ..models import ChatMessage, ChatMessageCreate, MessageRole
 from datetime import datetime
 
@@ -7,49 +9,70 @@ from datetime import datetime
 class ChatService:
     
     @staticmethod
-    def create_message(message_data: ChatMessageCreate, session: Session) -> ChatMessage:
+    async def create_message(message_data: ChatMessageCreate, session: AsyncSession) -> ChatMessage:
         """Создание нового сообщения в чате"""
         message = ChatMessage(**message_data.model_dump())
         session.add(message)
-        session.commit()
-        session.refresh(message)
+        await session.commit()
+        await session.refresh(message)
         return message
     
     @staticmethod
-    def get_interview_messages(interview_id: int, session: Session) -> List[ChatMessage]:
-        """Получение всех сообщений для конкретного собеседования"""
-        statement = select(ChatMessage).where(
-            ChatMessage.interview_id == interview_id
-        ).order_by(ChatMessage.timestamp)
+    async def get_interview_messages(
+        interview_id: int,
+        session: AsyncSession,
+        after: Optional[ChatMessage] = None,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[ChatMessage]:
+        """Получение сообщений собеседования по порядку (timestamp, id).
+
+        Постраничное чтение по ключу: ``after`` — последнее сообщение
+        предыдущей страницы, ``since`` — только сообщения новее указанного
+        времени. Запрос идёт по индексу (interview_id, timestamp, id), поэтому
+        стоимость страницы не зависит от общего числа сообщений.
+        """
+        statement = select(ChatMessage).where(ChatMessage.interview_id == interview_id)
+        
+        if after is not None:
+            statement = statement.where(
+                tuple_(ChatMessage.timestamp, ChatMessage.id) > tuple_(after.timestamp, after.id)
+            )
+        if since is not None:
+            statement = statement.where(ChatMessage.timestamp > since)
+        
+        statement = statement.order_by(ChatMessage.timestamp, ChatMessage.id)
+        if limit is not None:
+            statement = statement.limit(limit)
         
-        return session.exec(statement).all()
+        return (await session.exec(statement)).all()
     
     @staticmethod
-    def add_ai_message(interview_id: int, content: str, session: Session) -> ChatMessage:
+    async def add_ai_message(interview_id: int, content: str, session: AsyncSession) -> ChatMessage:
         """Добавление сообщения от AI HR"""
         message_data = ChatMessageCreate(
             content=content,
             role=MessageRole.AI_HR,
             interview_id=interview_id
         )
-        return ChatService.create_message(message_data, session)
+        return await ChatService.create_message(message_data, session)
     
     @staticmethod
-    def add_candidate_message(interview_id: int, content: str, session: Session) -> ChatMessage:
+    async def add_candidate_message(interview_id: int, content: str, session: AsyncSession) -> ChatMessage:
         """Добавление сообщения от кандидата"""
         message_data = ChatMessageCreate(
             content=content,
             role=MessageRole.CANDIDATE,
             interview_id=interview_id
         )
-        return ChatService.create_message(message_data, session)
+        return await ChatService.create_message(message_data, session)
     
     @staticmethod
-    def add_recruiter_message(interview_id: int, content: str, session: Session) -> ChatMessage:
+    async def add_recruiter_message(interview_id: int, content: str, session: AsyncSession) -> ChatMessage:
         """Добавление сообщения от рекрутера"""
         message_data = ChatMessageCreate(
             content=content,
             role=MessageRole.RECRUITER,
             interview_id=interview_id
         )
-        return ChatService.create_message(message_data, session)
+        return await ChatService.create_message(message_data, session)
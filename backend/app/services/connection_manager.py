@@ -0,0 +1,310 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket
+
+from . import ws_protocol
+from .broadcast import NODE_ID, BroadcastBackend
+
+logger = logging.getLogger(__name__)
+
+# Политики для медленных клиентов, у которых заполнилась очередь отправки.
+# drop_oldest выбрасывает самое старое сообщение с ключом объединения,
+# coalesce вдобавок заменяет сообщение с тем же ключом, disconnect сразу
+# отключает клиента
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_COALESCE = "coalesce"
+POLICY_DISCONNECT = "disconnect"
+
+# Код закрытия WebSocket для клиента, не успевающего читать (Try Again Later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class _Outbound:
+    """Очередь отправки одного соединения и задача, которая её разбирает.
+
+    Элемент очереди — (ключ объединения, кадр). Сообщения с одинаковым
+    ключом (например, промежуточные результаты распознавания) при политике
+    ``coalesce`` заменяют друг друга: клиенту важна только последняя версия.
+
+    При переполнении выбрасываются только сообщения с ключом. Сообщения без
+    ключа (чат, статусы) не теряются: если места для них нет, клиент
+    отключается и после переподключения догоняет состояние по
+    ``Last-Event-ID`` потока событий.
+    """
+
+    def __init__(self, websocket: WebSocket, protocol: str, max_size: int, policy: str):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.max_size = max_size
+        self.policy = policy
+        self.queue: deque = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+
+        # Счётчики для мониторинга
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def put(self, frame: ws_protocol.Frame, key: Optional[str] = None) -> bool:
+        """Постановка в очередь без ожидания; False — клиента нужно отключить"""
+        if self.closed:
+            return False
+
+        if key is not None and self.policy == POLICY_COALESCE:
+            for index, (queued_key, _) in enumerate(self.queue):
+                if queued_key == key:
+                    del self.queue[index]
+                    self.coalesced += 1
+                    break
+
+        if len(self.queue) >= self.max_size:
+            if self.policy == POLICY_DISCONNECT:
+                return False
+            victim = next(
+                (index for index, (queued_key, _) in enumerate(self.queue) if queued_key is not None), None
+            )
+            if victim is not None:
+                del self.queue[victim]
+            elif key is not None:
+                # В очереди только сообщения без потерь — теряется новое
+                self.dropped += 1
+                return True
+            else:
+                return False
+            self.dropped += 1
+
+        self.queue.append((key, frame))
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.ready.set()
+        return True
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            while self.queue:
+                _, frame = self.queue.popleft()
+                await ws_protocol.send_frame(self.websocket, frame)
+                self.sent += 1
+            self.ready.clear()
+
+
+class ConnectionManager:
+    """WebSocket-соединения собеседований с рассылкой через ``BroadcastBackend``.
+
+    Соединения хранятся локально в процессе, а сообщения публикуются в канал
+    ``<namespace>:<interview_id>``. Воркер подписан на канал, пока у него есть
+    хотя бы одно соединение этого собеседования, поэтому сообщение доходит до
+    участников, подключённых к любым воркерам.
+
+    Сообщение сериализуется один раз для каждого подпротокола (JSON или
+    msgpack, см. ``ws_protocol``), а затем кладётся в ограниченные
+    очереди соединений; каждую очередь разбирает своя задача, так что
+    медленный клиент не задерживает остальных и отправителя. Переполнение
+    очереди обрабатывается политикой ``slow_consumer_policy``.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        backend: BroadcastBackend,
+        send_queue_size: int = 256,
+        slow_consumer_policy: str = POLICY_DROP_OLDEST
+    ):
+        if slow_consumer_policy not in (POLICY_DROP_OLDEST, POLICY_COALESCE, POLICY_DISCONNECT):
+            raise ValueError(f"Неизвестная политика для медленных клиентов: {slow_consumer_policy}")
+
+        self.namespace = namespace
+        self.backend = backend
+        self.send_queue_size = max(1, send_queue_size)
+        self.slow_consumer_policy = slow_consumer_policy
+        self.active_connections: Dict[int, List[WebSocket]] = {}
+        self._outbound: Dict[WebSocket, _Outbound] = {}
+        # Подписка и отписка канала не должны перемешиваться
+        self._lock = asyncio.Lock()
+        self._closing: set = set()
+
+        # Счётчики закрытых соединений (открытые считаются в _outbound)
+        self.slow_consumers_disconnected = 0
+        self.closed_sent = 0
+        self.closed_dropped = 0
+        self.closed_coalesced = 0
+        self.fanout_seconds = 0.0
+        self.fanouts = 0
+
+    def _channel(self, interview_id: int) -> str:
+        return f"{self.namespace}:{interview_id}"
+
+    @staticmethod
+    def _token(websocket: WebSocket) -> str:
+        return f"{NODE_ID}:{id(websocket)}"
+
+    async def connect(self, websocket: WebSocket, interview_id: int) -> str:
+        """Принятие соединения; возвращает согласованный подпротокол"""
+        protocol = await ws_protocol.accept(websocket)
+        outbound = _Outbound(websocket, protocol, self.send_queue_size, self.slow_consumer_policy)
+        outbound.task = asyncio.create_task(self._write(outbound, interview_id))
+        self._outbound[websocket] = outbound
+
+        async with self._lock:
+            connections = self.active_connections.setdefault(interview_id, [])
+            connections.append(websocket)
+            if len(connections) == 1:
+                await self.backend.subscribe(
+                    self._channel(interview_id),
+                    lambda payload: self._deliver(interview_id, payload)
+                )
+        logger.info(f"WebSocket подключение для собеседования {interview_id} ({self.namespace}, {protocol})")
+        return protocol
+
+    async def disconnect(self, websocket: WebSocket, interview_id: int):
+        outbound = self._outbound.pop(websocket, None)
+        if outbound is not None:
+            outbound.closed = True
+            self.closed_sent += outbound.sent
+            self.closed_dropped += outbound.dropped
+            self.closed_coalesced += outbound.coalesced
+            if outbound.task is not asyncio.current_task():
+                outbound.task.cancel()
+
+        async with self._lock:
+            connections = self.active_connections.get(interview_id)
+            if connections is None or websocket not in connections:
+                return
+            connections.remove(websocket)
+            if not connections:
+                del self.active_connections[interview_id]
+                await self.backend.unsubscribe(self._channel(interview_id))
+        logger.info(f"WebSocket отключение для собеседования {interview_id} ({self.namespace})")
+
+    async def _write(self, outbound: _Outbound, interview_id: int):
+        try:
+            await outbound.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Ошибка отправки в WebSocket собеседования {interview_id}: {e}")
+            await self.disconnect(outbound.websocket, interview_id)
+
+    async def _drop_slow_consumer(self, websocket: WebSocket, interview_id: int):
+        self.slow_consumers_disconnected += 1
+        logger.warning(
+            f"WebSocket собеседования {interview_id} ({self.namespace}) отключён: "
+            f"очередь отправки переполнена ({self.send_queue_size})"
+        )
+        await self.disconnect(websocket, interview_id)
+        await self._close_slow(websocket)
+
+    @staticmethod
+    async def _close_slow(websocket: WebSocket):
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    def send_to_connection(self, websocket: WebSocket, message: dict):
+        """Ответ одному соединению (например, ошибка) в его подпротоколе"""
+        outbound = self._outbound.get(websocket)
+        if outbound is not None and not outbound.put(ws_protocol.encode(message, outbound.protocol)):
+            # Ответ не поместился в очередь: закрытие соединения приведёт
+            # обработчик к disconnect, клиент переподключится
+            self.slow_consumers_disconnected += 1
+            outbound.closed = True
+            task = asyncio.create_task(self._close_slow(websocket))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def send_message_to_interview(
+        self,
+        message: dict,
+        interview_id: int,
+        exclude: Optional[WebSocket] = None,
+        coalesce_key: Optional[str] = None
+    ):
+        await self.send_text(ws_protocol.encode(message, ws_protocol.PROTOCOL_JSON), interview_id, exclude, coalesce_key)
+
+    async def send_text(
+        self,
+        text: str,
+        interview_id: int,
+        exclude: Optional[WebSocket] = None,
+        coalesce_key: Optional[str] = None
+    ):
+        """Публикация готового текста всем участникам собеседования.
+
+        ``exclude`` — соединение отправителя, которому сообщение не
+        доставляется. ``coalesce_key`` помечает сообщения, из которых
+        медленному клиенту достаточно последнего.
+        """
+        envelope = json.dumps({
+            "exclude": self._token(exclude) if exclude is not None else None,
+            "key": coalesce_key,
+            "text": text
+        }, ensure_ascii=False)
+        await self.backend.publish(self._channel(interview_id), envelope)
+
+    async def _deliver(self, interview_id: int, payload: str):
+        """Раскладка опубликованного сообщения по очередям локальных соединений"""
+        started = time.perf_counter()
+        envelope = json.loads(payload)
+        # Кадр каждого подпротокола собирается один раз на всю рассылку
+        frames = {ws_protocol.PROTOCOL_JSON: envelope["text"]}
+        overflowed = []
+        for connection in list(self.active_connections.get(interview_id, [])):
+            if envelope["exclude"] == self._token(connection):
+                continue
+            outbound = self._outbound.get(connection)
+            if outbound is None:
+                continue
+            frame = frames.get(outbound.protocol)
+            if frame is None:
+                frame = frames[outbound.protocol] = ws_protocol.transcode(envelope["text"], outbound.protocol)
+            if not outbound.put(frame, envelope.get("key")):
+                overflowed.append(connection)
+
+        self.fanouts += 1
+        self.fanout_seconds += time.perf_counter() - started
+
+        for connection in overflowed:
+            await self._drop_slow_consumer(connection, interview_id)
+
+    def stats(self) -> dict:
+        """Метрики соединений и очередей отправки"""
+        depths = [len(outbound.queue) for outbound in self._outbound.values()]
+        return {
+            "namespace": self.namespace,
+            "policy": self.slow_consumer_policy,
+            "send_queue_size": self.send_queue_size,
+            "interviews": len(self.active_connections),
+            "connections": len(self._outbound),
+            "connections_by_protocol": {
+                protocol: sum(1 for outbound in self._outbound.values() if outbound.protocol == protocol)
+                for protocol in ws_protocol.SUPPORTED_PROTOCOLS
+            },
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_depth_peak": max((outbound.max_depth for outbound in self._outbound.values()), default=0),
+            "sent": self.closed_sent + sum(outbound.sent for outbound in self._outbound.values()),
+            "dropped": self.closed_dropped + sum(outbound.dropped for outbound in self._outbound.values()),
+            "coalesced": self.closed_coalesced + sum(outbound.coalesced for outbound in self._outbound.values()),
+            "slow_consumers_disconnected": self.slow_consumers_disconnected,
+            "avg_fanout_ms": round(self.fanout_seconds / self.fanouts * 1000, 3) if self.fanouts else 0.0
+        }
+
+
+def build_connection_manager(namespace: str, backend: BroadcastBackend) -> ConnectionManager:
+    """Менеджер соединений с параметрами очередей из переменных окружения"""
+    return ConnectionManager(
+        namespace,
+        backend,
+        send_queue_size=int(os.getenv("WS_SEND_QUEUE_SIZE", "256")),
+        slow_consumer_policy=os.getenv("WS_SLOW_CONSUMER_POLICY", POLICY_DROP_OLDEST)
+    )
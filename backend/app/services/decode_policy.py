@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DecodeTier:
+    """Уровень качества декодирования"""
+    name: str
+    model_size: str
+    beam_size: int
+
+
+def build_tiers(model_size: str, beam_size: int, fast_model_size: Optional[str] = None) -> List[DecodeTier]:
+    """Уровни от лучшего к самому быстрому"""
+    tiers = [
+        DecodeTier("full", model_size, beam_size),
+        DecodeTier("greedy", model_size, 1)
+    ]
+    if fast_model_size and fast_model_size != model_size:
+        tiers.append(DecodeTier("fast", fast_model_size, 1))
+    return tiers
+
+
+class LoadAwareDecodePolicy:
+    """Переключение качества декодирования в зависимости от нагрузки.
+
+    Если среднее ожидание в очереди или p95 полной задержки чанков
+    потокового распознавания за последнее окно превышает порог, политика опускается на один уровень (beam search
+    -> жадный поиск -> меньшая модель). Когда обе метрики падают ниже
+    ``recover_ratio`` от порога, качество поднимается обратно. Между
+    переключениями выдерживается ``min_dwell_seconds``, чтобы не
+    "дребезжать" на границе порога.
+    """
+
+    def __init__(
+        self,
+        tiers: List[DecodeTier],
+        queue_wait_threshold_ms: float = 500.0,
+        p95_threshold_ms: float = 3000.0,
+        recover_ratio: float = 0.5,
+        window_seconds: float = 30.0,
+        min_dwell_seconds: float = 5.0
+    ):
+        self.tiers = tiers
+        self.queue_wait_threshold = queue_wait_threshold_ms / 1000
+        self.p95_threshold = p95_threshold_ms / 1000
+        self.recover_ratio = recover_ratio
+        self.window_seconds = window_seconds
+        self.min_dwell_seconds = min_dwell_seconds
+
+        self._level = 0
+        self._changed_at = 0.0
+        self._lock = threading.Lock()
+        self._queue_waits: Deque[Tuple[float, float]] = deque(maxlen=500)
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=500)
+        self.served: Dict[str, int] = {tier.name: 0 for tier in tiers}
+
+    def tier_by_name(self, name: str) -> DecodeTier:
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        return self.tiers[0]
+
+    def current_tier(self) -> DecodeTier:
+        return self.tiers[self._level]
+
+    def record_queue_waits(self, waits: List[float]):
+        now = time.monotonic()
+        with self._lock:
+            self._queue_waits.extend((now, wait) for wait in waits)
+        self._evaluate()
+
+    def record_served(self, tier_name: str):
+        """Учёт запроса без задержки (например, загруженного файла)"""
+        with self._lock:
+            self.served[tier_name] = self.served.get(tier_name, 0) + 1
+
+    def record_latency(self, latency: float, tier_name: str):
+        now = time.monotonic()
+        with self._lock:
+            self._latencies.append((now, latency))
+            self.served[tier_name] = self.served.get(tier_name, 0) + 1
+        self._evaluate()
+
+    def _window(self, samples: Deque[Tuple[float, float]]) -> List[float]:
+        horizon = time.monotonic() - self.window_seconds
+        return [value for timestamp, value in samples if timestamp >= horizon]
+
+    def metrics(self) -> Tuple[float, float]:
+        """Среднее ожидание в очереди и p95 задержки за окно, в секундах"""
+        with self._lock:
+            waits = self._window(self._queue_waits)
+            latencies = sorted(self._window(self._latencies))
+        avg_wait = sum(waits) / len(waits) if waits else 0.0
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        return avg_wait, p95
+
+    def _evaluate(self):
+        now = time.monotonic()
+        if now - self._changed_at < self.min_dwell_seconds:
+            return
+
+        avg_wait, p95 = self.metrics()
+        overloaded = avg_wait > self.queue_wait_threshold or p95 > self.p95_threshold
+        relaxed = (
+            avg_wait < self.queue_wait_threshold * self.recover_ratio
+            and p95 < self.p95_threshold * self.recover_ratio
+        )
+
+        with self._lock:
+            previous = self._level
+            if overloaded and self._level < len(self.tiers) - 1:
+                self._level += 1
+            elif relaxed and self._level > 0:
+                self._level -= 1
+            else:
+                return
+            self._changed_at = now
+            # Метрики старого уровня не должны влиять на решение на новом
+            self._queue_waits.clear()
+            self._latencies.clear()
+
+        logger.warning(
+            f"Качество распознавания: {self.tiers[previous].name} -> {self.tiers[self._level].name} "
+            f"(ожидание в очереди {avg_wait * 1000:.0f} мс, p95 {p95 * 1000:.0f} мс)"
+        )
+
+    def stats(self) -> Dict:
+        avg_wait, p95 = self.metrics()
+        return {
+            "current_tier": self.current_tier().name,
+            "tiers": [asdict(tier) for tier in self.tiers],
+            "avg_queue_wait_ms": round(avg_wait * 1000, 1),
+            "p95_latency_ms": round(p95 * 1000, 1),
+            "served": dict(self.served)
+        }
@@ -0,0 +1,350 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..database import async_session_maker
+from ..models import Interview, InterviewPublic
+from .broadcast import NODE_ID, BroadcastBackend, InMemoryRedis, broadcast
+
+logger = logging.getLogger(__name__)
+
+# Канал, по которому воркеры сообщают друг другу об устаревших записях
+INVALIDATION_CHANNEL = "interview-cache-invalidate"
+
+# Результат загрузки, отменённой вместе с запросом-инициатором: ожидающие повторяют её сами
+_LOAD_CANCELLED = object()
+
+
+class SharedCacheTier:
+    """Общий уровень кэша для всех воркеров (Redis или заглушка в памяти).
+
+    ``client`` — асинхронный клиент с интерфейсом ``redis.asyncio``
+    (``get``, ``set``, ``delete``); если не передан, создаётся по ``url``.
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "interview:"):
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+
+    def _connect(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("Для общего кэша собеседований нужен пакет redis")
+            self._client = redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._connect().get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._connect().set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def delete(self, *keys: str):
+        await self._connect().delete(*[self.prefix + key for key in keys])
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+
+class InterviewCache:
+    """Кэш метаданных собеседований по ``id`` и по ``unique_link``.
+
+    Почти каждый запрос начинается с проверки, что собеседование существует;
+    кэш отвечает на неё без обращения к базе. Записи — отсоединённые от
+    сессии ``InterviewPublic``: их можно отдавать из любого запроса.
+
+    Чтение идёт по уровням: локальный LRU воркера (``ttl``), затем общий
+    уровень ``shared`` (``shared_ttl``), затем база. Одновременные промахи
+    по одному ключу разделяют один запрос к базе. Смена статуса вызывает
+    ``invalidate``: запись удаляется локально и в общем уровне, а остальные
+    воркеры узнают об этом через ``BroadcastBackend``.
+
+    В общий уровень пишет только ``put`` — после коммита, свежей записью.
+    Прочитанное из базы при промахе туда не попадает: инвалидация другого
+    воркера могла ещё не дойти, и старая строка жила бы ``shared_ttl``.
+
+    Отсутствие собеседования не кэшируется: id выдаются по порядку, и
+    запись «не найдено» мешала бы только что созданному собеседованию.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[BroadcastBackend] = None,
+        shared: Optional[SharedCacheTier] = None,
+        ttl: float = 30.0,
+        shared_ttl: float = 300.0,
+        max_size: int = 10000
+    ):
+        self.backend = backend
+        self.shared = shared
+        self.ttl = ttl
+        self.shared_ttl = shared_ttl
+        self.max_size = max_size
+
+        # id -> (срок годности, запись); ссылка -> id
+        self._entries: "OrderedDict[int, Tuple[float, InterviewPublic]]" = OrderedDict()
+        self._links: Dict[str, int] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Загрузка, начатая до инвалидации, не должна вернуть в кэш старую запись
+        self._generation = 0
+        self._started = False
+
+        # Счётчики для мониторинга
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.shared_errors = 0
+
+    async def start(self):
+        """Подписка на инвалидации от других воркеров"""
+        if self.backend is not None and not self._started:
+            await self.backend.subscribe(INVALIDATION_CHANNEL, self._on_invalidate)
+            self._started = True
+
+    async def shutdown(self):
+        if self._started:
+            await self.backend.unsubscribe(INVALIDATION_CHANNEL)
+            self._started = False
+        if self.shared is not None:
+            await self.shared.close()
+
+    # Локальный уровень
+
+    def _local(self, interview_id: int) -> Optional[InterviewPublic]:
+        entry = self._entries.get(interview_id)
+        if entry is None:
+            return None
+        expires_at, interview = entry
+        if expires_at <= time.monotonic():
+            self._drop(interview_id)
+            return None
+        self._entries.move_to_end(interview_id)
+        return interview
+
+    def _store(self, interview: InterviewPublic):
+        self._drop(interview.id)
+        self._entries[interview.id] = (time.monotonic() + self.ttl, interview)
+        self._links[interview.unique_link] = interview.id
+        while len(self._entries) > self.max_size:
+            evicted_id, _ = next(iter(self._entries.items()))
+            self._drop(evicted_id)
+            self.evictions += 1
+
+    def _drop(self, interview_id: int):
+        entry = self._entries.pop(interview_id, None)
+        if entry is not None:
+            self._links.pop(entry[1].unique_link, None)
+
+    # Общий уровень (ошибки Redis не должны ломать запросы — идём в базу)
+
+    async def _shared_get(self, key: str) -> Optional[InterviewPublic]:
+        if self.shared is None:
+            return None
+        try:
+            value = await self.shared.get(key)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Ошибка чтения общего кэша собеседований: {e}")
+            return None
+        if value is None:
+            return None
+        if key.startswith("link:"):
+            # По ссылке хранится только id, запись — под ключом id
+            return await self._shared_get(f"id:{value}")
+        return InterviewPublic.model_validate_json(value)
+
+    async def _shared_put(self, interview: InterviewPublic):
+        if self.shared is None:
+            return
+        try:
+            await self.shared.set(f"id:{interview.id}", interview.model_dump_json(), self.shared_ttl)
+            await self.shared.set(f"link:{interview.unique_link}", str(interview.id), self.shared_ttl)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Ошибка записи в общий кэш собеседований: {e}")
+
+    # Чтение
+
+    async def get_by_id(self, interview_id: int, session: Optional[AsyncSession] = None) -> Optional[InterviewPublic]:
+        """Собеседование по id или None, если его нет"""
+        interview = self._local(interview_id)
+        if interview is not None:
+            self.hits += 1
+            return interview
+        return await self._load(
+            f"id:{interview_id}",
+            lambda db: db.get(Interview, interview_id),
+            session
+        )
+
+    async def get_by_link(self, unique_link: str, session: Optional[AsyncSession] = None) -> Optional[InterviewPublic]:
+        """Собеседование по уникальной ссылке или None, если его нет"""
+        interview_id = self._links.get(unique_link)
+        if interview_id is not None:
+            interview = self._local(interview_id)
+            if interview is not None:
+                self.hits += 1
+                return interview
+        return await self._load(
+            f"link:{unique_link}",
+            lambda db: _first(db, select(Interview).where(Interview.unique_link == unique_link)),
+            session
+        )
+
+    async def exists(self, interview_id: int, session: Optional[AsyncSession] = None) -> bool:
+        return await self.get_by_id(interview_id, session) is not None
+
+    async def _load(self, key: str, query, session: Optional[AsyncSession]) -> Optional[InterviewPublic]:
+        pending = self._loading.get(key)
+        while pending is not None:
+            self.coalesced += 1
+            interview = await asyncio.shield(pending)
+            if interview is not _LOAD_CANCELLED:
+                return interview
+            # Инициатора отменили — загрузку продолжает один из ожидающих
+            pending = self._loading.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        generation = self._generation
+        try:
+            interview = await self._shared_get(key)
+            if interview is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+                self.loads += 1
+                interview = await self._query(query, session)
+            if interview is not None and generation == self._generation:
+                self._store(interview)
+            future.set_result(interview)
+            return interview
+        except asyncio.CancelledError:
+            future.set_result(_LOAD_CANCELLED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Ошибку получат ожидающие; если их нет, она не должна попасть в лог цикла
+            future.exception()
+            raise
+        finally:
+            del self._loading[key]
+
+    @staticmethod
+    async def _query(query, session: Optional[AsyncSession]) -> Optional[InterviewPublic]:
+        if session is not None:
+            row = await query(session)
+            return InterviewPublic.model_validate(row) if row else None
+        async with async_session_maker() as db:
+            row = await query(db)
+            return InterviewPublic.model_validate(row) if row else None
+
+    # Запись и инвалидация
+
+    async def put(self, interview: Interview):
+        """Свежая запись после создания или изменения собеседования"""
+        interview = InterviewPublic.model_validate(interview)
+        self._store(interview)
+        await self._shared_put(interview)
+
+    async def invalidate(self, interview_id: int, unique_link: Optional[str] = None):
+        """Удаление записи на всех воркерах (после смены статуса)"""
+        entry = self._entries.get(interview_id)
+        if unique_link is None and entry is not None:
+            unique_link = entry[1].unique_link
+        self._forget(interview_id, unique_link)
+
+        if self.shared is not None:
+            keys = [f"id:{interview_id}"] + ([f"link:{unique_link}"] if unique_link else [])
+            try:
+                await self.shared.delete(*keys)
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Ошибка инвалидации общего кэша собеседований: {e}")
+
+        if self._started:
+            await self.backend.publish(
+                INVALIDATION_CHANNEL,
+                json.dumps({"id": interview_id, "unique_link": unique_link, "node": NODE_ID})
+            )
+
+    def _forget(self, interview_id: int, unique_link: Optional[str]):
+        self._generation += 1
+        self.invalidations += 1
+        self._drop(interview_id)
+        if unique_link is not None:
+            self._links.pop(unique_link, None)
+
+    async def _on_invalidate(self, payload: str):
+        message = json.loads(payload)
+        if message.get("node") == NODE_ID:
+            # Свою инвалидацию этот воркер уже применил
+            return
+        self._forget(message["id"], message.get("unique_link"))
+
+    def stats(self) -> Dict[str, Any]:
+        """Попадания, промахи и размер кэша"""
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "shared": type(self.shared).__name__ if self.shared is not None else None,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            "db_loads": self.loads,
+            "coalesced_loads": self.coalesced,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "shared_errors": self.shared_errors
+        }
+
+
+async def _first(session: AsyncSession, statement):
+    return (await session.exec(statement)).first()
+
+
+def build_shared_tier() -> Optional[SharedCacheTier]:
+    """Общий уровень кэша по переменной окружения INTERVIEW_CACHE_URL.
+
+    Пусто (по умолчанию) — только локальный кэш воркера; ``redis://...`` —
+    общий кэш в Redis; ``memory://`` — заглушка в памяти процесса.
+    """
+    url = os.getenv("INTERVIEW_CACHE_URL", "")
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return SharedCacheTier(client=InMemoryRedis())
+    if url.startswith(("redis://", "rediss://")):
+        return SharedCacheTier(url)
+    raise ValueError(f"Неизвестный общий кэш собеседований: {url}")
+
+
+# Глобальный экземпляр
+interview_cache = InterviewCache(
+    broadcast,
+    shared=build_shared_tier(),
+    ttl=float(os.getenv("INTERVIEW_CACHE_TTL_SECONDS", "30")),
+    shared_ttl=float(os.getenv("INTERVIEW_CACHE_SHARED_TTL_SECONDS", "300")),
+    max_size=int(os.getenv("INTERVIEW_CACHE_MAX_SIZE", "10000"))
+)
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from .broadcast import BroadcastBackend, broadcast
+
+logger = logging.getLogger(__name__)
+
+# Один канал на все собеседования: каждый воркер хранит недавние события
+# любого собеседования и может продолжить поток после переподключения
+EVENTS_CHANNEL = "interview-events"
+
+# Типы событий
+EVENT_SNAPSHOT = "snapshot"
+EVENT_STATUS = "status"
+EVENT_TICK = "tick"
+EVENT_TRANSCRIPT_READY = "transcript_ready"
+EVENT_TRANSCRIPT_FAILED = "transcript_failed"
+EVENT_ASR_PARTIAL = "asr_partial"
+EVENT_ASR_FINAL = "asr_final"
+
+
+class _Listener:
+    """Очередь событий одного потока (SSE или WebSocket)"""
+
+    def __init__(self, max_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(max_size)
+        self.overflowed = False
+
+    def put(self, event: Dict[str, Any]):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать: поток закрывается, а клиент
+            # переподключается с Last-Event-ID и догоняет из буфера
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class _SeenIds:
+    """Id событий, уже отправленных клиенту.
+
+    События разных воркеров приходят не по порядку, поэтому проверяется
+    не «id больше последнего», а множество: все id не больше ``floor`` и
+    id из ``ids``. Пропуски в последовательности (событие так и не
+    опубликовано) не дают множеству расти дольше ``window`` элементов.
+    """
+
+    def __init__(self, window: int, floor: int = 0):
+        self.window = max(1, window)
+        self.floor = floor
+        self.ids: Set[int] = set()
+
+    def add(self, event_id: int) -> bool:
+        """False — событие уже отправлено"""
+        if event_id <= self.floor or event_id in self.ids:
+            return False
+        self.ids.add(event_id)
+        if len(self.ids) > self.window:
+            self.floor = min(self.ids)
+            self.ids.discard(self.floor)
+        while self.floor + 1 in self.ids:
+            self.floor += 1
+            self.ids.discard(self.floor)
+        return True
+
+
+class InterviewEventLog:
+    """Поток событий собеседования: смена статуса, готовность транскрипции,
+    результаты распознавания речи.
+
+    События публикуются через ``BroadcastBackend`` и доходят до всех
+    воркеров. Каждый воркер хранит последние ``buffer_size`` событий
+    собеседования, поэтому переподключившийся клиент передаёт id последнего
+    полученного события и получает только пропущенные. Если пропущенное уже
+    вытеснено из буфера, клиенту отправляется снимок состояния.
+
+    Id событий — номер в последовательности собеседования из общего
+    счётчика ``backend.increment``, поэтому они не повторяются между
+    воркерами и идут без пропусков. Публикации разных воркеров могут
+    прийти не по порядку: буфер упорядочен по id, а поток отбрасывает
+    только уже отправленные id (``_SeenIds``). Промежуточные результаты
+    распознавания не получают id и не буферизуются: после переподключения
+    они не нужны.
+    """
+
+    def __init__(
+        self,
+        backend: BroadcastBackend,
+        buffer_size: int = 200,
+        max_interviews: int = 1000,
+        listener_queue_size: int = 256,
+        tick_interval: float = 5.0
+    ):
+        self.backend = backend
+        self.tick_interval = tick_interval
+        self.buffer_size = buffer_size
+        self.max_interviews = max_interviews
+        self.listener_queue_size = listener_queue_size
+
+        self._buffers: "OrderedDict[int, deque]" = OrderedDict()
+        self._listeners: Dict[int, Set[_Listener]] = {}
+        self._started = False
+
+        # Счётчики для мониторинга
+        self.published = 0
+        self.replayed = 0
+        self.snapshots = 0
+        self.overflows = 0
+
+    async def start(self):
+        """Подписка воркера на канал событий"""
+        if not self._started:
+            await self.backend.subscribe(EVENTS_CHANNEL, self._on_message)
+            self._started = True
+
+    async def shutdown(self):
+        if self._started:
+            await self.backend.unsubscribe(EVENTS_CHANNEL)
+            self._started = False
+        for listeners in self._listeners.values():
+            for listener in listeners:
+                listener.put(None)
+
+    async def _next_id(self, interview_id: int) -> int:
+        return await self.backend.increment(f"{EVENTS_CHANNEL}:seq:{interview_id}")
+
+    async def publish(self, interview_id: int, event_type: str, data: Dict[str, Any], durable: bool = True):
+        """Публикация события; ``durable=False`` — без id и без буферизации"""
+        event_id = await self._next_id(interview_id) if durable else None
+        event = self._event(interview_id, event_type, data, event_id)
+        self.published += 1
+        await self.backend.publish(EVENTS_CHANNEL, json.dumps(event, ensure_ascii=False, default=str))
+
+    async def _on_message(self, payload: str):
+        event = json.loads(payload)
+        interview_id = event["interview_id"]
+
+        if event["id"] is not None:
+            buffer = self._buffers.get(interview_id)
+            if buffer is None:
+                buffer = self._buffers[interview_id] = deque(maxlen=self.buffer_size)
+                if len(self._buffers) > self.max_interviews:
+                    self._buffers.popitem(last=False)
+            else:
+                self._buffers.move_to_end(interview_id)
+            self._buffer_event(buffer, event)
+
+        for listener in list(self._listeners.get(interview_id, ())):
+            was_overflowed = listener.overflowed
+            listener.put(event)
+            if listener.overflowed and not was_overflowed:
+                self.overflows += 1
+
+    @staticmethod
+    def _buffer_event(buffer: deque, event: Dict[str, Any]):
+        """Вставка с сохранением порядка id (обычно — в конец)"""
+        index = len(buffer)
+        while index and buffer[index - 1]["id"] > event["id"]:
+            index -= 1
+        if index and buffer[index - 1]["id"] == event["id"]:
+            return
+        if len(buffer) == buffer.maxlen:
+            if index == 0:
+                # Старше всего буфера — место занято более новыми событиями
+                return
+            buffer.popleft()
+            index -= 1
+        buffer.insert(index, event)
+
+    def listen(self, interview_id: int) -> _Listener:
+        listener = _Listener(self.listener_queue_size)
+        self._listeners.setdefault(interview_id, set()).add(listener)
+        return listener
+
+    def unlisten(self, interview_id: int, listener: _Listener):
+        listeners = self._listeners.get(interview_id)
+        if listeners is not None:
+            listeners.discard(listener)
+            if not listeners:
+                del self._listeners[interview_id]
+
+    def replay(self, interview_id: int, last_event_id: int) -> Optional[List[Dict[str, Any]]]:
+        """События после ``last_event_id`` или None, если часть уже вытеснена"""
+        buffer = self._buffers.get(interview_id)
+        if not buffer or last_event_id + 1 < buffer[0]["id"] or last_event_id > buffer[-1]["id"]:
+            # Между последним полученным и самым старым событием в буфере были
+            # события, которых здесь уже нет; id новее буфера — счётчик сброшен
+            return None
+        events = [event for event in buffer if event["id"] > last_event_id]
+        self.replayed += len(events)
+        return events
+
+    def _event(self, interview_id: int, event_type: str, data: Dict[str, Any], event_id: Optional[int] = None):
+        return {
+            "id": event_id,
+            "type": event_type,
+            "interview_id": interview_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "data": data
+        }
+
+    def _tick(self, interview_id: int, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Событие длительности для идущего собеседования"""
+        if state.get("status") != "started" or not state.get("started_at"):
+            return None
+        elapsed = int((datetime.utcnow() - datetime.fromisoformat(state["started_at"])).total_seconds())
+        data = {"elapsed_seconds": elapsed}
+        if state.get("recommended_duration"):
+            data["remaining_seconds"] = state["recommended_duration"] * 60 - elapsed
+        return self._event(interview_id, EVENT_TICK, data)
+
+    async def stream(
+        self,
+        interview_id: int,
+        load_snapshot: Callable[[], Awaitable[Dict[str, Any]]],
+        last_event_id: Optional[int] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """События собеседования для одного клиента.
+
+        Сначала — пропущенные после ``last_event_id`` события или снимок
+        состояния из ``load_snapshot``, затем новые события и тики
+        длительности раз в ``tick_interval`` секунд. Снимок читается после
+        подписки, так что опубликованное в это время событие не теряется.
+        None означает, что событий не было и соединение стоит поддержать
+        (комментарий SSE).
+        """
+        listener = self.listen(interview_id)
+        try:
+            # События, попавшие в буфер до чтения снимка, в нём уже учтены;
+            # пришедшие во время чтения доставляются из очереди слушателя
+            known = [event["id"] for event in self._buffers.get(interview_id, ())]
+            snapshot = await load_snapshot()
+            state = dict(snapshot)
+
+            events = self.replay(interview_id, last_event_id) if last_event_id is not None else None
+            if events is None:
+                self.snapshots += 1
+                seen = _SeenIds(self.buffer_size, known[0] - 1 if known else 0)
+                for event_id in known:
+                    seen.add(event_id)
+                # Id снимка — последнее учтённое событие: с него клиент продолжит
+                yield self._event(interview_id, EVENT_SNAPSHOT, snapshot, known[-1] if known else None)
+            else:
+                seen = _SeenIds(self.buffer_size, last_event_id)
+                for event in events:
+                    seen.add(event["id"])
+                    if event["type"] == EVENT_STATUS:
+                        state.update(event["data"])
+                    yield event
+
+            next_tick = time.monotonic() + self.tick_interval
+            while True:
+                timeout = max(0.0, next_tick - time.monotonic())
+                try:
+                    event = await asyncio.wait_for(listener.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    next_tick = time.monotonic() + self.tick_interval
+                    yield self._tick(interview_id, state)
+                    continue
+
+                if event is None:
+                    # Переполнение очереди или остановка приложения
+                    return
+                if event["id"] is not None and not seen.add(event["id"]):
+                    # Уже отправлено при догоняющем чтении из буфера
+                    continue
+                if event["type"] == EVENT_STATUS:
+                    state.update(event["data"])
+                yield event
+        finally:
+            self.unlisten(interview_id, listener)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика потока событий"""
+        return {
+            "interviews_buffered": len(self._buffers),
+            "events_buffered": sum(len(buffer) for buffer in self._buffers.values()),
+            "listeners": sum(len(listeners) for listeners in self._listeners.values()),
+            "published": self.published,
+            "replayed": self.replayed,
+            "snapshots": self.snapshots,
+            "listener_overflows": self.overflows
+        }
+
+
+# Глобальный экземпляр
+interview_events = InterviewEventLog(
+    broadcast,
+    buffer_size=int(os.getenv("INTERVIEW_EVENTS_BUFFER", "200")),
+    max_interviews=int(os.getenv("INTERVIEW_EVENTS_MAX_INTERVIEWS", "1000")),
+    tick_interval=float(os.getenv("INTERVIEW_EVENTS_TICK_SECONDS", "5"))
+)
@@ -1,15 +1,17 @@
 import uuid
 from datetime import datetime
 from typing import Optional
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from ..models import Interview, InterviewCreate, InterviewStatus, InterviewUpdate
 from ..database import SessionDep
+from .interview_cache import interview_cache
 
 
 class InterviewService:
     
     @staticmethod
-    def create_interview(interview_data: InterviewCreate, session: Session) -> Interview:
+    async def create_interview(interview_data: InterviewCreate, session: AsyncSession) -> Interview:
         """Создание нового собеседования с уникальной ссылкой"""
         # Генерация уникальной ссылки
         unique_link = str(uuid.uuid4())
@@ -22,33 +24,34 @@ class InterviewService:
         )
         
         session.add(interview)
-        session.commit()
-        session.refresh(interview)
+        await session.commit()
+        await session.refresh(interview)
+        await interview_cache.put(interview)
         
         return interview
     
     @staticmethod
-    def get_interview_by_link(unique_link: str, session: Session) -> Optional[Interview]:
+    async def get_interview_by_link(unique_link: str, session: AsyncSession) -> Optional[Interview]:
         """Получение собеседования по уникальной ссылке"""
         statement = select(Interview).where(Interview.unique_link == unique_link)
-        return session.exec(statement).first()
+        return (await session.exec(statement)).first()
     
     @staticmethod
-    def get_interview_by_id(interview_id: int, session: Session) -> Optional[Interview]:
+    async def get_interview_by_id(interview_id: int, session: AsyncSession) -> Optional[Interview]:
         """Получение собеседования по ID"""
-        return session.get(Interview, interview_id)
+        return await session.get(Interview, interview_id)
     
     @staticmethod
-    def update_interview_status(
+    async def update_interview_status(
         interview_id: int, 
         status: InterviewStatus, 
-        session: Session,
+        session: AsyncSession,
         started_at: Optional[datetime] = None,
         finished_at: Optional[datetime] = None,
         actual_duration: Optional[int] = None
     ) -> Optional[Interview]:
         """Обновление статуса собеседования"""
-        interview = session.get(Interview, interview_id)
+        interview = await session.get(Interview, interview_id)
         if not interview:
             return None
         
@@ -62,21 +65,23 @@ class InterviewService:
             interview.actual_duration = actual_duration
         
         session.add(interview)
-        session.commit()
-        session.refresh(interview)
+        await session.commit()
+        await session.refresh(interview)
+        await interview_cache.invalidate(interview.id, interview.unique_link)
+        await interview_cache.put(interview)
         
         return interview
     
     @staticmethod
-    def save_transcript_path(interview_id: int, file_path: str, session: Session) -> Optional[Interview]:
+    async def save_transcript_path(interview_id: int, file_path: str, session: AsyncSession) -> Optional[Interview]:
         """Сохранение пути к файлу транскрипции"""
-        interview = session.get(Interview, interview_id)
+        interview = await session.get(Interview, interview_id)
         if not interview:
             return None
         
         interview.transcript_file_path = file_path
         session.add(interview)
-        session.commit()
-        session.refresh(interview)
+        await session.commit()
+        await session.refresh(interview)
         
         return interview
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from ..database import engine
+from ..models import ChatMessage, IdSequence, MessageRole
+from .transcript_journal import transcript_journal
+
+logger = logging.getLogger(__name__)
+
+# Имя счётчика id сообщений в таблице IdSequence
+CHAT_MESSAGE_SEQUENCE = "chatmessage"
+
+
+def _insert_ignore(table):
+    """INSERT, не падающий на уже существующей строке (SQLite и PostgreSQL)"""
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+class MessageWriter:
+    """Отложенная (write-behind) запись сообщений чата в базу.
+
+    Сообщение получает id и время в памяти и сразу возвращается вызывающему
+    коду для рассылки; в базу сообщения уходят пакетными INSERT'ами, когда
+    накопилось ``max_batch_size`` штук или прошло ``flush_interval_ms``.
+    ``flush`` — барьер долговечности: после него все ранее принятые
+    сообщения гарантированно записаны. Он вызывается перед чтением истории,
+    при завершении собеседования и при остановке приложения.
+
+    Id выдаются из блоков по ``id_block_size`` штук, которые каждый процесс
+    резервирует атомарным UPDATE общего счётчика в базе (таблица
+    IdSequence), поэтому несколько процессов backend не выдают одинаковых
+    id. Если строка всё же не записалась из-за конфликта (id занят
+    записью в обход этого класса), сообщение получает новый id и
+    записывается повторно — сообщения не отбрасываются.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 100,
+        flush_interval_ms: float = 50.0,
+        max_pending: int = 10000,
+        id_block_size: int = 100
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = max(1.0, flush_interval_ms) / 1000
+        self.max_pending = max(self.max_batch_size, max_pending)
+        self.id_block_size = max(1, id_block_size)
+
+        self._pending: List[Dict[str, Any]] = []
+        # Строки, которые не удалось записать; повторяются при следующем flush
+        self._retry: List[Dict[str, Any]] = []
+        self._next_id = 0
+        self._block_end = 0
+        self._block_lock: Optional[asyncio.Lock] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Счётчики для мониторинга
+        self.messages_written = 0
+        self.batches_written = 0
+        self.messages_reassigned = 0
+        self.id_blocks_reserved = 0
+        self.flush_failures = 0
+        self.last_flush_ms = 0.0
+
+    def _ensure_worker(self):
+        """Ленивый запуск фоновой задачи в текущем event loop"""
+        if self._worker is None or self._worker.done():
+            self._block_lock = self._block_lock or asyncio.Lock()
+            self._flush_lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run(), name="chat-message-writer")
+
+    async def _reserve_block(self):
+        """Резервирование следующего блока id в общем счётчике"""
+        size = self.id_block_size
+        first_free = select(func.coalesce(func.max(ChatMessage.id), 0) + 1).scalar_subquery()
+        async with engine.begin() as conn:
+            await conn.execute(
+                _insert_ignore(IdSequence).values(name=CHAT_MESSAGE_SEQUENCE, next_value=first_free)
+            )
+            # Счётчик не отстаёт от таблицы, даже если строки добавлялись в обход него
+            start = case((IdSequence.next_value >= first_free, IdSequence.next_value), else_=first_free)
+            block_end = (await conn.execute(
+                update(IdSequence)
+                .where(IdSequence.name == CHAT_MESSAGE_SEQUENCE)
+                .values(next_value=start + size)
+                .returning(IdSequence.next_value)
+            )).scalar_one()
+        self._next_id = block_end - size
+        self._block_end = block_end
+        self.id_blocks_reserved += 1
+        logger.debug(f"Запись сообщений чата: зарезервированы id {self._next_id}..{block_end - 1}")
+
+    async def _take_id(self) -> int:
+        if self._next_id >= self._block_end:
+            async with self._block_lock:
+                if self._next_id >= self._block_end:
+                    await self._reserve_block()
+        message_id = self._next_id
+        self._next_id += 1
+        return message_id
+
+    async def start(self):
+        """Резервирование первого блока id и запуск фоновой записи"""
+        self._ensure_worker()
+        async with self._block_lock:
+            if self._next_id >= self._block_end:
+                await self._reserve_block()
+
+    async def write(self, interview_id: int, content: str, role: MessageRole) -> ChatMessage:
+        """Приём сообщения: id и время назначаются сразу, запись — позже"""
+        self._ensure_worker()
+        message_id = await self._take_id()
+
+        # Очередь переполнена (база не успевает) — пишем синхронно с вызывающим
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+
+        message = ChatMessage(
+            id=message_id,
+            content=content,
+            role=role,
+            interview_id=interview_id,
+            timestamp=datetime.utcnow()
+        )
+
+        self._pending.append({
+            "id": message.id,
+            "content": message.content,
+            "role": message.role,
+            "interview_id": message.interview_id,
+            "timestamp": message.timestamp
+        })
+        if len(self._pending) >= self.max_batch_size:
+            self._wakeup.set()
+
+        transcript_journal.append_message(message)
+        return message
+
+    async def _insert(self, rows: List[Dict[str, Any]]):
+        async with engine.begin() as conn:
+            await conn.execute(insert(ChatMessage), rows)
+
+    async def _already_written(self, row: Dict[str, Any]) -> bool:
+        """Строка с этим id уже в базе и это то же сообщение (повтор после сбоя)"""
+        async with engine.connect() as conn:
+            existing = (await conn.execute(
+                select(ChatMessage.interview_id, ChatMessage.content).where(ChatMessage.id == row["id"])
+            )).first()
+        return existing is not None and tuple(existing) == (row["interview_id"], row["content"])
+
+    async def _insert_row(self, row: Dict[str, Any]) -> bool:
+        """Запись одной строки после ошибки пакета; False — строку нужно повторить позже"""
+        try:
+            await self._insert([row])
+            return True
+        except IntegrityError as e:
+            error = e
+        if await self._already_written(row):
+            return True
+
+        # id занят другим сообщением: выдаём новый, само сообщение не теряется
+        old_id = row["id"]
+        row["id"] = await self._take_id()
+        try:
+            await self._insert([row])
+        except IntegrityError as retry_error:
+            logger.error(f"Сообщение {old_id} не записано, повтор при следующей записи: {retry_error}")
+            return False
+        self.messages_reassigned += 1
+        logger.warning(f"Сообщение {old_id} записано с id {row['id']}: {error}")
+        return True
+
+    async def flush(self):
+        """Запись всех накопленных сообщений; ошибка базы пробрасывается"""
+        if self._flush_lock is None:
+            return
+
+        async with self._flush_lock:
+            if self._retry:
+                self._pending[:0] = self._retry
+                self._retry = []
+            while self._pending:
+                batch = self._pending[:self.max_batch_size]
+                started = time.perf_counter()
+                written = len(batch)
+                try:
+                    await self._insert(batch)
+                except IntegrityError as e:
+                    # Одна "битая" строка не должна блокировать весь пакет
+                    logger.error(f"Ошибка пакетной записи сообщений, запись по одному: {e}")
+                    for row in batch:
+                        if not await self._insert_row(row):
+                            self._retry.append(row)
+                            written -= 1
+                except Exception:
+                    self.flush_failures += 1
+                    raise
+
+                del self._pending[:len(batch)]
+                self.messages_written += written
+                self.batches_written += 1
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                # Сообщения остаются в очереди и будут записаны на следующем такте
+                logger.error(f"Ошибка при записи сообщений чата: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика отложенной записи"""
+        return {
+            "pending": len(self._pending) + len(self._retry),
+            "messages_written": self.messages_written,
+            "batches_written": self.batches_written,
+            "messages_reassigned": self.messages_reassigned,
+            "messages_retrying": len(self._retry),
+            "id_blocks_reserved": self.id_blocks_reserved,
+            "flush_failures": self.flush_failures,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_batch_size": self.max_batch_size,
+            "flush_interval_ms": self.flush_interval * 1000
+        }
+
+    async def shutdown(self):
+        """Остановка фоновой задачи и запись оставшихся сообщений"""
+        if self._worker and not self._worker.done():
+            # Отмена посреди пакета оставила бы уже записанные строки в очереди
+            async with self._flush_lock:
+                self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        await self.flush()
+        if self._pending or self._retry:
+            logger.error(f"При остановке не записано сообщений чата: {len(self._pending) + len(self._retry)}")
+
+
+# Глобальный экземпляр
+message_writer = MessageWriter(
+    max_batch_size=int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100")),
+    flush_interval_ms=float(os.getenv("CHAT_WRITE_FLUSH_MS", "50")),
+    max_pending=int(os.getenv("CHAT_WRITE_MAX_PENDING", "10000")),
+    id_block_size=int(os.getenv("CHAT_ID_BLOCK_SIZE", "100"))
+)
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+
+from .audio_decoder import decode_pcm
+from .transcript_journal import transcript_journal
+from .vad import frame_rms
+from .whisper_service import SAMPLE_RATE, whisper_service
+
+logger = logging.getLogger(__name__)
+
+# Длина кадра для оценки энергии сигнала
+FRAME_SECONDS = 0.02
+
+
+class StreamingTranscriber:
+    """Потоковое распознавание речи для одного аудиопотока собеседования.
+
+    Аудио копится в буфере неподтверждённого "хвоста". По мере поступления
+    хвост периодически перераспознаётся и отдаётся как частичная гипотеза;
+    на конце фразы (пауза после речи) хвост распознаётся окончательно,
+    отдаётся как финальный сегмент и сбрасывается. Если фраза слишком
+    длинная, уже стабильные сегменты подтверждаются по временным меткам,
+    поэтому декодируемый хвост никогда не превышает ``max_tail_seconds``.
+
+    Частичная гипотеза декодирует только последние ``partial_window_seconds``
+    хвоста: стоимость промежуточного распознавания не растёт с длиной фразы,
+    а весь хвост декодируется один раз — на конце фразы.
+    """
+
+    def __init__(
+        self,
+        interview_id: int,
+        send: Callable[[dict], Awaitable[None]],
+        language: Optional[str] = None,
+        sample_rate: int = SAMPLE_RATE,
+        partial_interval: float = 0.5,
+        partial_window_seconds: float = 4.0,
+        endpoint_silence: float = 0.6,
+        max_tail_seconds: float = 12.0,
+        energy_threshold_db: float = -45.0
+    ):
+        self.interview_id = interview_id
+        self.send = send
+        self.language = language
+        self.sample_rate = sample_rate
+        self.partial_interval = partial_interval
+        self.partial_window_seconds = partial_window_seconds
+        self.endpoint_silence = endpoint_silence
+        self.max_tail_seconds = max_tail_seconds
+        self.energy_threshold = 10 ** (energy_threshold_db / 20)
+
+        self._chunks: List[np.ndarray] = []
+        self._tail_samples = 0
+        # Абсолютное время начала хвоста от начала потока, в секундах
+        self._tail_offset = 0.0
+        self._samples_since_decode = 0
+        self._speech_seen = False
+        self._trailing_silence = 0.0
+        self._last_partial = ""
+
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def tail_seconds(self) -> float:
+        return self._tail_samples / SAMPLE_RATE
+
+    def feed(self, pcm: bytes):
+        """Добавление кадра s16le PCM (моно) в буфер"""
+        if self._closed or not pcm:
+            return
+
+        audio = decode_pcm(pcm, sample_rate=self.sample_rate)
+        if len(audio) == 0:
+            return
+
+        self._update_endpoint(audio)
+
+        # До начала речи тишину не копим: она только увеличивает хвост
+        if not self._speech_seen:
+            self._tail_offset += len(audio) / SAMPLE_RATE
+            return
+
+        self._chunks.append(audio)
+        self._tail_samples += len(audio)
+        self._samples_since_decode += len(audio)
+        self._wakeup.set()
+
+    def _update_endpoint(self, audio: np.ndarray):
+        """Оценка энергии по кадрам и подсчёт длительности паузы в конце"""
+        frame = int(FRAME_SECONDS * SAMPLE_RATE)
+        frame_seconds = FRAME_SECONDS if len(audio) >= frame else len(audio) / SAMPLE_RATE
+
+        for rms in frame_rms(audio, frame):
+            if rms >= self.energy_threshold:
+                self._speech_seen = True
+                self._trailing_silence = 0.0
+            else:
+                self._trailing_silence += frame_seconds
+
+    def _take_tail(self) -> np.ndarray:
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.float32)
+
+    def _drop_tail(self, seconds: float):
+        """Отбрасывание подтверждённого начала хвоста"""
+        tail = self._take_tail()
+        cut = min(len(tail), int(seconds * SAMPLE_RATE))
+        self._chunks = [tail[cut:]] if cut < len(tail) else []
+        self._tail_samples = len(tail) - cut
+        self._tail_offset += cut / SAMPLE_RATE
+
+    async def _emit(
+        self, event_type: str, text: str, language: str, confidence: float, tier: str, start: float, end: float
+    ):
+        event = {
+            "type": event_type,
+            "interview_id": self.interview_id,
+            "text": text,
+            "language": language,
+            "confidence": confidence,
+            "tier": tier,
+            "start": round(start, 2),
+            "end": round(end, 2)
+        }
+        if event_type == "asr_final":
+            transcript_journal.append_asr_final(self.interview_id, event)
+        await self.send(event)
+
+    async def _emit_partial(self):
+        tail = self._take_tail()
+        self._samples_since_decode = 0
+        window = tail[-int(self.partial_window_seconds * SAMPLE_RATE):]
+        end = self._tail_offset + len(tail) / SAMPLE_RATE
+        text, language, confidence, tier = await whisper_service.transcribe_audio(window, self.language)
+        if text and text != self._last_partial:
+            self._last_partial = text
+            await self._emit(
+                "asr_partial", text, language, confidence, tier,
+                end - len(window) / SAMPLE_RATE, end
+            )
+
+    async def _finalize(self):
+        """Окончательное распознавание хвоста на конце фразы"""
+        tail = self._take_tail()
+        start = self._tail_offset
+        end = start + len(tail) / SAMPLE_RATE
+
+        self._drop_tail(len(tail) / SAMPLE_RATE)
+        self._samples_since_decode = 0
+        self._speech_seen = False
+        self._last_partial = ""
+
+        if len(tail) == 0:
+            return
+
+        text, language, confidence, tier = await whisper_service.transcribe_audio(tail, self.language)
+        if text:
+            await self._emit("asr_final", text, language, confidence, tier, start, end)
+
+    async def _commit_stable_prefix(self):
+        """Подтверждение всех сегментов, кроме последнего, для длинной фразы.
+
+        Хвост обрезается не дальше конца последнего подтверждённого
+        сегмента, поэтому аудио без выданного ``asr_final`` не теряется.
+        """
+        tail = self._take_tail()
+        tier = whisper_service.policy.current_tier().name
+        segments, language = await whisper_service.transcribe_segments(tail, self.language)
+
+        if not segments:
+            # Речь не распознана — текста в хвосте нет, режем жёстко
+            committed = []
+            boundary = max(0.0, len(tail) / SAMPLE_RATE - self.max_tail_seconds / 2)
+        elif len(segments) == 1:
+            # Нет внутренней границы — единственный сегмент подтверждается
+            # целиком: аудио отбрасывается только вместе с выданным текстом
+            committed = segments
+            boundary = segments[0][1]
+        else:
+            committed = segments[:-1]
+            boundary = committed[-1][1]
+
+        for start, end, text, confidence in committed:
+            if text:
+                await self._emit(
+                    "asr_final", text, language, confidence, tier,
+                    self._tail_offset + start, self._tail_offset + end
+                )
+
+        self._drop_tail(boundary)
+        self._last_partial = ""
+
+    def start(self) -> asyncio.Task:
+        """Запуск цикла распознавания в фоновой задаче (её дожидается ``close``)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name=f"streaming-asr-{self.interview_id}")
+        return self._task
+
+    async def run(self):
+        """Цикл распознавания; работает до вызова ``close``"""
+        while not self._closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            try:
+                if self._speech_seen and self._trailing_silence >= self.endpoint_silence:
+                    await self._finalize()
+                elif self.tail_seconds > self.max_tail_seconds:
+                    await self._commit_stable_prefix()
+                elif self._samples_since_decode >= self.partial_interval * SAMPLE_RATE:
+                    await self._emit_partial()
+            except Exception as e:
+                logger.error(f"Ошибка потокового распознавания (собеседование {self.interview_id}): {e}")
+
+    async def close(self):
+        """Завершение потока с финальным распознаванием остатка"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            # Цикл доделывает текущий шаг и выходит: финализация не должна
+            # менять хвост одновременно с ним
+            await asyncio.gather(self._task, return_exceptions=True)
+        try:
+            await self._finalize()
+        except Exception as e:
+            logger.error(f"Ошибка при завершении потока распознавания (собеседование {self.interview_id}): {e}")
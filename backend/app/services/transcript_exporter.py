@@ -0,0 +1,210 @@
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+import aiofiles
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import ChatMessage, Interview, MessageRole
+from .transcript_journal import RECORD_ASR_FINAL, RECORD_MESSAGE, iter_journal
+
+FORMAT_JSON = "json"
+FORMAT_NDJSON = "ndjson"
+FORMAT_TXT = "txt"
+
+MEDIA_TYPES = {
+    FORMAT_JSON: "application/json",
+    FORMAT_NDJSON: "application/x-ndjson",
+    FORMAT_TXT: "text/plain; charset=utf-8"
+}
+
+# Типы записей транскрипции в формате ndjson
+RECORD_INTERVIEW = "interview"
+RECORD_SPEECH = "speech"
+
+# Сколько строк забирать из курсора базы за один раз
+FETCH_SIZE = 500
+# Размер буфера перед записью в файл
+WRITE_BUFFER_SIZE = 64 * 1024
+
+ROLE_NAMES = {
+    MessageRole.AI_HR.value: "AI HR",
+    MessageRole.CANDIDATE.value: "Кандидат",
+    MessageRole.RECRUITER.value: "Рекрутер",
+    # Финальные сегменты распознавания речи из журнала
+    RECORD_SPEECH: "Речь"
+}
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _interview_header(interview: Interview) -> dict:
+    return {
+        "type": RECORD_INTERVIEW,
+        "interview_id": interview.id,
+        "candidate_name": interview.candidate_name,
+        "position": interview.position,
+        "start_time": interview.started_at.isoformat() if interview.started_at else None,
+        "end_time": interview.finished_at.isoformat() if interview.finished_at else None,
+        "duration_seconds": interview.actual_duration
+    }
+
+
+def _message_record(message: ChatMessage) -> dict:
+    return {
+        "type": RECORD_MESSAGE,
+        "id": message.id,
+        "role": message.role.value,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat()
+    }
+
+
+def render_header(header: dict, fmt: str) -> str:
+    """Начало транскрипции по записи заголовка собеседования"""
+    if fmt == FORMAT_JSON:
+        # Массив сообщений дописывается в объект заголовка по мере чтения
+        data = {key: value for key, value in header.items() if key != "type"}
+        return _dumps(data)[:-1] + ',"messages":['
+    if fmt == FORMAT_NDJSON:
+        return _dumps(header) + "\n"
+    if fmt == FORMAT_TXT:
+        return (
+            "ТРАНСКРИПЦИЯ СОБЕСЕДОВАНИЯ\n"
+            f"Кандидат: {header['candidate_name']}\n"
+            f"Позиция: {header['position']}\n"
+            f"Время начала: {_parse_time(header['start_time'])}\n"
+            f"Время окончания: {_parse_time(header['end_time'])}\n"
+            f"Длительность: {header['duration_seconds']} секунд\n"
+            + "=" * 50 + "\n\n"
+        )
+    raise ValueError(f"Неизвестный формат транскрипции: {fmt}")
+
+
+def render_record(record: dict, fmt: str, first: bool = False) -> str:
+    """Одна реплика (сообщение чата или сегмент речи) в выбранном формате"""
+    if fmt == FORMAT_JSON:
+        data = {key: value for key, value in record.items() if key != "type"}
+        return ("" if first else ",") + _dumps(data)
+    if fmt == FORMAT_NDJSON:
+        return _dumps(record) + "\n"
+    if fmt == FORMAT_TXT:
+        clock = _parse_time(record["timestamp"]).strftime("%H:%M:%S")
+        role_name = ROLE_NAMES.get(record["role"], record["role"])
+        return f"[{clock}] {role_name}: {record['content']}\n"
+    raise ValueError(f"Неизвестный формат транскрипции: {fmt}")
+
+
+def render_footer(fmt: str) -> str:
+    return "]}\n" if fmt == FORMAT_JSON else ""
+
+
+def render_records(records: Iterable[dict], fmt: str) -> Iterator[str]:
+    """Транскрипция по частям из последовательности записей ndjson.
+
+    Первой записью должен идти заголовок собеседования.
+    """
+    first = True
+    for record in records:
+        if record.get("type") == RECORD_INTERVIEW:
+            yield render_header(record, fmt)
+            continue
+        yield render_record(record, fmt, first)
+        first = False
+    yield render_footer(fmt)
+
+
+def message_records(interview: Interview, messages: Iterable[ChatMessage]) -> Iterator[dict]:
+    """Записи транскрипции из уже загруженных сообщений"""
+    yield _interview_header(interview)
+    for message in messages:
+        yield _message_record(message)
+
+
+def journal_records(interview: Interview, journal_path: str) -> Iterator[dict]:
+    """Записи транскрипции из журнала собеседования за один проход"""
+    yield _interview_header(interview)
+    for entry in iter_journal(journal_path):
+        if entry.get("type") == RECORD_MESSAGE:
+            yield entry
+        elif entry.get("type") == RECORD_ASR_FINAL:
+            yield {
+                "type": RECORD_SPEECH,
+                "role": RECORD_SPEECH,
+                "content": entry["text"],
+                "timestamp": entry["timestamp"],
+                "start": entry.get("start"),
+                "end": entry.get("end")
+            }
+
+
+async def iter_messages(interview_id: int, session: AsyncSession) -> AsyncIterator[ChatMessage]:
+    """Сообщения собеседования по порядку через серверный курсор.
+
+    Строки забираются порциями по ``FETCH_SIZE``, поэтому память не зависит
+    от длины собеседования.
+    """
+    statement = select(ChatMessage).where(
+        ChatMessage.interview_id == interview_id
+    ).order_by(ChatMessage.timestamp, ChatMessage.id).execution_options(yield_per=FETCH_SIZE)
+
+    result = await session.stream(statement)
+    async for message in result.scalars():
+        yield message
+
+
+async def export_transcript(interview: Interview, session: AsyncSession, fmt: str = FORMAT_JSON) -> AsyncIterator[str]:
+    """Транскрипция собеседования из базы по частям в формате json, ndjson или txt"""
+    yield render_header(_interview_header(interview), fmt)
+    first = True
+    async for message in iter_messages(interview.id, session):
+        yield render_record(_message_record(message), fmt, first)
+        first = False
+    yield render_footer(fmt)
+
+
+async def write_transcript(interview: Interview, session: AsyncSession, file_path: str, fmt: str = FORMAT_JSON) -> str:
+    """Потоковая запись транскрипции в файл.
+
+    Запись идёт во временный файл, который переименовывается в конце,
+    поэтому повторный запуск перезаписывает файл целиком, а не дописывает.
+    """
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    temp_path = f"{file_path}.tmp"
+
+    buffer = []
+    buffered = 0
+    async with aiofiles.open(temp_path, "w", encoding="utf-8") as f:
+        async for chunk in export_transcript(interview, session, fmt):
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= WRITE_BUFFER_SIZE:
+                await f.write("".join(buffer))
+                buffer.clear()
+                buffered = 0
+        if buffer:
+            await f.write("".join(buffer))
+
+    os.replace(temp_path, file_path)
+    return file_path
+
+
+def write_records(records: Iterable[dict], file_path: str, fmt: str = FORMAT_NDJSON) -> str:
+    """Синхронная запись транскрипции из записей в файл (для ``asyncio.to_thread``)"""
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    temp_path = f"{file_path}.tmp"
+
+    with open(temp_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        for chunk in render_records(records, fmt):
+            f.write(chunk)
+
+    os.replace(temp_path, file_path)
+    return file_path
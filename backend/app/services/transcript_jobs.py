@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from ..database import async_session_maker
+from ..models import Interview, TranscriptJob, TranscriptJobStatus
+from .message_writer import message_writer
+from .transcript_exporter import FORMAT_NDJSON, journal_records, write_records, write_transcript
+from .transcript_journal import transcript_journal
+from .transcript_service import transcript_service
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptJobQueue:
+    """Фоновая генерация транскрипций завершённых собеседований.
+
+    Задачи хранятся в таблице ``TranscriptJob``, а в памяти лежат только их
+    id, поэтому после перезапуска незавершённые задачи подхватываются
+    заново. Каноническая транскрипция строится из запечатанного журнала
+    собеседования за один проход (если журнала нет — потоково из базы) и
+    сохраняется в хранилище транскрипций.
+    Упавшая задача повторяется с экспоненциальной задержкой до
+    ``max_attempts`` раз.
+
+    Несколько воркеров uvicorn поднимают одни и те же задачи из базы,
+    поэтому задача захватывается условным UPDATE: выполняет её тот, кто
+    перевёл её в RUNNING. Задача в RUNNING дольше ``stale_after`` секунд
+    считается брошенной упавшим воркером и может быть захвачена снова.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        retry_delay: float = 2.0,
+        work_dir: str = "transcripts/tmp",
+        stale_after: float = 600.0
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self.work_dir = work_dir
+        # Вызывается с готовой (или окончательно упавшей) задачей
+        self.on_finished: Optional[Callable[[TranscriptJob], Awaitable[None]]] = None
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._retries: set = set()
+
+    def _ensure_worker(self):
+        """Ленивый запуск фоновой задачи в текущем event loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run(), name="transcript-jobs")
+
+    async def start(self):
+        """Запуск обработчика и восстановление незавершённых задач"""
+        self._ensure_worker()
+        async with async_session_maker() as session:
+            statement = select(TranscriptJob).where(
+                TranscriptJob.status.in_([TranscriptJobStatus.PENDING, TranscriptJobStatus.RUNNING])
+            )
+            jobs = (await session.exec(statement)).all()
+
+        for job in jobs:
+            self._queue.put_nowait(job.id)
+        if jobs:
+            logger.info(f"Восстановлено незавершённых задач транскрипции: {len(jobs)}")
+
+    async def submit(self, interview_id: int) -> TranscriptJob:
+        """Создание задачи для собеседования (идемпотентно).
+
+        Если задача уже существует, новая не создаётся: возвращается
+        существующая, а окончательно упавшая ставится в очередь повторно.
+        Гонка параллельных вызовов разрешается уникальным индексом по
+        ``interview_id``: проигравший возвращает задачу победителя.
+        """
+        self._ensure_worker()
+        async with async_session_maker() as session:
+            job = (await session.exec(
+                select(TranscriptJob).where(TranscriptJob.interview_id == interview_id)
+            )).first()
+
+            if job is None:
+                job = TranscriptJob(interview_id=interview_id)
+                session.add(job)
+            elif job.status == TranscriptJobStatus.FAILED:
+                job.status = TranscriptJobStatus.PENDING
+                job.attempts = 0
+                job.last_error = None
+            else:
+                return job
+
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Параллельный вызов успел создать задачу для этого
+                # собеседования — возвращаем её, она уже в очереди
+                await session.rollback()
+                return (await session.exec(
+                    select(TranscriptJob).where(TranscriptJob.interview_id == interview_id)
+                )).one()
+            await session.refresh(job)
+
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def get_job(self, job_id: int) -> Optional[TranscriptJob]:
+        async with async_session_maker() as session:
+            return await session.get(TranscriptJob, job_id)
+
+    async def _run(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика задач транскрипции (задача {job_id}): {e}")
+
+    async def _claim(self, session, job_id: int) -> bool:
+        """Атомарный захват задачи; False — её выполняет другой воркер или она завершена"""
+        now = datetime.utcnow()
+        result = await session.exec(
+            update(TranscriptJob)
+            .where(
+                TranscriptJob.id == job_id,
+                or_(
+                    TranscriptJob.status == TranscriptJobStatus.PENDING,
+                    and_(
+                        TranscriptJob.status == TranscriptJobStatus.RUNNING,
+                        or_(
+                            TranscriptJob.claimed_at.is_(None),
+                            TranscriptJob.claimed_at < now - timedelta(seconds=self.stale_after)
+                        )
+                    )
+                )
+            )
+            .values(
+                status=TranscriptJobStatus.RUNNING,
+                claimed_at=now,
+                attempts=TranscriptJob.attempts + 1
+            )
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+    async def _process(self, job_id: int):
+        async with async_session_maker() as session:
+            if not await self._claim(session, job_id):
+                job = await session.get(TranscriptJob, job_id)
+                if job is not None and job.status == TranscriptJobStatus.RUNNING and job.claimed_at:
+                    # Задачу выполняет другой воркер: если он упадёт, задача
+                    # будет захвачена здесь, когда устареет
+                    delay = (job.claimed_at - datetime.utcnow()).total_seconds() + self.stale_after
+                    self._schedule_retry(job_id, max(0.0, delay) + self.retry_delay)
+                return
+
+            job = await session.get(TranscriptJob, job_id)
+
+            try:
+                interview = await session.get(Interview, job.interview_id)
+
+                # Временный файл зависит только от собеседования, поэтому
+                # ретрай перезаписывает его, а не создаёт копии
+                temp_path = os.path.join(self.work_dir, f"interview_{interview.id}.ndjson")
+
+                # Запечатывание с ожиданием остальных воркеров — здесь,
+                # а не в запросе завершения собеседования
+                journal_path = await transcript_journal.seal(interview.id)
+                if journal_path:
+                    await asyncio.to_thread(
+                        write_records, journal_records(interview, journal_path), temp_path, FORMAT_NDJSON
+                    )
+                else:
+                    # Собеседование без журнала (например, начатое до его
+                    # появления) — все принятые сообщения берутся из базы
+                    await message_writer.flush()
+                    await write_transcript(interview, session, temp_path, FORMAT_NDJSON)
+
+                content_key = await transcript_service.store_file(temp_path)
+                os.remove(temp_path)
+            except Exception as e:
+                await session.rollback()
+                job = await session.get(TranscriptJob, job_id)
+                await self._handle_failure(session, job, e)
+                return
+
+            job.status = TranscriptJobStatus.DONE
+            job.content_key = content_key
+            job.storage_path = transcript_service.locate(content_key)
+            job.last_error = None
+            job.finished_at = datetime.utcnow()
+            interview.transcript_file_path = job.storage_path
+            await session.commit()
+
+        logger.info(f"Транскрипция собеседования {job.interview_id} сохранена: {job.storage_path}")
+        await self._notify(job)
+
+    async def _handle_failure(self, session, job: TranscriptJob, error: Exception):
+        job.last_error = str(error)
+        if job.attempts < self.max_attempts:
+            job.status = TranscriptJobStatus.PENDING
+            await session.commit()
+
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            logger.warning(
+                f"Ошибка транскрипции собеседования {job.interview_id} "
+                f"(попытка {job.attempts}/{self.max_attempts}), повтор через {delay:.1f} с: {error}"
+            )
+            self._schedule_retry(job.id, delay)
+            return
+
+        job.status = TranscriptJobStatus.FAILED
+        job.finished_at = datetime.utcnow()
+        await session.commit()
+        logger.error(f"Транскрипция собеседования {job.interview_id} не создана: {error}")
+        await self._notify(job)
+
+    def _schedule_retry(self, job_id: int, delay: float):
+        retry = asyncio.create_task(self._retry_later(job_id, delay))
+        self._retries.add(retry)
+        retry.add_done_callback(self._retries.discard)
+
+    async def _retry_later(self, job_id: int, delay: float):
+        await asyncio.sleep(delay)
+        self._queue.put_nowait(job_id)
+
+    async def _notify(self, job: TranscriptJob):
+        if self.on_finished is None:
+            return
+        try:
+            await self.on_finished(job)
+        except Exception as e:
+            logger.error(f"Ошибка при уведомлении о транскрипции {job.id}: {e}")
+
+    async def shutdown(self):
+        """Остановка обработчика; незавершённые задачи остаются в базе"""
+        for task in [self._worker, *self._retries]:
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._worker = None
+
+
+# Глобальный экземпляр
+transcript_jobs = TranscriptJobQueue(
+    max_attempts=int(os.getenv("TRANSCRIPT_JOB_MAX_ATTEMPTS", "3")),
+    retry_delay=float(os.getenv("TRANSCRIPT_JOB_RETRY_DELAY", "2")),
+    stale_after=float(os.getenv("TRANSCRIPT_JOB_STALE_AFTER", "600"))
+)
@@ -0,0 +1,388 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from .broadcast import NODE_ID, BroadcastBackend, InMemoryBroadcast, broadcast
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировки файлов между процессами нет, работает один процесс
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RECORD_MESSAGE = "message"
+RECORD_ASR_FINAL = "asr_final"
+RECORD_SEALED = "sealed"
+
+# Канал запросов на запечатывание: воркеры дописывают свои буферы до seal
+SEAL_CHANNEL = "transcript-journal-seal"
+# Файл блокировки каталога журналов: запись и переименование .part
+# выполняются под ней во всех процессах
+LOCK_FILE = ".journal.lock"
+
+
+@contextmanager
+def _process_lock(path: str):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class _JournalFile:
+    """Журнал одного собеседования: буфер строк и файл, открытый на дозапись"""
+
+    def __init__(self, active_path: str, sealed_path: str, lock_path: str):
+        self.active_path = active_path
+        self.sealed_path = sealed_path
+        self.lock_path = lock_path
+        self.pending: List[str] = []
+        self.pending_bytes = 0
+        self.records = 0
+        self.handle = None
+        # Файловые операции выполняются в пуле потоков
+        self.lock = threading.Lock()
+        # Запись буфера и запечатывание не пересекаются: иначе запись,
+        # начатая до seal, создала бы после переименования новый .part
+        self.io_lock = asyncio.Lock()
+        self.sealed = os.path.exists(sealed_path)
+        # seal уже начат: новые записи в журнал не принимаются
+        self.sealing = False
+
+    def append_lines(self, lines: List[str], fsync: bool):
+        """Дозапись строк; вызывается под ``lock`` и блокировкой процессов"""
+        if self.handle is None:
+            self.handle = open(self.active_path, "a", encoding="utf-8")
+        self.handle.write("".join(lines))
+        self.handle.flush()
+        if fsync:
+            os.fsync(self.handle.fileno())
+
+    def close_handle(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def write(self, lines: List[str], fsync: bool) -> bool:
+        """Дозапись строк; False — журнал уже запечатан другим процессом"""
+        with self.lock, _process_lock(self.lock_path):
+            if os.path.exists(self.sealed_path):
+                # Открытый дескриптор указывает на переименованный файл
+                self.close_handle()
+                return False
+            self.append_lines(lines, fsync)
+            return True
+
+    def close(self):
+        with self.lock:
+            self.close_handle()
+
+
+class TranscriptJournal:
+    """Append-only журнал собеседования в формате NDJSON.
+
+    Каждое сообщение чата и каждый финальный сегмент распознавания речи
+    дописываются в журнал по мере поступления. ``append`` только кладёт
+    строку в буфер в памяти; фоновая задача раз в ``fsync_interval``
+    секунд (или при переполнении буфера) дописывает буферы на диск и делает
+    fsync, так что при падении процесса теряется не больше интервала.
+
+    Пока собеседование идёт, журнал лежит в ``interview_<id>.ndjson.part``;
+    ``seal`` дописывает завершающую запись и переименовывает файл в
+    ``interview_<id>.ndjson``. После этого журнал больше не меняется.
+
+    Несколько воркеров с общим каталогом журналов пишут в один файл
+    собеседования под блокировкой файла ``LOCK_FILE``. Если ``backend`` —
+    рассылка между процессами, ``seal`` сначала публикует запрос в
+    ``SEAL_CHANNEL``: остальные воркеры сразу дописывают буферы этого
+    собеседования, а запечатывание ждёт ``seal_settle`` секунд (не меньше
+    интервала фоновой записи), чтобы в журнал попали строки, принятые
+    любым воркером до seal. Строки, дописанные после seal, отбрасываются
+    и учитываются в ``records_dropped``.
+    """
+
+    def __init__(
+        self,
+        directory: str = "transcripts/journal",
+        fsync_interval: float = 1.0,
+        max_buffer_bytes: int = 64 * 1024,
+        backend: Optional[BroadcastBackend] = None,
+        seal_settle: Optional[float] = None
+    ):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        self.backend = backend
+        self.seal_settle = 2 * fsync_interval if seal_settle is None else seal_settle
+
+        self._journals: Dict[int, _JournalFile] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._subscribed = False
+
+        # Счётчики для мониторинга
+        self.records_appended = 0
+        self.records_dropped = 0
+        self.fsyncs = 0
+
+    def _ensure_worker(self):
+        """Ленивый запуск фоновой задачи в текущем event loop"""
+        if self._worker is None or self._worker.done():
+            os.makedirs(self.directory, exist_ok=True)
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run(), name="transcript-journal")
+
+    @property
+    def multi_process(self) -> bool:
+        """Журналы могут писать несколько процессов"""
+        return self.backend is not None and not isinstance(self.backend, InMemoryBroadcast)
+
+    async def start(self):
+        """Подписка на запросы запечатывания от других воркеров"""
+        if self.multi_process and not self._subscribed:
+            await self.backend.subscribe(SEAL_CHANNEL, self._on_seal_request)
+            self._subscribed = True
+
+    async def _on_seal_request(self, message: str):
+        # Свой запрос тоже обрабатывается: запись буфера под io_lock не мешает seal
+        request = json.loads(message)
+        journal = self._journals.get(request["interview_id"])
+        if journal is not None:
+            await self._flush_journal(journal, fsync=True)
+
+    def sealed_path(self, interview_id: int) -> str:
+        return os.path.join(self.directory, f"interview_{interview_id}.ndjson")
+
+    def active_path(self, interview_id: int) -> str:
+        return self.sealed_path(interview_id) + ".part"
+
+    def _journal(self, interview_id: int) -> _JournalFile:
+        journal = self._journals.get(interview_id)
+        if journal is None:
+            journal = _JournalFile(
+                self.active_path(interview_id),
+                self.sealed_path(interview_id),
+                os.path.join(self.directory, LOCK_FILE)
+            )
+            self._journals[interview_id] = journal
+        return journal
+
+    def append(self, interview_id: int, record: Dict[str, Any]):
+        """Добавление записи в журнал собеседования (без ожидания диска)"""
+        self._ensure_worker()
+        journal = self._journal(interview_id)
+        if journal.sealed or journal.sealing:
+            # Собеседование уже завершено — запечатанный журнал не меняется
+            self.records_dropped += 1
+            logger.debug(f"Запись в запечатанный журнал собеседования {interview_id} пропущена")
+            return
+
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        journal.pending.append(line)
+        journal.pending_bytes += len(line)
+        journal.records += 1
+        self.records_appended += 1
+
+        if journal.pending_bytes >= self.max_buffer_bytes:
+            self._wakeup.set()
+
+    def append_message(self, message):
+        """Запись сообщения чата"""
+        self.append(message.interview_id, {
+            "type": RECORD_MESSAGE,
+            "id": message.id,
+            "role": message.role.value,
+            "content": message.content,
+            "timestamp": message.timestamp.isoformat()
+        })
+
+    def append_asr_final(self, interview_id: int, event: Dict[str, Any]):
+        """Запись финального сегмента распознавания речи"""
+        self.append(interview_id, {
+            "type": RECORD_ASR_FINAL,
+            "text": event["text"],
+            "language": event.get("language"),
+            "confidence": event.get("confidence"),
+            "start": event.get("start"),
+            "end": event.get("end"),
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    @staticmethod
+    def _take_pending(journal: _JournalFile) -> List[str]:
+        lines = journal.pending
+        journal.pending = []
+        journal.pending_bytes = 0
+        return lines
+
+    async def _flush_journal(self, journal: _JournalFile, fsync: bool):
+        async with journal.io_lock:
+            if journal.sealed or not journal.pending:
+                return
+            lines = self._take_pending(journal)
+            try:
+                written = await asyncio.to_thread(journal.write, lines, fsync)
+            except Exception:
+                # Строки возвращаются в буфер и будут записаны на следующем такте
+                journal.pending[:0] = lines
+                journal.pending_bytes += sum(len(line) for line in lines)
+                raise
+            if not written:
+                journal.sealed = True
+                self.records_dropped += len(lines)
+                logger.warning(f"Журнал {journal.sealed_path} запечатан другим процессом, строк отброшено: {len(lines)}")
+            elif fsync:
+                self.fsyncs += 1
+
+    async def flush(self, fsync: bool = True):
+        """Запись всех буферов на диск"""
+        journals = [journal for journal in self._journals.values() if journal.pending]
+        results = await asyncio.gather(
+            *(self._flush_journal(journal, fsync) for journal in journals), return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.fsync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при записи журнала транскрипции: {e}")
+
+    async def seal(self, interview_id: int) -> Optional[str]:
+        """Запечатывание журнала; возвращает путь или None, если журнала нет.
+
+        Повторный вызов для уже запечатанного журнала просто возвращает путь.
+        Может ждать ``seal_settle`` секунд, поэтому вызывается из фоновой
+        задачи транскрипции, а не из обработчика запроса.
+        """
+        journal = self._journal(interview_id)
+        if self.multi_process and not journal.sealed and not os.path.exists(journal.sealed_path):
+            await self._request_seal(interview_id)
+
+        # Ждём запись буфера, начатую до seal (фоновый flush)
+        async with journal.io_lock:
+            if journal.sealed or os.path.exists(journal.sealed_path):
+                journal.sealed = True
+                self._journals.pop(interview_id, None)
+                return journal.sealed_path
+
+            lines = self._take_pending(journal)
+            if not lines and not os.path.exists(journal.active_path):
+                return None
+
+            sealed_record = json.dumps({
+                "type": RECORD_SEALED,
+                "interview_id": interview_id,
+                "sealed_at": datetime.utcnow().isoformat()
+            }) + "\n"
+
+            written = False
+
+            def write_and_seal():
+                nonlocal written
+                with journal.lock, _process_lock(journal.lock_path):
+                    if os.path.exists(journal.sealed_path):
+                        # Другой процесс запечатал журнал, пока ждали блокировку
+                        journal.close_handle()
+                        return False
+                    journal.append_lines(lines, fsync=False)
+                    written = True
+                    journal.append_lines([sealed_record], fsync=True)
+                    journal.close_handle()
+                    os.replace(journal.active_path, journal.sealed_path)
+                    return True
+
+            journal.sealing = True
+            try:
+                if not await asyncio.to_thread(write_and_seal) and lines:
+                    self.records_dropped += len(lines)
+                    logger.warning(f"Журнал {journal.sealed_path} запечатан другим процессом, строк отброшено: {len(lines)}")
+            except Exception:
+                # Журнал не запечатан, seal можно повторить; незаписанные строки возвращаются в буфер
+                if not written:
+                    journal.pending[:0] = lines
+                    journal.pending_bytes += sum(len(line) for line in lines)
+                raise
+            finally:
+                journal.sealing = False
+            journal.sealed = True
+        self._journals.pop(interview_id, None)
+        logger.info(f"Журнал собеседования {interview_id} запечатан: {journal.sealed_path}")
+        return journal.sealed_path
+
+    async def _request_seal(self, interview_id: int):
+        """Запрос остальным воркерам дописать буферы собеседования и ожидание"""
+        try:
+            await self.backend.publish(SEAL_CHANNEL, json.dumps({"interview_id": interview_id, "node": NODE_ID}))
+        except Exception as e:
+            logger.error(f"Не удалось отправить запрос на запечатывание журнала {interview_id}: {e}")
+        await asyncio.sleep(self.seal_settle)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика журнала"""
+        return {
+            "open_journals": len(self._journals),
+            "pending_records": sum(len(journal.pending) for journal in self._journals.values()),
+            "records_appended": self.records_appended,
+            "records_dropped": self.records_dropped,
+            "fsyncs": self.fsyncs
+        }
+
+    async def shutdown(self):
+        """Остановка фоновой задачи, запись буферов и закрытие файлов"""
+        if self._subscribed:
+            await self.backend.unsubscribe(SEAL_CHANNEL)
+            self._subscribed = False
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        await self.flush()
+        for journal in self._journals.values():
+            journal.close()
+
+
+def iter_journal(path: str) -> Iterator[Dict[str, Any]]:
+    """Последовательное чтение записей журнала.
+
+    Недописанная последняя строка (процесс упал во время записи)
+    пропускается.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Повреждённая строка в журнале {path} пропущена")
+
+
+# Глобальный экземпляр
+transcript_journal = TranscriptJournal(
+    directory=os.getenv("TRANSCRIPT_JOURNAL_DIR", "transcripts/journal"),
+    fsync_interval=float(os.getenv("TRANSCRIPT_JOURNAL_FSYNC_INTERVAL", "1.0")),
+    backend=broadcast
+)
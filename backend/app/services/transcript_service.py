@@ -1,127 +1,119 @@
-import os
+import asyncio
 import json
+import os
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, Iterator, List, Optional
+
 from ..models import ChatMessage, Interview
+from .transcript_exporter import (
+    FORMAT_JSON,
+    FORMAT_NDJSON,
+    FORMAT_TXT,
+    WRITE_BUFFER_SIZE,
+    message_records,
+    render_records,
+    write_records
+)
+from .transcript_storage import TranscriptStorage, build_storage
+
+# Каталог файлов, которые создают create_transcript_file и create_simple_text_transcript
+TRANSCRIPTS_DIR = "transcripts"
+
+
+def _iter_lines(chunks: Iterator[bytes]) -> Iterator[dict]:
+    """Записи ndjson из потока распакованных кадров (строка может лежать на границе кадров)"""
+    rest = b""
+    for chunk in chunks:
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            if line:
+                yield json.loads(line)
+    if rest:
+        yield json.loads(rest)
+
+
+def _batched(texts: Iterator[str], size: int = WRITE_BUFFER_SIZE) -> Iterator[bytes]:
+    """Склейка мелких фрагментов в блоки около ``size`` байт"""
+    buffer = []
+    buffered = 0
+    for text in texts:
+        buffer.append(text)
+        buffered += len(text)
+        if buffered >= size:
+            yield "".join(buffer).encode("utf-8")
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
 
 
 class TranscriptService:
-    
+    """Хранение готовых транскрипций.
+
+    Каноническая форма транскрипции — ndjson (заголовок собеседования и по
+    строке на реплику). Она сохраняется в хранилище в сжатом виде под ключом
+    sha256 содержимого, а json и txt строятся из неё при чтении.
+
+    ``create_transcript_file`` и ``create_simple_text_transcript`` оставлены
+    для прежних вызовов ``TranscriptService.<метод>(interview, messages)``:
+    они пишут файл в ``TRANSCRIPTS_DIR`` в формате текущей выгрузки
+    (``transcript_exporter``) и возвращают путь.
+    """
+
+    def __init__(self, storage: TranscriptStorage):
+        self.storage = storage
+
+    @staticmethod
+    def _legacy_file(interview: Interview, messages: List[ChatMessage], fmt: str) -> str:
+        filename = f"interview_{interview.id}_{interview.unique_link[:8]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+        return write_records(message_records(interview, messages), os.path.join(TRANSCRIPTS_DIR, filename), fmt)
+
     @staticmethod
     def create_transcript_file(interview: Interview, messages: List[ChatMessage]) -> str:
-        """Создание файла транскрипции собеседования"""
-        
-        # Создание папки для транскрипций если её нет
-        transcripts_dir = "transcripts"
-        os.makedirs(transcripts_dir, exist_ok=True)
-        
-        # Формирование имени файла
-        filename = f"interview_{interview.id}_{interview.unique_link[:8]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        file_path = os.path.join(transcripts_dir, filename)
-        
-        # Подготовка данных для записи
-        transcript_data = {
-            "interview_info": {
-                "id": interview.id,
-                "unique_link": interview.unique_link,
-                "candidate_name": interview.candidate_name,
-                "candidate_email": interview.candidate_email,
-                "position": interview.position,
-                "recommended_duration_minutes": interview.recommended_duration,
-                "actual_duration_seconds": interview.actual_duration,
-                "status": interview.status,
-                "created_at": interview.created_at.isoformat() if interview.created_at else None,
-                "started_at": interview.started_at.isoformat() if interview.started_at else None,
-                "finished_at": interview.finished_at.isoformat() if interview.finished_at else None,
-                "knowledge_base": interview.knowledge_base,
-                "description": interview.description
-            },
-            "conversation": []
-        }
-        
-        # Добавление сообщений чата
-        for message in messages:
-            transcript_data["conversation"].append({
-                "id": message.id,
-                "role": message.role,
-                "content": message.content,
-                "timestamp": message.timestamp.isoformat() if message.timestamp else None
-            })
-        
-        # Добавление метаданных
-        transcript_data["metadata"] = {
-            "total_messages": len(messages),
-            "transcript_created_at": datetime.now().isoformat(),
-            "file_version": "1.0"
-        }
-        
-        # Запись в файл
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(transcript_data, f, ensure_ascii=False, indent=2)
-        
-        return file_path
-    
+        """Создание файла транскрипции собеседования (json)"""
+        return TranscriptService._legacy_file(interview, messages, FORMAT_JSON)
+
     @staticmethod
     def create_simple_text_transcript(interview: Interview, messages: List[ChatMessage]) -> str:
         """Создание простого текстового файла транскрипции"""
-        
-        # Создание папки для транскрипций если её нет
-        transcripts_dir = "transcripts"
-        os.makedirs(transcripts_dir, exist_ok=True)
-        
-        # Формирование имени файла
-        filename = f"interview_{interview.id}_{interview.unique_link[:8]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        file_path = os.path.join(transcripts_dir, filename)
-        
-        # Формирование содержимого
-        content_lines = []
-        content_lines.append(f"ТРАНСКРИПЦИЯ СОБЕСЕДОВАНИЯ")
-        content_lines.append(f"=" * 50)
-        content_lines.append(f"ID собеседования: {interview.id}")
-        content_lines.append(f"Кандидат: {interview.candidate_name}")
-        content_lines.append(f"Email: {interview.candidate_email}")
-        content_lines.append(f"Позиция: {interview.position}")
-        content_lines.append(f"Рекомендуемая длительность: {interview.recommended_duration} мин")
-        
-        if interview.actual_duration:
-            actual_minutes = interview.actual_duration // 60
-            actual_seconds = interview.actual_duration % 60
-            content_lines.append(f"Фактическая длительность: {actual_minutes}:{actual_seconds:02d}")
-        
-        content_lines.append(f"Статус: {interview.status}")
-        content_lines.append(f"Создано: {interview.created_at.strftime('%Y-%m-%d %H:%M:%S') if interview.created_at else 'N/A'}")
-        
-        if interview.started_at:
-            content_lines.append(f"Начато: {interview.started_at.strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        if interview.finished_at:
-            content_lines.append(f"Завершено: {interview.finished_at.strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        content_lines.append(f"=" * 50)
-        content_lines.append("")
-        
-        # Добавление разговора
-        content_lines.append("РАЗГОВОР:")
-        content_lines.append("-" * 30)
-        
-        role_names = {
-            "ai_hr": "AI HR",
-            "candidate": "КАНДИДАТ",
-            "recruiter": "РЕКРУТЕР"
-        }
-        
-        for message in messages:
-            timestamp = message.timestamp.strftime('%H:%M:%S') if message.timestamp else 'N/A'
-            role_name = role_names.get(message.role, message.role.upper())
-            content_lines.append(f"[{timestamp}] {role_name}: {message.content}")
-        
-        content_lines.append("")
-        content_lines.append("-" * 30)
-        content_lines.append(f"Всего сообщений: {len(messages)}")
-        content_lines.append(f"Транскрипция создана: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        # Запись в файл
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(content_lines))
-        
-        return file_path
+        return TranscriptService._legacy_file(interview, messages, FORMAT_TXT)
+
+    async def store_file(self, path: str) -> str:
+        """Сохранение канонической транскрипции из файла; возвращает ключ"""
+        return await asyncio.to_thread(self.storage.put_file, path)
+
+    def locate(self, key: str) -> str:
+        return self.storage.locate(key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self.storage.exists, key)
+
+    async def size(self, key: str) -> int:
+        """Размер канонической транскрипции в байтах"""
+        return await asyncio.to_thread(self.storage.size, key)
+
+    async def read_range(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Диапазон байт канонической транскрипции"""
+        return await asyncio.to_thread(self.storage.read_range, key, start, end)
+
+    async def render(self, key: str, fmt: str = FORMAT_NDJSON) -> AsyncIterator[bytes]:
+        """Транскрипция в выбранном формате, кадр за кадром.
+
+        Каждый кадр читается и распаковывается в пуле потоков, поэтому
+        память и блокировки event loop не зависят от размера транскрипции.
+        """
+        chunks = self.storage.iter_chunks(key)
+        if fmt != FORMAT_NDJSON:
+            chunks = _batched(render_records(_iter_lines(chunks), fmt))
+
+        sentinel = object()
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, sentinel)
+            if chunk is sentinel:
+                break
+            yield chunk
+
+
+# Глобальный экземпляр
+transcript_service = TranscriptService(build_storage())
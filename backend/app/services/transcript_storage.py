@@ -0,0 +1,302 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+# Формат индекса кадров сжатого объекта
+INDEX_VERSION = 1
+
+
+class TranscriptStorage(ABC):
+    """Контентно-адресуемое хранилище сжатых транскрипций.
+
+    Транскрипция хранится как набор независимых zstd-кадров по
+    ``frame_size`` байт исходного текста плюс небольшой индекс со смещениями
+    кадров. Ключ объекта — sha256 исходного содержимого, поэтому одинаковые
+    транскрипции хранятся один раз. Благодаря индексу диапазон байт читается
+    с распаковкой только нужных кадров.
+
+    Наследники реализуют только работу с объектами: ``_put_object``,
+    ``_read_object`` и ``_object_exists``. Методы синхронные — из async-кода
+    они вызываются через ``asyncio.to_thread``.
+    """
+
+    def __init__(self, frame_size: int = 256 * 1024, level: int = 6, index_cache_size: int = 256):
+        self.frame_size = frame_size
+        self.level = level
+        self.index_cache_size = index_cache_size
+        self._indexes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        # Счётчики для мониторинга
+        self.objects_stored = 0
+        self.deduplicated = 0
+        self.bytes_in = 0
+        self.bytes_stored = 0
+
+    # --- Операции с объектами, реализуются наследниками ---
+
+    @abstractmethod
+    def _put_object(self, name: str, body: BinaryIO, size: int):
+        ...
+
+    @abstractmethod
+    def _read_object(self, name: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+        """Чтение объекта целиком или диапазона [start, end)"""
+
+    @abstractmethod
+    def _object_exists(self, name: str) -> bool:
+        ...
+
+    @abstractmethod
+    def locate(self, key: str) -> str:
+        """Адрес сжатого объекта для логов и ссылок"""
+
+    # --- Общая логика ---
+
+    @staticmethod
+    def _object_name(key: str) -> str:
+        # Двухуровневое шардирование: каталоги (префиксы) не разрастаются
+        return f"{key[:2]}/{key[2:4]}/{key}.zst"
+
+    @classmethod
+    def _index_name(cls, key: str) -> str:
+        return cls._object_name(key) + ".idx"
+
+    def exists(self, key: str) -> bool:
+        # Индекс пишется последним, поэтому его наличие означает целый объект
+        return key in self._indexes or self._object_exists(self._index_name(key))
+
+    def put_file(self, path: str) -> str:
+        """Сжатие и сохранение файла; возвращает ключ содержимого.
+
+        Файл читается один раз: sha256 считается одновременно со сжатием
+        кадров во временный файл. Если такое содержимое уже есть, новый
+        объект не записывается.
+        """
+        compressor = zstandard.ZstdCompressor(level=self.level, write_content_size=True)
+        digest = hashlib.sha256()
+        frames: List[Tuple[int, int]] = []
+        size = 0
+        offset = 0
+
+        with tempfile.TemporaryFile() as compressed, open(path, "rb") as source:
+            while True:
+                chunk = source.read(self.frame_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                frame = compressor.compress(chunk)
+                compressed.write(frame)
+                frames.append((offset, len(frame)))
+                offset += len(frame)
+                size += len(chunk)
+
+            key = digest.hexdigest()
+            self.bytes_in += size
+            if self.exists(key):
+                self.deduplicated += 1
+                logger.info(f"Транскрипция {key[:12]} уже сохранена, повторная запись пропущена")
+                return key
+
+            index = {
+                "version": INDEX_VERSION,
+                "frame_size": self.frame_size,
+                "size": size,
+                "compressed_size": offset,
+                "frames": frames
+            }
+            compressed.seek(0)
+            self._put_object(self._object_name(key), compressed, offset)
+            index_body = json.dumps(index).encode("utf-8")
+            self._put_object(self._index_name(key), io.BytesIO(index_body), len(index_body))
+
+        self._remember_index(key, index)
+        self.objects_stored += 1
+        self.bytes_stored += offset
+        return key
+
+    def _remember_index(self, key: str, index: dict):
+        with self._lock:
+            if len(self._indexes) >= self.index_cache_size:
+                self._indexes.pop(next(iter(self._indexes)))
+            self._indexes[key] = index
+
+    def index(self, key: str) -> dict:
+        """Индекс кадров объекта (неизменяемый, поэтому кэшируется)"""
+        cached = self._indexes.get(key)
+        if cached is not None:
+            return cached
+        try:
+            index = json.loads(self._read_object(self._index_name(key)))
+        except FileNotFoundError:
+            raise KeyError(key)
+        self._remember_index(key, index)
+        return index
+
+    def size(self, key: str) -> int:
+        """Размер исходного (несжатого) содержимого"""
+        return self.index(key)["size"]
+
+    def _read_frames(self, key: str, index: dict, first: int, last: int) -> List[bytes]:
+        """Распакованные кадры с first по last включительно одним чтением"""
+        frames = index["frames"]
+        start = frames[first][0]
+        end = frames[last][0] + frames[last][1]
+        raw = self._read_object(self._object_name(key), start, end)
+
+        decompressor = zstandard.ZstdDecompressor()
+        result = []
+        for offset, length in frames[first:last + 1]:
+            result.append(decompressor.decompress(raw[offset - start:offset - start + length]))
+        return result
+
+    def read_range(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Диапазон [start, end) исходного содержимого"""
+        index = self.index(key)
+        end = index["size"] if end is None else min(end, index["size"])
+        if start >= end:
+            return b""
+
+        frame_size = index["frame_size"]
+        first, last = start // frame_size, (end - 1) // frame_size
+        data = b"".join(self._read_frames(key, index, first, last))
+        base = first * frame_size
+        return data[start - base:end - base]
+
+    def iter_chunks(self, key: str, frames_per_read: int = 16) -> Iterator[bytes]:
+        """Последовательное чтение всего содержимого по кадрам"""
+        index = self.index(key)
+        total = len(index["frames"])
+        for first in range(0, total, frames_per_read):
+            last = min(first + frames_per_read, total) - 1
+            yield from self._read_frames(key, index, first, last)
+
+    def stats(self) -> dict:
+        """Статистика хранилища"""
+        return {
+            "backend": type(self).__name__,
+            "objects_stored": self.objects_stored,
+            "deduplicated": self.deduplicated,
+            "bytes_in": self.bytes_in,
+            "bytes_stored": self.bytes_stored,
+            "compression_ratio": round(self.bytes_in / self.bytes_stored, 2) if self.bytes_stored else None
+        }
+
+
+class LocalTranscriptStorage(TranscriptStorage):
+    """Хранилище в локальных шардированных каталогах"""
+
+    def __init__(self, root: str = "transcripts/store", **kwargs):
+        super().__init__(**kwargs)
+        self.root = root
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/"))
+
+    def _put_object(self, name: str, body: BinaryIO, size: int):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            shutil.copyfileobj(body, f)
+        os.replace(temp_path, path)
+
+    def _read_object(self, name: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+        with open(self._path(name), "rb") as f:
+            if start is None:
+                return f.read()
+            f.seek(start)
+            return f.read(end - start)
+
+    def _object_exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def locate(self, key: str) -> str:
+        return self._path(self._object_name(key))
+
+
+def _is_not_found(error: Exception) -> bool:
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3TranscriptStorage(TranscriptStorage):
+    """Хранилище в S3-совместимом сервисе (AWS S3, MinIO).
+
+    ``client`` — клиент с интерфейсом boto3: ``put_object``, ``get_object``
+    с параметром ``Range`` и ``head_object``.
+    """
+
+    def __init__(self, client, bucket: str, prefix: str = "transcripts", **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def _put_object(self, name: str, body: BinaryIO, size: int):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=body, ContentLength=size)
+
+    def _read_object(self, name: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+        params = {"Bucket": self.bucket, "Key": self._key(name)}
+        if start is not None:
+            params["Range"] = f"bytes={start}-{end - 1}"
+        try:
+            response = self.client.get_object(**params)
+        except Exception as e:
+            if _is_not_found(e):
+                raise FileNotFoundError(name) from e
+            raise
+        return response["Body"].read()
+
+    def _object_exists(self, name: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+            return True
+        except Exception as e:
+            if _is_not_found(e):
+                return False
+            raise
+
+    def locate(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._key(self._object_name(key))}"
+
+
+def build_storage() -> TranscriptStorage:
+    """Хранилище по переменной окружения TRANSCRIPT_STORAGE: local или s3"""
+    backend = os.getenv("TRANSCRIPT_STORAGE", "local")
+    options = {
+        "frame_size": int(os.getenv("TRANSCRIPT_STORAGE_FRAME_KB", "256")) * 1024,
+        "level": int(os.getenv("TRANSCRIPT_STORAGE_ZSTD_LEVEL", "6"))
+    }
+
+    if backend == "local":
+        return LocalTranscriptStorage(os.getenv("TRANSCRIPT_STORAGE_DIR", "transcripts/store"), **options)
+
+    if backend == "s3":
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("Для хранилища транскрипций s3 нужен пакет boto3")
+        client = boto3.client("s3", endpoint_url=os.getenv("TRANSCRIPT_S3_ENDPOINT"))
+        return S3TranscriptStorage(
+            client,
+            os.getenv("TRANSCRIPT_S3_BUCKET", "transcripts"),
+            os.getenv("TRANSCRIPT_S3_PREFIX", "transcripts"),
+            **options
+        )
+
+    raise ValueError(f"Неизвестное хранилище транскрипций: {backend}")
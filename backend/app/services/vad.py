@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+VAD_MODE_ENERGY = "energy"
+VAD_MODE_SILERO = "silero"
+VAD_MODE_OFF = "off"
+
+
+def frame_rms(audio: np.ndarray, frame: int) -> np.ndarray:
+    """Среднеквадратичная амплитуда по кадрам длиной ``frame`` сэмплов"""
+    usable = len(audio) - len(audio) % frame
+    if usable == 0:
+        return np.array([np.sqrt(np.mean(audio ** 2))]) if len(audio) else np.zeros(0)
+    return np.sqrt(np.mean(audio[:usable].reshape(-1, frame) ** 2, axis=1))
+
+
+class VoiceActivityDetector:
+    """Дешёвый фильтр тишины перед Whisper.
+
+    Чанк без речи отбрасывается до декодирования моделью, а из чанка с
+    речью вырезаются длинные паузы. Режим ``energy`` работает по энергии
+    кадров и укладывается в десятки микросекунд на секунду аудио; режим
+    ``silero`` использует модель Silero VAD, встроенную в faster-whisper.
+    """
+
+    def __init__(
+        self,
+        mode: str = VAD_MODE_ENERGY,
+        energy_threshold_db: float = -45.0,
+        frame_ms: int = 30,
+        min_speech_ms: int = 150,
+        padding_ms: int = 200
+    ):
+        self.mode = mode
+        self.energy_threshold = 10 ** (energy_threshold_db / 20)
+        self.frame = SAMPLE_RATE * frame_ms // 1000
+        self.min_speech = SAMPLE_RATE * min_speech_ms // 1000
+        self.padding = SAMPLE_RATE * padding_ms // 1000
+
+        self._lock = threading.Lock()
+        self.chunks_total = 0
+        self.chunks_rejected = 0
+        self.seconds_total = 0.0
+        self.seconds_skipped = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != VAD_MODE_OFF
+
+    def _energy_regions(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        voiced = frame_rms(audio, self.frame) >= self.energy_threshold
+        if not voiced.any():
+            return []
+
+        # Границы непрерывных участков речи в кадрах
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+        return [
+            (start * self.frame, min(len(audio), end * self.frame))
+            for start, end in zip(edges[::2], edges[1::2])
+        ]
+
+    def _silero_regions(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+        options = VadOptions(
+            min_speech_duration_ms=self.min_speech * 1000 // SAMPLE_RATE,
+            min_silence_duration_ms=500,
+            speech_pad_ms=0
+        )
+        return [(ts["start"], ts["end"]) for ts in get_speech_timestamps(audio, options)]
+
+    def speech_regions(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """Участки речи (в сэмплах) с отступами и слиянием близких участков"""
+        if self.mode == VAD_MODE_SILERO:
+            regions = self._silero_regions(audio)
+        else:
+            regions = self._energy_regions(audio)
+
+        merged: List[List[int]] = []
+        for start, end in regions:
+            start = max(0, start - self.padding)
+            end = min(len(audio), end + self.padding)
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        # Короткие щелчки и всплески шума за речь не считаем
+        return [
+            (start, end) for start, end in merged
+            if end - start - 2 * self.padding >= self.min_speech
+        ]
+
+    def trim(self, audio: np.ndarray) -> Optional[np.ndarray]:
+        """Аудио только с участками речи или None, если речи нет"""
+        if not self.enabled or len(audio) == 0:
+            return audio
+
+        duration = len(audio) / SAMPLE_RATE
+
+        # Быстрый отказ: весь чанк тише порога
+        if self.mode == VAD_MODE_ENERGY and np.max(np.abs(audio)) < self.energy_threshold:
+            regions = []
+        else:
+            regions = self.speech_regions(audio)
+
+        if not regions:
+            trimmed = None
+            kept = 0.0
+        elif len(regions) == 1 and regions[0] == (0, len(audio)):
+            trimmed = audio
+            kept = duration
+        else:
+            trimmed = np.concatenate([audio[start:end] for start, end in regions])
+            kept = len(trimmed) / SAMPLE_RATE
+
+        with self._lock:
+            self.chunks_total += 1
+            self.seconds_total += duration
+            self.seconds_skipped += duration - kept
+            if trimmed is None:
+                self.chunks_rejected += 1
+
+        return trimmed
+
+    def stats(self) -> Dict[str, float]:
+        """Сколько чанков отброшено и сколько секунд декодирования сэкономлено"""
+        return {
+            "mode": self.mode,
+            "chunks_total": self.chunks_total,
+            "chunks_rejected": self.chunks_rejected,
+            "audio_seconds_total": round(self.seconds_total, 2),
+            "decode_seconds_saved": round(self.seconds_skipped, 2)
+        }
+
+    def take_counters(self) -> Dict[str, float]:
+        """Счётчики с прошлого вызова (обнуляются): воркер пула передаёт их родителю"""
+        with self._lock:
+            counters = {
+                "chunks_total": self.chunks_total,
+                "chunks_rejected": self.chunks_rejected,
+                "seconds_total": self.seconds_total,
+                "seconds_skipped": self.seconds_skipped
+            }
+            self.chunks_total = self.chunks_rejected = 0
+            self.seconds_total = self.seconds_skipped = 0.0
+        return counters
+
+    def add_counters(self, counters: Dict[str, float]):
+        """Учёт счётчиков детектора из процесса-воркера"""
+        with self._lock:
+            self.chunks_total += counters["chunks_total"]
+            self.chunks_rejected += counters["chunks_rejected"]
+            self.seconds_total += counters["seconds_total"]
+            self.seconds_skipped += counters["seconds_skipped"]
+
+
+def vad_from_env() -> VoiceActivityDetector:
+    """Детектор с настройками из SPEECH_VAD_MODE и SPEECH_VAD_THRESHOLD_DB"""
+    return VoiceActivityDetector(
+        mode=os.getenv("SPEECH_VAD_MODE", VAD_MODE_ENERGY),
+        energy_threshold_db=float(os.getenv("SPEECH_VAD_THRESHOLD_DB", "-45"))
+    )
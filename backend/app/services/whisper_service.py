@@ -1,88 +1,542 @@
 import logging
 import tempfile
 import os
+import threading
+import time
 from faster_whisper import WhisperModel
-from typing import Optional, Tuple
+from faster_whisper.audio import decode_audio, pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from typing import Dict, List, Optional, Tuple, Union
 import asyncio
+import numpy as np
 from concurrent.futures import ThreadPoolExecutor
 
+from .audio_decoder import AudioDecodeError, decode_audio_bytes
+from .batch_scheduler import BatchScheduler, DeadlineExceeded
+from .decode_policy import DecodeTier, LoadAwareDecodePolicy, build_tiers
+from .vad import VoiceActivityDetector, vad_from_env
+from .whisper_workers import OP_SEGMENTS, OP_TRANSCRIBE, WhisperWorkerPool
+
 logger = logging.getLogger(__name__)
 
+SAMPLE_RATE = 16000
+# Максимальная длина клипа, который помещается в одно окно энкодера Whisper
+MAX_BATCHED_SECONDS = 30
+# Пороги Whisper для отбрасывания сегментов без речи
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+
+# (текст, язык, уверенность, уровень качества декодирования)
+TranscriptionResult = Tuple[str, str, float, str]
+# Сегмент с временными метками: (начало, конец, текст, уверенность)
+TimedSegment = Tuple[float, float, str, float]
+# Аудио в исходном виде или уже декодированный float32 массив 16 кГц
+AudioInput = Union[bytes, np.ndarray]
+
 
 class WhisperService:
-    def __init__(self, model_size: str = "base"):
+    def __init__(
+        self,
+        model_size: str = "base",
+        max_batch_size: int = 8,
+        max_batch_wait_ms: float = 10.0,
+        request_timeout: Optional[float] = 30.0,
+        beam_size: int = 5,
+        cpu_threads: int = 0,
+        num_workers: int = 1,
+        worker_processes: int = 0,
+        vad: Optional[VoiceActivityDetector] = None,
+        fast_model_size: Optional[str] = None,
+        degrade_queue_wait_ms: float = 500.0,
+        degrade_p95_ms: float = 3000.0
+    ):
         """Инициализация сервиса распознавания речи"""
         self.model_size = model_size
         self.model = None
+        # Дополнительные (более быстрые) модели для деградации под нагрузкой
+        self.models: Dict[str, WhisperModel] = {}
+        self.beam_size = beam_size
+        self.fast_model_size = fast_model_size
+        self.policy = LoadAwareDecodePolicy(
+            build_tiers(model_size, beam_size, fast_model_size),
+            queue_wait_threshold_ms=degrade_queue_wait_ms,
+            p95_threshold_ms=degrade_p95_ms
+        )
+        self.request_timeout = request_timeout
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self.vad = vad or VoiceActivityDetector()
         self.executor = ThreadPoolExecutor(max_workers=2)
-    
+        self._model_lock = threading.Lock()
+        self._tokenizers: Dict[Tuple[str, str], Tokenizer] = {}
+        self.decoded_in_memory = 0
+        self.decoded_via_file = 0
+        self.warmed_up = False
+        self.startup_timings: Dict[str, float] = {}
+        self.scheduler = BatchScheduler(
+            self._transcribe_batch_sync,
+            self.executor,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_batch_wait_ms,
+            max_concurrent_batches=self.executor._max_workers,
+            name="whisper",
+            on_dispatch=self.policy.record_queue_waits
+        )
+
+        # Опциональный пул процессов: модель загружается в каждом воркере,
+        # а в процессе FastAPI не загружается вовсе
+        self.worker_pool: Optional[WhisperWorkerPool] = None
+        if worker_processes > 0:
+            self.worker_pool = WhisperWorkerPool(
+                num_workers=worker_processes,
+                model_size=model_size,
+                cpu_threads=cpu_threads or None,
+                max_batch_size=max_batch_size,
+                beam_size=beam_size,
+                fast_model_size=fast_model_size,
+                vad=self.vad,
+                on_dispatch=self.policy.record_queue_waits
+            )
+
+    def _load_model(self, model_size: str) -> WhisperModel:
+        logger.info(f"Загрузка модели Whisper: {model_size}")
+        model = WhisperModel(
+            model_size,
+            device="cpu",
+            compute_type="int8",
+            cpu_threads=self.cpu_threads,
+            num_workers=self.num_workers
+        )
+        logger.info(f"Модель Whisper {model_size} загружена успешно")
+        return model
+
     def initialize_model(self):
-        """Инициализация модели Whisper"""
-        if self.model is None:
-            logger.info(f"Загрузка модели Whisper: {self.model_size}")
-            self.model = WhisperModel(self.model_size, device="cpu", compute_type="int8")
-            logger.info("Модель Whisper загружена успешно")
-    
-    def _transcribe_audio_sync(self, audio_data: bytes, language: Optional[str] = None) -> Tuple[str, str, float]:
-        """Синхронное распознавание аудио"""
-        if self.model is None:
+        """Инициализация моделей Whisper (или запуск пула процессов).
+
+        Быстрая модель для деградации под нагрузкой загружается заранее,
+        чтобы переключение на неё не стоило загрузки в момент пика.
+        """
+        with self._model_lock:
+            if self.worker_pool is not None:
+                self.worker_pool.start()
+                return
+
+            if self.model is None:
+                self.model = self._load_model(self.model_size)
+            for tier in self.policy.tiers:
+                if tier.model_size != self.model_size and tier.model_size not in self.models:
+                    self.models[tier.model_size] = self._load_model(tier.model_size)
+
+    def _get_model(self, tier: DecodeTier) -> WhisperModel:
+        """Модель, которой декодирует данный уровень качества"""
+        if tier.model_size == self.model_size:
+            return self.model
+        model = self.models.get(tier.model_size)
+        if model is None:
             self.initialize_model()
-        
-        # Сохранение аудио во временный файл
+            model = self.models[tier.model_size]
+        return model
+
+    def warmup(self, timeout: float = 300.0):
+        """Загрузка модели и прогревочное распознавание секунды тишины.
+
+        Первый проход через CTranslate2 заметно медленнее последующих,
+        поэтому его лучше сделать до того, как придёт первый кандидат.
+        """
+        started = time.perf_counter()
+        self.initialize_model()
+
+        dummy = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        if self.worker_pool is not None:
+            deadline = time.monotonic() + timeout
+            while not self.worker_pool.all_ready:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Воркеры Whisper не загрузили модель вовремя")
+                time.sleep(0.1)
+            loaded = time.perf_counter()
+            futures = [self.worker_pool.submit(dummy, "ru") for _ in range(self.worker_pool.num_workers)]
+            for future in futures:
+                future.result(timeout=timeout)
+        else:
+            loaded = time.perf_counter()
+            # Прогреваем каждую модель, на которую может переключиться политика
+            warmed = set()
+            for tier in self.policy.tiers:
+                if tier.model_size not in warmed:
+                    warmed.add(tier.model_size)
+                    self._transcribe_batch_sync([(dummy, "ru", None)], tier)
+
+        finished = time.perf_counter()
+        self.startup_timings = {
+            "model_load_seconds": round(loaded - started, 3),
+            "warmup_decode_seconds": round(finished - loaded, 3),
+            "total_seconds": round(finished - started, 3)
+        }
+        self.warmed_up = True
+        logger.info(
+            f"Модель Whisper прогрета: загрузка {self.startup_timings['model_load_seconds']} с, "
+            f"прогревочное распознавание {self.startup_timings['warmup_decode_seconds']} с"
+        )
+        return self.startup_timings
+
+    @property
+    def model_loaded(self) -> bool:
+        if self.worker_pool is not None:
+            return self.worker_pool.ready
+        return self.model is not None
+
+    def _decode_audio_file(self, audio_data: bytes) -> np.ndarray:
+        """Декодирование через временный файл (для контейнеров, которые не читаются из памяти)"""
         with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
             temp_file.write(audio_data)
             temp_file_path = temp_file.name
-        
+
         try:
-            # Распознавание речи
-            segments, info = self.model.transcribe(
-                temp_file_path, 
-                language=language,
-                beam_size=5
-            )
-            
-            # Объединение всех сегментов в один текст
-            text_segments = []
-            total_confidence = 0
-            segment_count = 0
-            
-            for segment in segments:
-                text_segments.append(segment.text.strip())
-                if hasattr(segment, 'avg_logprob'):
-                    total_confidence += segment.avg_logprob
-                    segment_count += 1
-            
-            full_text = " ".join(text_segments).strip()
-            detected_language = info.language if info else "unknown"
-            avg_confidence = total_confidence / segment_count if segment_count > 0 else 0.0
-            
-            logger.info(f"Распознан текст: '{full_text}' (язык: {detected_language}, уверенность: {avg_confidence:.2f})")
-            
-            return full_text, detected_language, avg_confidence
-            
-        except Exception as e:
-            logger.error(f"Ошибка при распознавании речи: {e}")
-            return "", "unknown", 0.0
+            return decode_audio(temp_file_path, sampling_rate=SAMPLE_RATE)
         finally:
-            # Удаление временного файла
             if os.path.exists(temp_file_path):
                 os.unlink(temp_file_path)
-    
-    async def transcribe_audio(self, audio_data: bytes, language: Optional[str] = None) -> Tuple[str, str, float]:
-        """Асинхронное распознавание аудио"""
-        loop = asyncio.get_event_loop()
+
+    def _decode_audio(self, audio_data: AudioInput, content_type: Optional[str] = None) -> np.ndarray:
+        """Декодирование аудио в float32 массив 16 кГц"""
+        if isinstance(audio_data, np.ndarray):
+            return audio_data
+
+        try:
+            audio = decode_audio_bytes(audio_data, content_type)
+            self.decoded_in_memory += 1
+            return audio
+        except AudioDecodeError as e:
+            logger.debug(f"Декодирование в памяти не удалось, используется временный файл: {e}")
+
+        self.decoded_via_file += 1
+        return self._decode_audio_file(audio_data)
+
+    def _get_tokenizer(self, model: WhisperModel, model_size: str, language: str) -> Tokenizer:
+        """Токенизатор для модели и языка (кэшируется)"""
+        tokenizer = self._tokenizers.get((model_size, language))
+        if tokenizer is None:
+            tokenizer = Tokenizer(
+                model.hf_tokenizer,
+                model.model.is_multilingual,
+                task="transcribe",
+                language=language
+            )
+            self._tokenizers[(model_size, language)] = tokenizer
+        return tokenizer
+
+    def _transcribe_array_sync(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        tier: Optional[DecodeTier] = None
+    ) -> TranscriptionResult:
+        """Распознавание одного клипа через стандартный pipeline faster-whisper"""
+        tier = tier or self.policy.tiers[0]
+        segments, info = self._get_model(tier).transcribe(
+            audio,
+            language=language,
+            beam_size=tier.beam_size
+        )
+
+        # Объединение всех сегментов в один текст
+        text_segments = []
+        total_confidence = 0
+        segment_count = 0
+
+        for segment in segments:
+            text_segments.append(segment.text.strip())
+            if hasattr(segment, 'avg_logprob'):
+                total_confidence += segment.avg_logprob
+                segment_count += 1
+
+        full_text = " ".join(text_segments).strip()
+        detected_language = info.language if info else "unknown"
+        avg_confidence = total_confidence / segment_count if segment_count > 0 else 0.0
+
+        return full_text, detected_language, avg_confidence, tier.name
+
+    def _transcribe_short_batch_sync(
+        self,
+        audios: List[np.ndarray],
+        languages: List[Optional[str]],
+        tier: Optional[DecodeTier] = None
+    ) -> List[TranscriptionResult]:
+        """Пакетное декодирование клипов не длиннее одного окна (30 с)"""
+        tier = tier or self.policy.tiers[0]
+        model = self._get_model(tier)
+        features = np.stack([
+            pad_or_trim(model.feature_extractor(audio)[..., :-1])
+            for audio in audios
+        ])
+        encoder_output = model.encode(features)
+
+        # Определение языка только для тех клипов, где он не задан явно
+        if model.model.is_multilingual:
+            if any(language is None for language in languages):
+                detected = model.model.detect_language(encoder_output)
+                languages = [
+                    language or detected[i][0][0][2:-2]
+                    for i, language in enumerate(languages)
+                ]
+        else:
+            languages = ["en"] * len(audios)
+
+        tokenizers = [self._get_tokenizer(model, tier.model_size, language) for language in languages]
+        prompts = [
+            model.get_prompt(tokenizer, previous_tokens=[], without_timestamps=True)
+            for tokenizer in tokenizers
+        ]
+
+        results = model.model.generate(
+            encoder_output,
+            prompts,
+            beam_size=tier.beam_size,
+            length_penalty=1,
+            max_length=model.max_length,
+            suppress_blank=True,
+            suppress_tokens=[-1],
+            return_scores=True,
+            return_no_speech_prob=True
+        )
+
+        outputs = []
+        for result, tokenizer, language in zip(results, tokenizers, languages):
+            tokens = result.sequences_ids[0]
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+
+            # Отбрасываем "галлюцинации" на тишине по тем же правилам, что и Whisper
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOGPROB_THRESHOLD:
+                outputs.append(("", language, avg_logprob, tier.name))
+                continue
+
+            outputs.append((tokenizer.decode(tokens).strip(), language, avg_logprob, tier.name))
+
+        return outputs
+
+    def _transcribe_batch_sync(
+        self,
+        requests: List[Tuple[AudioInput, Optional[str], Optional[str]]],
+        tier: Optional[DecodeTier] = None
+    ) -> List[TranscriptionResult]:
+        """Синхронное распознавание пакета аудио от разных собеседований.
+
+        Уровень качества выбирается один раз на весь пакет: по умолчанию
+        текущий уровень политики деградации.
+        """
+        if self.model is None:
+            self.initialize_model()
+        tier = tier or self.policy.current_tier()
+
+        results: List[Optional[TranscriptionResult]] = [None] * len(requests)
+        short_indices = []
+        short_audios = []
+
+        for i, (audio_data, language, content_type) in enumerate(requests):
+            try:
+                audio = self._decode_audio(audio_data, content_type)
+            except Exception as e:
+                logger.error(f"Ошибка при декодировании аудио: {e}")
+                results[i] = ("", "unknown", 0.0, tier.name)
+                continue
+
+            # Массивы уже прошли VAD в transcribe_audio
+            if not isinstance(audio_data, np.ndarray):
+                audio = self.vad.trim(audio)
+                if audio is None:
+                    results[i] = ("", language or "unknown", 0.0, tier.name)
+                    continue
+
+            if len(audio) <= MAX_BATCHED_SECONDS * SAMPLE_RATE:
+                short_indices.append(i)
+                short_audios.append(audio)
+                continue
+
+            # Длинные записи идут через обычный pipeline со скользящим окном
+            try:
+                results[i] = self._transcribe_array_sync(audio, language, tier)
+            except Exception as e:
+                logger.error(f"Ошибка при распознавании речи: {e}")
+                results[i] = ("", "unknown", 0.0, tier.name)
+
+        if short_audios:
+            try:
+                batch_results = self._transcribe_short_batch_sync(
+                    short_audios,
+                    [requests[i][1] for i in short_indices],
+                    tier
+                )
+            except Exception as e:
+                logger.error(f"Ошибка при пакетном распознавании речи: {e}")
+                batch_results = [("", "unknown", 0.0, tier.name)] * len(short_audios)
+
+            for i, result in zip(short_indices, batch_results):
+                results[i] = result
+
+        logger.info(
+            f"Распознан пакет из {len(requests)} аудио ({len(short_audios)} в пакетном режиме, "
+            f"уровень качества {tier.name})"
+        )
+        for text, detected_language, confidence, _ in results:
+            logger.info(f"Распознан текст: '{text}' (язык: {detected_language}, уверенность: {confidence:.2f})")
+
+        return results
+
+    def _transcribe_audio_sync(
+        self,
+        audio_data: bytes,
+        language: Optional[str] = None,
+        content_type: Optional[str] = None
+    ) -> TranscriptionResult:
+        """Синхронное распознавание аудио"""
+        return self._transcribe_batch_sync([(audio_data, language, content_type)])[0]
+
+    async def transcribe_audio(
+        self,
+        audio_data: AudioInput,
+        language: Optional[str] = None,
+        timeout: Optional[float] = None,
+        content_type: Optional[str] = None
+    ) -> TranscriptionResult:
+        """Асинхронное распознавание аудио.
+
+        Запрос попадает в общий пакетный планировщик (или в пул процессов);
+        при превышении дедлайна выбрасывается ``DeadlineExceeded``.
+        Полная задержка чанков потокового распознавания (массивов)
+        передаётся политике деградации качества; задержка загруженного файла
+        зависит от его длины, а не от нагрузки, поэтому в p95 не входит.
+        """
+        timeout = timeout if timeout is not None else self.request_timeout
+
+        # Уже декодированное аудио проверяем на тишину до постановки в очередь
+        if isinstance(audio_data, np.ndarray):
+            audio_data = self.vad.trim(audio_data)
+            if audio_data is None:
+                return "", language or "unknown", 0.0, self.policy.current_tier().name
+
+        started = time.monotonic()
+        if self.worker_pool is not None:
+            result = await self._submit_to_pool(audio_data, language, content_type, timeout=timeout)
+        else:
+            result = await self.scheduler.submit(
+                (audio_data, language, content_type),
+                timeout=timeout
+            )
+
+        if isinstance(audio_data, np.ndarray):
+            self.policy.record_latency(time.monotonic() - started, result[3])
+        else:
+            self.policy.record_served(result[3])
+        return result
+
+    async def _submit_to_pool(
+        self,
+        audio_data: AudioInput,
+        language: Optional[str],
+        content_type: Optional[str] = None,
+        op: str = OP_TRANSCRIBE,
+        timeout: Optional[float] = None
+    ):
+        """Отправка задания в пул процессов и ожидание результата"""
+        if not self.worker_pool.started:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.initialize_model)
+
+        future = self.worker_pool.submit(
+            audio_data, language, content_type, op=op, tier=self.policy.current_tier().name
+        )
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Запрос не обработан за {timeout:.2f} с")
+
+    def _transcribe_segments_sync(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        tier: Optional[DecodeTier] = None
+    ) -> Tuple[List[TimedSegment], str]:
+        """Синхронное распознавание с временными метками сегментов"""
+        if self.model is None:
+            self.initialize_model()
+        tier = tier or self.policy.current_tier()
+
+        segments, info = self._get_model(tier).transcribe(
+            audio,
+            language=language,
+            beam_size=tier.beam_size
+        )
+        timed = [
+            (segment.start, segment.end, segment.text.strip(), segment.avg_logprob)
+            for segment in segments
+        ]
+        return timed, info.language if info else "unknown"
+
+    async def transcribe_segments(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None
+    ) -> Tuple[List[TimedSegment], str]:
+        """Асинхронное распознавание с временными метками (для потокового режима)"""
+        if self.worker_pool is not None:
+            return await self._submit_to_pool(audio, language, op=OP_SEGMENTS, timeout=self.request_timeout)
+
+        loop = asyncio.get_running_loop()
         return await loop.run_in_executor(
-            self.executor, 
-            self._transcribe_audio_sync, 
-            audio_data, 
+            self.executor,
+            self._transcribe_segments_sync,
+            audio,
             language
         )
-    
+
+    def stats(self) -> dict:
+        """Статистика пакетного планировщика и декодера"""
+        if self.worker_pool is not None:
+            return {
+                **self.worker_pool.health(),
+                "vad": self.vad.stats(),
+                "decode_policy": self.policy.stats()
+            }
+
+        return {
+            "backend": "thread",
+            **self.scheduler.stats(),
+            "decoded_in_memory": self.decoded_in_memory,
+            "decoded_via_file": self.decoded_via_file,
+            "vad": self.vad.stats(),
+            "decode_policy": self.policy.stats()
+        }
+
+    async def shutdown(self):
+        """Остановка планировщика и освобождение ресурсов"""
+        await self.scheduler.shutdown()
+        await asyncio.get_running_loop().run_in_executor(None, self.cleanup)
+
     def cleanup(self):
         """Очистка ресурсов"""
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
         if self.executor:
             self.executor.shutdown(wait=True)
 
 
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return float(value) if float(value) > 0 else None
+
+
 # Глобальный экземпляр сервиса
-whisper_service = WhisperService()
+whisper_service = WhisperService(
+    model_size=os.getenv("WHISPER_MODEL_SIZE", "base"),
+    max_batch_size=int(os.getenv("WHISPER_MAX_BATCH_SIZE", "8")),
+    max_batch_wait_ms=float(os.getenv("WHISPER_MAX_BATCH_WAIT_MS", "10")),
+    request_timeout=_env_float("WHISPER_REQUEST_TIMEOUT", 30.0),
+    cpu_threads=int(os.getenv("WHISPER_CPU_THREADS", "0")),
+    worker_processes=int(os.getenv("WHISPER_WORKER_PROCESSES", "0")),
+    beam_size=int(os.getenv("WHISPER_BEAM_SIZE", "5")),
+    fast_model_size=os.getenv("WHISPER_FAST_MODEL_SIZE") or None,
+    degrade_queue_wait_ms=float(os.getenv("WHISPER_DEGRADE_QUEUE_WAIT_MS", "500")),
+    degrade_p95_ms=float(os.getenv("WHISPER_DEGRADE_P95_MS", "3000")),
+    vad=vad_from_env()
+)
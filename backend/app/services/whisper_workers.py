@@ -0,0 +1,538 @@
+import logging
+import multiprocessing as mp
+import os
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .vad import VoiceActivityDetector, vad_from_env
+
+logger = logging.getLogger(__name__)
+
+# Типы полезной нагрузки в слоте кольцевого буфера
+PAYLOAD_RAW = "raw"   # исходные байты аудио, декодируются в воркере
+PAYLOAD_F32 = "f32"   # уже декодированный float32 PCM 16 кГц
+
+OP_TRANSCRIBE = "transcribe"
+OP_SEGMENTS = "segments"
+# Служебное задание: воркер только подтверждает, что взял его из очереди
+OP_FENCE = "fence"
+
+HEARTBEAT_INTERVAL = 1.0
+# Предел задержки перед перезапуском воркера, падающего подряд
+MAX_RESPAWN_DELAY = 30.0
+
+
+def _worker_main(
+    index: int,
+    model_size: str,
+    cpu_threads: int,
+    shm_name: str,
+    slot_size: int,
+    max_batch_size: int,
+    job_queue: mp.Queue,
+    result_queue: mp.Queue,
+    heartbeats,
+    current_jobs,
+    beam_size: int = 5,
+    fast_model_size: Optional[str] = None
+):
+    """Точка входа процесса-воркера: модель загружается один раз при старте"""
+    # Ограничиваем OpenMP до импорта CTranslate2, чтобы воркеры не делили ядра
+    os.environ["OMP_NUM_THREADS"] = str(cpu_threads)
+
+    from .whisper_service import WhisperService
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+
+    # Пульс обновляет отдельный поток, чтобы долгое декодирование
+    # (CTranslate2 отпускает GIL) не выглядело как зависший воркер
+    stop_heartbeat = threading.Event()
+
+    def beat():
+        while not stop_heartbeat.is_set():
+            heartbeats[index] = time.time()
+            stop_heartbeat.wait(HEARTBEAT_INTERVAL)
+
+    threading.Thread(target=beat, name="whisper-worker-heartbeat", daemon=True).start()
+
+    # Детектор с теми же настройками окружения, что и в родителе
+    service = WhisperService(
+        model_size=model_size,
+        cpu_threads=cpu_threads,
+        num_workers=1,
+        beam_size=beam_size,
+        fast_model_size=fast_model_size,
+        vad=vad_from_env()
+    )
+    service.initialize_model()
+    result_queue.put(("ready", index, os.getpid()))
+
+    def read_payload(job) -> Any:
+        _, slot, size, kind, _, _, _, inline, _, _ = job
+        if slot < 0:
+            data = inline
+        else:
+            start = slot * slot_size
+            # Копия нужна, чтобы слот можно было освободить сразу после ответа
+            data = bytes(shm.buf[start:start + size])
+        if kind == PAYLOAD_F32:
+            return np.frombuffer(data, dtype=np.float32)
+        return data
+
+    try:
+        while True:
+            try:
+                job = job_queue.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                continue
+            if job is None:
+                break
+            if job[4] == OP_FENCE:
+                result_queue.put(("fence", index, job[0]))
+                continue
+
+            # Забираем всё, что уже лежит в очереди, и декодируем пакетом
+            jobs = [job]
+            fences = []
+            while job[4] == OP_TRANSCRIBE and len(jobs) < max_batch_size:
+                try:
+                    extra = job_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is None:
+                    job_queue.put(None)
+                    break
+                if extra[4] == OP_FENCE:
+                    fences.append(extra[0])
+                    continue
+                jobs.append(extra)
+
+            # Номера заданий пишутся в разделяемую память сразу после взятия:
+            # если процесс упадёт, родитель по ним узнает, какие задания
+            # потеряны. Падение до записи родитель находит через OP_FENCE
+            base = index * max_batch_size
+            for k, item in enumerate(jobs):
+                current_jobs[base + k] = item[0]
+            for fence_id in fences:
+                result_queue.put(("fence", index, fence_id))
+
+            # Ожидание в очереди — для политики деградации качества в родителе
+            taken_at = time.time()
+            result_queue.put(("dispatch", index, [taken_at - item[9] for item in jobs]))
+
+            # Уровень качества выбирает родитель; задания с разными уровнями
+            # декодируются отдельными пакетами
+            batches: Dict[str, List[Any]] = {}
+            for item in jobs:
+                if item[4] == OP_TRANSCRIBE:
+                    batches.setdefault(item[8], []).append(item)
+
+            for tier_name, batch in batches.items():
+                try:
+                    results = service._transcribe_batch_sync(
+                        [(read_payload(item), item[5], item[6]) for item in batch],
+                        service.policy.tier_by_name(tier_name)
+                    )
+                    for item, result in zip(batch, results):
+                        result_queue.put(("done", index, item[0], result, None))
+                except Exception as e:
+                    for item in batch:
+                        result_queue.put(("done", index, item[0], None, str(e)))
+
+            for item in jobs:
+                if item[4] != OP_SEGMENTS:
+                    continue
+                try:
+                    result = service._transcribe_segments_sync(
+                        read_payload(item), item[5], service.policy.tier_by_name(item[8])
+                    )
+                    result_queue.put(("done", index, item[0], result, None))
+                except Exception as e:
+                    result_queue.put(("done", index, item[0], None, str(e)))
+
+            for k in range(len(jobs)):
+                current_jobs[base + k] = 0
+
+            # Счётчики VAD воркера суммируются в родителе для /speech/health
+            counters = service.vad.take_counters()
+            if counters["chunks_total"]:
+                result_queue.put(("vad", index, counters))
+    finally:
+        stop_heartbeat.set()
+        shm.close()
+
+
+class WorkerCrashed(Exception):
+    """Процесс-воркер завершился во время обработки задания"""
+
+
+class WhisperWorkerPool:
+    """Пул процессов с моделью Whisper, загруженной в каждом процессе.
+
+    Аудио передаётся через общий кольцевой буфер в разделяемой памяти:
+    через очередь идёт только маленький кортеж с номером слота, поэтому
+    байты аудио не сериализуются pickle. Фоновый поток следит за
+    воркерами и перезапускает упавшие процессы. Счётчики VAD воркеров
+    добавляются в детектор родителя ``vad``.
+
+    Воркер может упасть между взятием задания из очереди и записью его
+    номера в ``current_jobs``. Поэтому после падения в очередь ставится
+    служебное задание ``OP_FENCE``: когда его подтвердят, всё, что стояло
+    в очереди раньше, уже взято воркерами, и задания, которые никто не
+    числит за собой, считаются потерянными.
+    """
+
+    def __init__(
+        self,
+        num_workers: int = 2,
+        model_size: str = "base",
+        cpu_threads: Optional[int] = None,
+        ring_slots: int = 32,
+        slot_size: int = 2 * 1024 * 1024,
+        max_batch_size: int = 8,
+        beam_size: int = 5,
+        fast_model_size: Optional[str] = None,
+        vad: Optional[VoiceActivityDetector] = None,
+        on_dispatch: Optional[Callable[[List[float]], None]] = None
+    ):
+        self.num_workers = max(1, num_workers)
+        self.model_size = model_size
+        self.beam_size = beam_size
+        self.fast_model_size = fast_model_size
+        self.cpu_threads = cpu_threads or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.ring_slots = ring_slots
+        self.slot_size = slot_size
+        self.max_batch_size = max_batch_size
+        self.vad = vad
+        # Вызывается с временами ожидания в очереди заданий, взятых воркером
+        self.on_dispatch = on_dispatch
+
+        self._ctx = mp.get_context("spawn")
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        self._job_queue = None
+        self._result_queue = None
+        self._heartbeats = None
+        self._current_jobs = None
+
+        self._processes: List[Optional[mp.Process]] = [None] * self.num_workers
+        self._workers: List[Dict[str, Any]] = [self._new_worker_state() for _ in range(self.num_workers)]
+        # job_id -> (future, slot)
+        self._jobs: Dict[int, Tuple[Future, int]] = {}
+        # fence_id -> [задания без владельца на момент падения, время проверки]
+        self._fences: Dict[int, List[Any]] = {}
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.started = False
+        self.inline_fallbacks = 0
+        self.orphaned_jobs = 0
+
+    @staticmethod
+    def _new_worker_state() -> Dict[str, Any]:
+        return {
+            "pid": None,
+            "ready": False,
+            "jobs_completed": 0,
+            "restarts": 0,
+            "consecutive_failures": 0,
+            "respawn_at": None,
+            "started_at": None
+        }
+
+    def start(self):
+        """Создание разделяемой памяти и запуск воркеров"""
+        if self.started:
+            return
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.ring_slots * self.slot_size)
+        for slot in range(self.ring_slots):
+            self._free_slots.put(slot)
+        self._job_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._heartbeats = self._ctx.Array("d", self.num_workers, lock=False)
+        self._current_jobs = self._ctx.Array("q", self.num_workers * self.max_batch_size, lock=False)
+
+        for index in range(self.num_workers):
+            self._spawn(index)
+
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._collect_results, name="whisper-pool-results", daemon=True),
+            threading.Thread(target=self._monitor, name="whisper-pool-monitor", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        self.started = True
+        logger.info(
+            f"Пул Whisper запущен: {self.num_workers} процессов, "
+            f"{self.cpu_threads} потоков CTranslate2 на процесс"
+        )
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                index,
+                self.model_size,
+                self.cpu_threads,
+                self._shm.name,
+                self.slot_size,
+                self.max_batch_size,
+                self._job_queue,
+                self._result_queue,
+                self._heartbeats,
+                self._current_jobs,
+                self.beam_size,
+                self.fast_model_size
+            ),
+            name=f"whisper-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        self._heartbeats[index] = time.time()
+        state = self._workers[index]
+        state.update(pid=process.pid, ready=False, started_at=time.time())
+
+    def _release_slot(self, slot: int):
+        if slot >= 0:
+            self._free_slots.put(slot)
+
+    def _collect_results(self):
+        while not self._stopping.is_set():
+            try:
+                message = self._result_queue.get(timeout=HEARTBEAT_INTERVAL)
+            except (queue.Empty, OSError, EOFError):
+                continue
+
+            kind, index = message[0], message[1]
+            if kind == "ready":
+                self._workers[index].update(ready=True, consecutive_failures=0)
+                logger.info(f"Воркер Whisper {index} готов (pid {message[2]})")
+            elif kind == "dispatch":
+                if self.on_dispatch is not None:
+                    try:
+                        self.on_dispatch(message[2])
+                    except Exception as e:
+                        logger.error(f"Ошибка в обработчике on_dispatch пула Whisper: {e}")
+            elif kind == "fence":
+                with self._lock:
+                    fence = self._fences.get(message[2])
+                    if fence is not None:
+                        # Воркер, взявший задание до метки, мог ещё не записать
+                        # его номер — проверка откладывается на один интервал
+                        fence[1] = time.time() + HEARTBEAT_INTERVAL
+            elif kind == "vad":
+                if self.vad is not None:
+                    self.vad.add_counters(message[2])
+            elif kind == "done":
+                _, _, job_id, result, error = message
+                with self._lock:
+                    job = self._jobs.pop(job_id, None)
+                self._workers[index]["jobs_completed"] += 1
+                if job is None:
+                    continue
+                future, slot = job
+                self._release_slot(slot)
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result(result)
+
+    def _claimed_jobs(self) -> Set[int]:
+        return {job_id for job_id in self._current_jobs if job_id}
+
+    def _put_fence(self):
+        """Метка в очереди после падения воркера (вызывается под ``_lock``)"""
+        # Неподтверждённые метки могли уйти вместе с упавшим воркером;
+        # новая метка покрывает их задания
+        self._fences = {fence_id: fence for fence_id, fence in self._fences.items() if fence[1] is not None}
+        claimed = self._claimed_jobs()
+        suspects = {job_id for job_id in self._jobs if job_id not in claimed}
+        if not suspects:
+            return
+        fence_id = next(self._job_ids)
+        self._fences[fence_id] = [suspects, None]
+        self._job_queue.put((fence_id, -1, 0, PAYLOAD_RAW, OP_FENCE, None, None, None, "full", time.time()))
+
+    def _resolve_fences(self):
+        """Отказ заданиям, которые упавший воркер взял, но не успел записать"""
+        now = time.time()
+        with self._lock:
+            due = [
+                fence_id for fence_id, (_, check_at) in self._fences.items()
+                if check_at is not None and now >= check_at
+            ]
+            if not due:
+                return
+            claimed = self._claimed_jobs()
+            orphaned = []
+            for fence_id in due:
+                suspects, _ = self._fences.pop(fence_id)
+                orphaned += [
+                    self._jobs.pop(job_id) for job_id in suspects
+                    if job_id in self._jobs and job_id not in claimed
+                ]
+
+        for future, slot in orphaned:
+            self.orphaned_jobs += 1
+            self._release_slot(slot)
+            if not future.done():
+                future.set_exception(WorkerCrashed("Воркер упал, не успев начать обработку задания"))
+
+    def _monitor(self):
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            self._resolve_fences()
+            for index, process in enumerate(self._processes):
+                state = self._workers[index]
+                if state["respawn_at"] is not None:
+                    if time.time() >= state["respawn_at"]:
+                        state["respawn_at"] = None
+                        self._spawn(index)
+                    continue
+
+                if process is None or process.is_alive():
+                    continue
+
+                logger.error(
+                    f"Воркер Whisper {index} (pid {process.pid}) завершился "
+                    f"с кодом {process.exitcode}, перезапуск"
+                )
+                # Задания, которые воркер успел взять, уже не будут выполнены
+                base = index * self.max_batch_size
+                lost = [self._current_jobs[base + k] for k in range(self.max_batch_size)]
+                with self._lock:
+                    lost_jobs = [self._jobs.pop(job_id) for job_id in lost if job_id in self._jobs]
+                    for k in range(self.max_batch_size):
+                        self._current_jobs[base + k] = 0
+                    self._put_fence()
+                for future, slot in lost_jobs:
+                    self._release_slot(slot)
+                    if not future.done():
+                        future.set_exception(WorkerCrashed(f"Воркер {index} упал во время обработки"))
+
+                # Экспоненциальная задержка, чтобы не уйти в цикл перезапусков,
+                # если модель не загружается
+                state["restarts"] += 1
+                state["ready"] = False
+                delay = min(MAX_RESPAWN_DELAY, 2 ** state["consecutive_failures"] - 1)
+                state["consecutive_failures"] += 1
+                state["respawn_at"] = time.time() + delay
+
+    def submit(
+        self,
+        payload: Any,
+        language: Optional[str] = None,
+        content_type: Optional[str] = None,
+        op: str = OP_TRANSCRIBE,
+        tier: str = "full"
+    ) -> Future:
+        """Отправка задания в пул; результат приходит через Future"""
+        if isinstance(payload, np.ndarray):
+            data = np.ascontiguousarray(payload, dtype=np.float32)
+            kind = PAYLOAD_F32
+            size = data.nbytes
+        else:
+            data = payload
+            kind = PAYLOAD_RAW
+            size = len(data)
+
+        slot = -1
+        if size <= self.slot_size:
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                pass
+
+        inline = None
+        if slot >= 0:
+            start = slot * self.slot_size
+            self._shm.buf[start:start + size] = memoryview(data).cast("B")
+        else:
+            # Буфер переполнен или клип не помещается в слот — передаём через pickle
+            self.inline_fallbacks += 1
+            inline = data.tobytes() if kind == PAYLOAD_F32 else bytes(data)
+
+        future: Future = Future()
+        job_id = next(self._job_ids)
+        # Постановка в очередь под блокировкой: метка OP_FENCE встаёт строго
+        # после всех заданий, зарегистрированных до неё
+        with self._lock:
+            self._jobs[job_id] = (future, slot)
+            self._job_queue.put((job_id, slot, size, kind, op, language, content_type, inline, tier, time.time()))
+        return future
+
+    @property
+    def ready(self) -> bool:
+        return self.started and any(state["ready"] for state in self._workers)
+
+    @property
+    def all_ready(self) -> bool:
+        return self.started and all(state["ready"] for state in self._workers)
+
+    def health(self) -> Dict[str, Any]:
+        """Состояние воркеров для health-check"""
+        now = time.time()
+        workers = []
+        for index, state in enumerate(self._workers):
+            process = self._processes[index]
+            workers.append({
+                "index": index,
+                "pid": state["pid"],
+                "alive": bool(process and process.is_alive()),
+                "ready": state["ready"],
+                "heartbeat_age_seconds": round(now - self._heartbeats[index], 2) if self._heartbeats else None,
+                "jobs_completed": state["jobs_completed"],
+                "restarts": state["restarts"]
+            })
+        return {
+            "backend": "process",
+            "cpu_threads_per_worker": self.cpu_threads,
+            "pending_jobs": len(self._jobs),
+            "free_slots": self._free_slots.qsize(),
+            "inline_fallbacks": self.inline_fallbacks,
+            "orphaned_jobs": self.orphaned_jobs,
+            "workers": workers
+        }
+
+    def shutdown(self, timeout: float = 5.0):
+        """Остановка воркеров и освобождение разделяемой памяти"""
+        if not self.started:
+            return
+        self._stopping.set()
+
+        for _ in self._processes:
+            self._job_queue.put(None)
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+        for thread in self._threads:
+            thread.join(timeout)
+
+        with self._lock:
+            pending = list(self._jobs.values())
+            self._jobs.clear()
+            self._fences.clear()
+        for future, _ in pending:
+            if not future.done():
+                future.set_exception(WorkerCrashed("Пул воркеров остановлен"))
+
+        self._shm.close()
+        self._shm.unlink()
+        self.started = False
@@ -0,0 +1,91 @@
+import base64
+import json
+from typing import Any, Dict, Union
+
+import msgpack
+from fastapi import WebSocket, WebSocketDisconnect
+
+# Подпротоколы WebSocket (заголовок Sec-WebSocket-Protocol).
+# msgpack: бинарные кадры с msgpack-конвертами, аудио — сырыми байтами;
+# json: текстовые JSON-кадры, аудио в base64 (старые клиенты без заголовка)
+PROTOCOL_MSGPACK = "vtb.msgpack.v1"
+PROTOCOL_JSON = "vtb.json.v1"
+
+SUPPORTED_PROTOCOLS = (PROTOCOL_MSGPACK, PROTOCOL_JSON)
+
+Frame = Union[str, bytes]
+
+
+def negotiate(websocket: WebSocket) -> str:
+    """Выбор подпротокола из предложенных клиентом; по умолчанию JSON"""
+    offered = websocket.scope.get("subprotocols") or []
+    for protocol in SUPPORTED_PROTOCOLS:
+        if protocol in offered:
+            return protocol
+    return PROTOCOL_JSON
+
+
+async def accept(websocket: WebSocket) -> str:
+    """Принятие соединения с согласованным подпротоколом"""
+    protocol = negotiate(websocket)
+    # Клиенту без заголовка подпротокол не возвращается (иначе он закроет соединение)
+    offered = websocket.scope.get("subprotocols") or []
+    await websocket.accept(subprotocol=protocol if protocol in offered else None)
+    return protocol
+
+
+def encode(message: Dict[str, Any], protocol: str) -> Frame:
+    if protocol == PROTOCOL_MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def transcode(text: str, protocol: str) -> Frame:
+    """Готовый JSON-текст в кадр выбранного подпротокола"""
+    if protocol == PROTOCOL_MSGPACK:
+        return msgpack.packb(json.loads(text), use_bin_type=True)
+    return text
+
+
+def decode(frame: Frame) -> Dict[str, Any]:
+    """Разбор входящего кадра: бинарный — msgpack, текстовый — JSON.
+
+    Ошибки формата пробрасываются как ValueError.
+    """
+    if isinstance(frame, bytes):
+        try:
+            message = msgpack.unpackb(frame, raw=False)
+        except Exception as e:
+            raise ValueError(f"Неверный формат msgpack: {e}")
+    else:
+        message = json.loads(frame)
+    if not isinstance(message, dict):
+        raise ValueError("Сообщение должно быть объектом")
+    return message
+
+
+async def receive(websocket: WebSocket) -> Dict[str, Any]:
+    """Следующее сообщение клиента независимо от типа кадра"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    frame = message.get("bytes")
+    if frame is None:
+        frame = message.get("text") or ""
+    return decode(frame)
+
+
+async def send(websocket: WebSocket, message: Dict[str, Any], protocol: str):
+    await send_frame(websocket, encode(message, protocol))
+
+
+async def send_frame(websocket: WebSocket, frame: Frame):
+    if isinstance(frame, bytes):
+        await websocket.send_bytes(frame)
+    else:
+        await websocket.send_text(frame)
+
+
+def binary_field(value: Union[str, bytes]) -> bytes:
+    """Бинарные данные из сообщения: сырые байты (msgpack) или base64 (JSON)"""
+    return value if isinstance(value, bytes) else base64.b64decode(value)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк декодирования аудио: путь в памяти против временного файла.
+
+Запуск из папки backend:
+    python -m benchmarks.bench_audio_decode
+"""
+import io
+import time
+import wave
+
+import numpy as np
+
+from app.services.audio_decoder import decode_audio_bytes
+from app.services.whisper_service import WhisperService
+
+DURATIONS = [2, 5, 10]
+REPEATS = 50
+
+
+def make_wav(seconds: int, sample_rate: int) -> bytes:
+    """Синтетический WAV: тон 440 Гц с шумом"""
+    t = np.arange(seconds * sample_rate) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * np.random.randn(len(t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def make_webm(seconds: int) -> bytes:
+    """Синтетический WebM/Opus, как его отдаёт MediaRecorder в браузере"""
+    import av
+
+    sample_rate = 48000
+    t = np.arange(seconds * sample_rate) / sample_rate
+    signal = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format="webm") as container:
+        stream = container.add_stream("libopus", rate=sample_rate)
+        stream.layout = "mono"
+        frame_size = 960
+        for start in range(0, len(signal) - frame_size, frame_size):
+            frame = av.AudioFrame.from_ndarray(
+                signal[start:start + frame_size].reshape(1, -1), format="flt", layout="mono"
+            )
+            frame.sample_rate = sample_rate
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def measure(fn, payload: bytes) -> float:
+    """Медиана времени одного вызова в миллисекундах"""
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(payload)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    service = WhisperService()
+
+    cases = []
+    for seconds in DURATIONS:
+        cases.append((f"WAV 16 кГц, {seconds} с", make_wav(seconds, 16000)))
+        cases.append((f"WAV 48 кГц, {seconds} с", make_wav(seconds, 48000)))
+        try:
+            cases.append((f"WebM/Opus, {seconds} с", make_webm(seconds)))
+        except Exception as e:
+            print(f"WebM пропущен: {e}")
+
+    print(f"{'Клип':<22} {'в памяти, мс':>14} {'через файл, мс':>16} {'ускорение':>10}")
+    print("-" * 66)
+    for name, payload in cases:
+        in_memory = measure(decode_audio_bytes, payload)
+        via_file = measure(service._decode_audio_file, payload)
+        print(f"{name:<22} {in_memory:>14.2f} {via_file:>16.2f} {via_file / in_memory:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкурентной вставки сообщений чата в SQLite:
+профиль development (rollback journal, лог SQL) против production
+(WAL, synchronous=NORMAL, mmap, cache_size, busy_timeout, без лога).
+
+Каждое "собеседование" — отдельная корутина со своей сессией, которая
+вставляет сообщения по одному с commit, как это делали обработчики до
+отложенной записи.
+
+Запуск из папки backend:
+    python -m benchmarks.bench_sqlite_profile
+"""
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import PROFILE_PRODUCTION, build_engine
+from app.models import ChatMessage, Interview, MessageRole
+
+INTERVIEWS = 20
+MESSAGES_PER_INTERVIEW = 50
+
+
+async def run_profile(profile: str, path: str) -> float:
+    """Сообщений в секунду для заданного профиля"""
+    engine = build_engine(f"sqlite+aiosqlite:///{path}", profile)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        interviews = [
+            Interview(unique_link=f"bench-{i}", candidate_name="Бенчмарк", candidate_id=str(i),
+                      position="Разработчик", recommended_duration=30)
+            for i in range(INTERVIEWS)
+        ]
+        session.add_all(interviews)
+        await session.commit()
+        interview_ids = [interview.id for interview in interviews]
+
+    async def interview_writer(interview_id: int):
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            for n in range(MESSAGES_PER_INTERVIEW):
+                session.add(ChatMessage(
+                    content=f"Сообщение {n} в собеседовании {interview_id}",
+                    role=MessageRole.CANDIDATE,
+                    interview_id=interview_id
+                ))
+                await session.commit()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[interview_writer(i) for i in interview_ids])
+    elapsed = time.perf_counter() - started
+
+    await engine.dispose()
+    return INTERVIEWS * MESSAGES_PER_INTERVIEW / elapsed
+
+
+def main():
+    # Лог SQL в development-профиле уводим в /dev/null: форматирование и запись
+    # остаются в замере, но не засоряют вывод
+    devnull = open(os.devnull, "w")
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logging.getLogger("sqlalchemy.engine.Engine").handlers = [handler]
+
+    results = {}
+    for profile in ("development", PROFILE_PRODUCTION):
+        with tempfile.TemporaryDirectory() as tmp:
+            results[profile] = asyncio.run(run_profile(profile, os.path.join(tmp, "bench.db")))
+    devnull.close()
+
+    total = INTERVIEWS * MESSAGES_PER_INTERVIEW
+    print(f"{INTERVIEWS} собеседований x {MESSAGES_PER_INTERVIEW} сообщений = {total} вставок с commit")
+    print(f"{'Профиль':<14} {'сообщений/с':>12}")
+    print("-" * 27)
+    for profile, throughput in results.items():
+        print(f"{profile:<14} {throughput:>12.0f}")
+    print(f"Ускорение: {results[PROFILE_PRODUCTION] / results['development']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подпротоколов WebSocket: байты на проводе и время CPU сервера
+на сообщение для прежних JSON-кадров, компактного JSON и msgpack.
+
+Сообщения:
+- chat — сообщение чата с кириллицей, как его рассылает сервер;
+- audio — 100 мс аудио 16 кГц s16le (в JSON — base64, в msgpack — байты).
+
+Сжатие permessage-deflate моделируется как в RFC 7692: общий контекст
+deflate на соединение, Z_SYNC_FLUSH на каждое сообщение и отброшенный
+хвост 00 00 ff ff.
+
+Запуск из папки backend:
+    python -m benchmarks.bench_ws_protocol
+"""
+import base64
+import json
+import time
+import zlib
+
+import numpy as np
+
+from app.services import ws_protocol
+
+ITERATIONS = 5000
+SAMPLE_RATE = 16000
+
+WORDS = (
+    "расскажите проект сервис команда архитектура задержка метрики ошибки база индекс запрос "
+    "транзакция очередь кэш нагрузка релиз ревью тесты мониторинг инцидент восстановление "
+    "асинхронный платёжный перенос опыт решение компромисс масштабирование данные клиент "
+    "ответственность срок приоритет улучшение продакшен сложность вопрос пример результат"
+).split()
+
+
+def chat_messages(count: int) -> list:
+    """Разные сообщения чата: одинаковые кадры сжимались бы нереалистично хорошо"""
+    rng = np.random.default_rng(1)
+    return [
+        {
+            "id": 1000 + n,
+            "content": " ".join(rng.choice(WORDS, size=int(rng.integers(6, 25)))).capitalize() + ".",
+            "role": "ai_hr" if n % 2 == 0 else "candidate",
+            "timestamp": f"2025-01-01T12:{n // 60 % 60:02d}:{n % 60:02d}.{n * 7919 % 1000000:06d}",
+            "interview_id": 42
+        }
+        for n in range(count)
+    ]
+
+
+def audio_chunks(count: int) -> list:
+    """Последовательные куски по 100 мс речеподобного сигнала: тон с шумом"""
+    chunk = SAMPLE_RATE // 10
+    t = np.arange(chunk * count) / SAMPLE_RATE
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    pcm = (signal * 32767).astype(np.int16).tobytes()
+    return [pcm[i * chunk * 2:(i + 1) * chunk * 2] for i in range(count)]
+
+
+def legacy_json(message: dict) -> bytes:
+    # Прежний формат: json.dumps с пробелами после разделителей
+    return json.dumps(message, ensure_ascii=False).encode("utf-8")
+
+
+def compact_json(message: dict) -> bytes:
+    return ws_protocol.encode(message, ws_protocol.PROTOCOL_JSON).encode("utf-8")
+
+
+def msgpack_frame(message: dict) -> bytes:
+    return ws_protocol.encode(message, ws_protocol.PROTOCOL_MSGPACK)
+
+
+def decode_text(frame: bytes) -> dict:
+    return ws_protocol.decode(frame.decode("utf-8"))
+
+
+class PerMessageDeflate:
+    """Сжатие кадров одного соединения с общим контекстом"""
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return (self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+
+
+def measure(name: str, messages: list, encoder, decoder) -> dict:
+    """Средние размер кадра и время CPU на сообщение"""
+    started = time.perf_counter()
+    raw = 0
+    for message in messages:
+        raw += len(encoder(message))
+        decoder(encoder(message))
+    codec_us = (time.perf_counter() - started) / len(messages) * 1e6
+
+    deflate = PerMessageDeflate()
+    started = time.perf_counter()
+    deflated = 0
+    for message in messages:
+        deflated += len(deflate.compress(encoder(message)))
+    deflate_us = (time.perf_counter() - started) / len(messages) * 1e6
+
+    return {
+        "name": name,
+        "bytes": raw / len(messages),
+        "deflate_bytes": deflated / len(messages),
+        "codec_us": codec_us,
+        "deflate_us": deflate_us
+    }
+
+
+def main():
+    chat = chat_messages(ITERATIONS)
+    audio = audio_chunks(ITERATIONS)
+    audio_json = [
+        {"type": "audio_data", "data": base64.b64encode(chunk).decode("ascii"), "sample_rate": SAMPLE_RATE}
+        for chunk in audio
+    ]
+    audio_msgpack = [{"type": "audio_data", "data": chunk, "sample_rate": SAMPLE_RATE} for chunk in audio]
+
+    rows = [
+        measure("chat: прежний JSON", chat, legacy_json, decode_text),
+        measure("chat: JSON", chat, compact_json, decode_text),
+        measure("chat: msgpack", chat, msgpack_frame, ws_protocol.decode),
+        measure("audio: JSON+base64", audio_json, compact_json, decode_text),
+        measure("audio: msgpack", audio_msgpack, msgpack_frame, ws_protocol.decode),
+    ]
+
+    print(f"{ITERATIONS} сообщений каждого вида; аудио — куски по {len(audio[0])} байт PCM")
+    print(f"{'Сообщение':<22} {'байт':>7} {'deflate':>9} {'кодек, мкс':>11} {'+deflate, мкс':>14}")
+    print("-" * 67)
+    for row in rows:
+        print(
+            f"{row['name']:<22} {row['bytes']:>7.0f} {row['deflate_bytes']:>9.0f} "
+            f"{row['codec_us']:>11.1f} {row['deflate_us']:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
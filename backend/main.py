@@ -1,10 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import asyncio
 import logging
+import os
+import time
 from contextlib import asynccontextmanager
 
-from app.database import create_db_and_tables
-from app.routers import interviews, chat
+from app.database import create_db_and_tables, dispose_engine
+from app.routers import interviews, chat, speech
+from app.services.broadcast import broadcast
+from app.services.interview_cache import interview_cache
+from app.services.interview_events import interview_events
+from app.services.message_writer import message_writer
+from app.services.transcript_jobs import transcript_jobs
+from app.services.transcript_journal import transcript_journal
+from app.services.whisper_service import whisper_service
 
 # Настройка логирования
 logging.basicConfig(
@@ -13,20 +24,72 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Режим прогрева модели Whisper: blocking — до приёма запросов,
+# background — параллельно с приёмом запросов, off — ленивая загрузка
+WHISPER_WARMUP_MODE = os.getenv("WHISPER_WARMUP_MODE", "background")
+
+# Состояние готовности узла для балансировщика
+readiness = {
+    "ready": False,
+    "error": None,
+    "startup_seconds": None
+}
+
+
+async def warmup_whisper(started: float):
+    """Прогрев модели Whisper в пуле потоков"""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, whisper_service.warmup)
+        readiness["ready"] = True
+        readiness["startup_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Узел готов к приёму запросов через {readiness['startup_seconds']} с после запуска")
+    except Exception as e:
+        readiness["error"] = str(e)
+        logger.error(f"Ошибка при прогреве модели Whisper: {e}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Управление жизненным циклом приложения"""
+    started = time.perf_counter()
     logger.info("Запуск приложения...")
     
     # Создание таблиц базы данных
-    create_db_and_tables()
+    await create_db_and_tables()
     logger.info("Таблицы базы данных созданы")
+    await message_writer.start()
+    await broadcast.connect()
+    # Журнал подписывается на запросы запечатывания до запуска задач транскрипции
+    await transcript_journal.start()
+    await transcript_jobs.start()
+    await interview_events.start()
+    await interview_cache.start()
+
+    warmup_task = None
+    if WHISPER_WARMUP_MODE == "blocking":
+        await warmup_whisper(started)
+    elif WHISPER_WARMUP_MODE == "background":
+        warmup_task = asyncio.create_task(warmup_whisper(started))
+    else:
+        readiness["ready"] = True
+        readiness["startup_seconds"] = round(time.perf_counter() - started, 3)
     
     yield
     
     # Очистка ресурсов при завершении
     logger.info("Завершение приложения...")
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    await transcript_jobs.shutdown()
+    await interview_events.shutdown()
+    await interview_cache.shutdown()
+    await transcript_journal.shutdown()
+    await broadcast.disconnect()
+    await whisper_service.shutdown()
+    # Дописываем отложенные сообщения чата до закрытия соединений
+    await message_writer.shutdown()
+    await dispose_engine()
 
 
 # Создание приложения FastAPI
@@ -44,11 +107,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Content-Range", "Accept-Ranges"],
 )
 
 # Подключение роутеров
 app.include_router(interviews.router, prefix="/api/v1")
 app.include_router(chat.router, prefix="/api/v1")
+app.include_router(speech.router, prefix="/api/v1")
 
 
 @app.get("/")
@@ -69,10 +134,30 @@ async def health_check():
         "services": {
             "api": "running",
             "database": "connected"
+        },
+        "interview_cache": interview_cache.stats(),
+        "websockets": {
+            "broadcast": broadcast.stats(),
+            "chat": chat.manager.stats(),
+            "interview": interviews.connections.stats(),
+            "events": interview_events.stats()
         }
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Проверка готовности узла (модель загружена и прогрета)"""
+    body = {
+        "status": "ready" if readiness["ready"] else "not_ready",
+        "warmup_mode": WHISPER_WARMUP_MODE,
+        "startup_seconds": readiness["startup_seconds"],
+        "whisper": whisper_service.startup_timings,
+        "error": readiness["error"]
+    }
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=body)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -80,5 +165,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        # Сжатие текстовых кадров WebSocket (permessage-deflate)
+        ws_per_message_deflate=True
     )
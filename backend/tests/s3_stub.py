@@ -0,0 +1,49 @@
+"""
+Заглушка S3-клиента для тестов хранилища транскрипций (в приложении не используется).
+"""
+import hashlib
+import io
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class ObjectNotFound(Exception):
+    """Ошибка отсутствия объекта в формате ошибок boto3"""
+
+    def __init__(self, key: str):
+        super().__init__(f"Объект не найден: {key}")
+        self.response = {"Error": {"Code": "NoSuchKey"}}
+
+
+class InMemoryS3Client:
+    """Заглушка S3-клиента в памяти для тестов без MinIO.
+
+    Поддерживает подмножество API boto3, нужное ``S3TranscriptStorage``.
+    """
+
+    def __init__(self):
+        self._objects: Dict[Tuple[str, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket: str, Key: str, Body, **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        with self._lock:
+            self._objects[(Bucket, Key)] = data
+        return {"ETag": hashlib.md5(data).hexdigest()}
+
+    def _get(self, bucket: str, key: str) -> bytes:
+        with self._lock:
+            data = self._objects.get((bucket, key))
+        if data is None:
+            raise ObjectNotFound(key)
+        return data
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None, **kwargs):
+        data = self._get(Bucket, Key)
+        if Range:
+            start, end = Range.removeprefix("bytes=").split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs):
+        return {"ContentLength": len(self._get(Bucket, Key))}
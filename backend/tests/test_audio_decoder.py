@@ -0,0 +1,44 @@
+"""
+Разбор WAV в памяти: повреждённый заголовок даёт ``AudioDecodeError``,
+а не ``ZeroDivisionError`` или ``struct.error``.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import struct
+
+import pytest
+
+from app.services.audio_decoder import AudioDecodeError, WAVE_FORMAT_PCM, decode_wav
+
+
+def _wav(channels: int = 1, sample_rate: int = 16000, bits_per_sample: int = 16, data: bytes = b"\0" * 64) -> bytes:
+    block_align = channels * bits_per_sample // 8
+    fmt = struct.pack(
+        "<HHIIHH", WAVE_FORMAT_PCM, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample
+    )
+    return (
+        b"RIFF" + struct.pack("<I", 36 + len(data)) + b"WAVE"
+        + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+        + b"data" + struct.pack("<I", len(data)) + data
+    )
+
+
+def test_valid_wav_is_decoded():
+    assert len(decode_wav(_wav())) == 32
+
+
+@pytest.mark.parametrize("header", [
+    {"channels": 0},
+    {"bits_per_sample": 0},
+    {"sample_rate": 0}
+])
+def test_zero_header_fields_are_rejected(header):
+    with pytest.raises(AudioDecodeError):
+        decode_wav(_wav(**header))
+
+
+@pytest.mark.parametrize("length", [20, 26, 30])
+def test_truncated_fmt_chunk_is_rejected(length):
+    with pytest.raises(AudioDecodeError):
+        decode_wav(_wav()[:length])
@@ -0,0 +1,121 @@
+"""
+Рассылка между воркерами: два ``RedisBroadcast`` с общим ``InMemoryRedis``
+ведут себя как два процесса uvicorn, подключённые к одному Redis.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import asyncio
+
+from app.services.broadcast import InMemoryRedis, RedisBroadcast
+from app.services.connection_manager import ConnectionManager
+from app.services.transcript_journal import TranscriptJournal
+
+INTERVIEW_ID = 7
+
+
+class FakeWebSocket:
+    """Соединение клиента: запоминает отправленные кадры"""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.frames = []
+        self.received = asyncio.Event()
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames.append(text)
+        self.received.set()
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(data)
+        self.received.set()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def _workers(count: int):
+    redis = InMemoryRedis()
+    workers = [RedisBroadcast(client=redis, poll_timeout=0.05) for _ in range(count)]
+    for worker in workers:
+        await worker.connect()
+    return workers
+
+
+async def _disconnect(*workers: RedisBroadcast):
+    for worker in workers:
+        await worker.disconnect()
+
+
+def test_publish_reaches_other_worker():
+    async def scenario():
+        first, second = await _workers(2)
+        received = asyncio.Queue()
+
+        async def on_message(payload: str):
+            await received.put(payload)
+
+        await second.subscribe("chat:1", on_message)
+        await first.publish("chat:1", "привет")
+        payload = await asyncio.wait_for(received.get(), 1.0)
+        await _disconnect(first, second)
+        return payload, first.published, second.received
+
+    payload, published, received = asyncio.run(scenario())
+    assert payload == "привет"
+    assert published == 1
+    assert received == 1
+
+
+def test_sender_excluded_across_workers():
+    async def scenario():
+        first, second = await _workers(2)
+        manager_a = ConnectionManager("chat", first)
+        manager_b = ConnectionManager("chat", second)
+        sender, neighbour, remote = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager_a.connect(sender, INTERVIEW_ID)
+        await manager_a.connect(neighbour, INTERVIEW_ID)
+        await manager_b.connect(remote, INTERVIEW_ID)
+
+        await manager_a.send_message_to_interview({"text": "ответ"}, INTERVIEW_ID, exclude=sender)
+        await asyncio.wait_for(neighbour.received.wait(), 1.0)
+        await asyncio.wait_for(remote.received.wait(), 1.0)
+        # Даём воркерам время доставить лишние копии, если они есть
+        await asyncio.sleep(0.1)
+
+        for manager, websocket in ((manager_a, sender), (manager_a, neighbour), (manager_b, remote)):
+            await manager.disconnect(websocket, INTERVIEW_ID)
+        await _disconnect(first, second)
+        return sender.frames, neighbour.frames, remote.frames
+
+    sender_frames, neighbour_frames, remote_frames = asyncio.run(scenario())
+    assert sender_frames == []
+    assert neighbour_frames == ['{"text":"ответ"}']
+    assert remote_frames == ['{"text":"ответ"}']
+
+
+def test_journal_seal_collects_lines_of_other_worker(tmp_path):
+    async def scenario():
+        first, second = await _workers(2)
+        journal_a = TranscriptJournal(str(tmp_path), fsync_interval=10.0, backend=first, seal_settle=0.2)
+        journal_b = TranscriptJournal(str(tmp_path), fsync_interval=10.0, backend=second, seal_settle=0.2)
+        await journal_a.start()
+        await journal_b.start()
+
+        journal_a.append(INTERVIEW_ID, {"type": "message", "content": "первая реплика"})
+        journal_b.append(INTERVIEW_ID, {"type": "message", "content": "вторая реплика"})
+        path = await journal_a.seal(INTERVIEW_ID)
+
+        await journal_a.shutdown()
+        await journal_b.shutdown()
+        await _disconnect(first, second)
+        return path
+
+    path = asyncio.run(scenario())
+    with open(path, encoding="utf-8") as sealed:
+        content = sealed.read()
+    assert "первая реплика" in content
+    assert "вторая реплика" in content
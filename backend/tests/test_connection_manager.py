@@ -0,0 +1,38 @@
+"""
+Очередь отправки медленного клиента: при переполнении теряются только
+сообщения с ключом объединения, а сообщения чата и статусы — никогда.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import pytest
+
+from app.services.connection_manager import POLICY_COALESCE, POLICY_DROP_OLDEST, _Outbound
+
+
+def _outbound(policy: str) -> _Outbound:
+    return _Outbound(websocket=None, protocol="json", max_size=3, policy=policy)
+
+
+@pytest.mark.parametrize("policy", [POLICY_DROP_OLDEST, POLICY_COALESCE])
+def test_overflow_drops_only_keyed_frames(policy):
+    outbound = _outbound(policy)
+    assert outbound.put("chat-1")
+    assert outbound.put("partial-1", key="partial")
+    assert outbound.put("chat-2")
+
+    assert outbound.put("chat-3")
+    assert [frame for _, frame in outbound.queue] == ["chat-1", "chat-2", "chat-3"]
+    # Частичный результат при полной очереди без ключевых сообщений теряется сам
+    assert outbound.put("partial-2", key="partial")
+    assert [frame for _, frame in outbound.queue] == ["chat-1", "chat-2", "chat-3"]
+    assert outbound.dropped == 2
+
+
+@pytest.mark.parametrize("policy", [POLICY_DROP_OLDEST, POLICY_COALESCE])
+def test_lossless_overflow_disconnects(policy):
+    outbound = _outbound(policy)
+    for index in range(3):
+        assert outbound.put(f"chat-{index}")
+    assert not outbound.put("status")
+    assert [frame for _, frame in outbound.queue] == ["chat-0", "chat-1", "chat-2"]
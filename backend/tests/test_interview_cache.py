@@ -0,0 +1,73 @@
+"""
+Кэш собеседований: общий уровень заполняется только из ``put``, а отмена
+запроса, начавшего загрузку, не отменяет ожидающих той же записи.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import asyncio
+from datetime import datetime
+
+from app.models import Interview, InterviewStatus
+from app.services.broadcast import InMemoryRedis
+from app.services.interview_cache import InterviewCache, SharedCacheTier
+
+
+def _interview(status: InterviewStatus = InterviewStatus.NOT_STARTED) -> Interview:
+    return Interview(
+        id=5,
+        unique_link="link-5",
+        candidate_name="Кандидат",
+        candidate_id="c-5",
+        position="Backend",
+        recommended_duration=30,
+        status=status,
+        created_at=datetime(2026, 1, 1)
+    )
+
+
+def _cache() -> InterviewCache:
+    return InterviewCache(shared=SharedCacheTier(client=InMemoryRedis()))
+
+
+def test_database_miss_does_not_fill_shared_tier():
+    async def scenario():
+        cache = _cache()
+
+        async def query(_):
+            return _interview()
+
+        loaded = await cache._load("id:5", query, session=object())
+        from_shared = await cache.shared.get("id:5")
+        await cache.put(_interview(InterviewStatus.STARTED))
+        return loaded, from_shared, await cache._shared_get("id:5")
+
+    loaded, from_shared, after_put = asyncio.run(scenario())
+    assert loaded.id == 5
+    assert from_shared is None
+    assert after_put.status == InterviewStatus.STARTED
+
+
+def test_waiters_survive_cancelled_leader():
+    async def scenario():
+        cache = _cache()
+        calls = 0
+
+        async def query(_):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return _interview()
+
+        leader = asyncio.create_task(cache._load("id:5", query, session=object()))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache._load("id:5", query, session=object()))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        interview = await waiter
+        return leader.cancelled(), interview, calls
+
+    leader_cancelled, interview, calls = asyncio.run(scenario())
+    assert leader_cancelled
+    assert interview.id == 5
+    assert calls == 2
@@ -0,0 +1,77 @@
+"""
+Поток событий собеседования при нескольких воркерах: общие id событий,
+доставка не по порядку и событие, опубликованное во время чтения снимка.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import asyncio
+import json
+
+from app.services.broadcast import InMemoryRedis, RedisBroadcast
+from app.services.interview_events import EVENT_STATUS, InterviewEventLog
+
+INTERVIEW_ID = 3
+
+
+async def _collect(stream, count: int):
+    events = []
+    async for event in stream:
+        if event is not None:
+            events.append(event)
+        if len(events) == count:
+            break
+    await stream.aclose()
+    return events
+
+
+def test_ids_are_shared_between_workers():
+    async def scenario():
+        redis = InMemoryRedis()
+        first, second = RedisBroadcast(client=redis), RedisBroadcast(client=redis)
+        log_a, log_b = InterviewEventLog(first), InterviewEventLog(second)
+        ids = [await log_a._next_id(INTERVIEW_ID), await log_b._next_id(INTERVIEW_ID), await log_a._next_id(INTERVIEW_ID)]
+        return ids, await log_b._next_id(INTERVIEW_ID + 1)
+
+    ids, other_interview = asyncio.run(scenario())
+    assert ids == [1, 2, 3]
+    assert other_interview == 1
+
+
+def test_out_of_order_events_are_not_dropped():
+    async def scenario():
+        log = InterviewEventLog(RedisBroadcast(client=InMemoryRedis()), tick_interval=60)
+
+        async def snapshot():
+            return {"status": "started"}
+
+        stream = log.stream(INTERVIEW_ID, snapshot, last_event_id=None)
+        first = await stream.__anext__()
+        # Событие второго воркера опередило событие первого
+        for event_id in (2, 1):
+            await log._on_message(json.dumps(log._event(INTERVIEW_ID, EVENT_STATUS, {"n": event_id}, event_id)))
+        await log._on_message(json.dumps(log._event(INTERVIEW_ID, EVENT_STATUS, {"n": 2}, 2)))
+        events = await _collect(stream, 2)
+        return first, events, log.replay(INTERVIEW_ID, 0)
+
+    snapshot, events, replayed = asyncio.run(scenario())
+    assert snapshot["type"] == "snapshot"
+    assert [event["id"] for event in events] == [2, 1]
+    assert [event["id"] for event in replayed] == [1, 2]
+
+
+def test_event_published_while_reading_snapshot_is_delivered():
+    async def scenario():
+        log = InterviewEventLog(RedisBroadcast(client=InMemoryRedis()), tick_interval=60)
+
+        async def snapshot():
+            # Статус меняется, пока читается снимок
+            await log._on_message(json.dumps(log._event(INTERVIEW_ID, EVENT_STATUS, {"status": "completed"}, 1)))
+            return {"status": "started"}
+
+        return await _collect(log.stream(INTERVIEW_ID, snapshot), 2)
+
+    events = asyncio.run(scenario())
+    assert [event["type"] for event in events] == ["snapshot", "status"]
+    assert events[0]["id"] is None
+    assert events[1]["data"] == {"status": "completed"}
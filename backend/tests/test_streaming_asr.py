@@ -0,0 +1,42 @@
+"""
+Потоковое распознавание: подтверждение длинной фразы без пауз не
+отбрасывает аудио, текст которого ещё не выдан как ``asr_final``.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import asyncio
+
+import numpy as np
+
+from app.services import streaming_asr
+from app.services.streaming_asr import StreamingTranscriber
+from app.services.whisper_service import SAMPLE_RATE
+
+
+def test_single_segment_across_cut_is_emitted_before_drop(monkeypatch):
+    events = []
+
+    async def send(event):
+        events.append(event)
+
+    async def transcribe_segments(audio, language=None):
+        # Одна длинная фраза, пересекающая прежнюю границу жёсткого реза (7 с)
+        return [(0.0, 10.0, "длинная фраза без пауз", 0.9)], "ru"
+
+    monkeypatch.setattr(streaming_asr.whisper_service, "transcribe_segments", transcribe_segments)
+    monkeypatch.setattr(streaming_asr.transcript_journal, "append_asr_final", lambda interview_id, event: None)
+
+    async def scenario():
+        transcriber = StreamingTranscriber(1, send=send, max_tail_seconds=12.0)
+        transcriber._chunks = [np.zeros(13 * SAMPLE_RATE, dtype=np.float32)]
+        transcriber._tail_samples = 13 * SAMPLE_RATE
+        await transcriber._commit_stable_prefix()
+        return transcriber
+
+    transcriber = asyncio.run(scenario())
+    assert [(event["type"], event["text"], event["end"]) for event in events] == [
+        ("asr_final", "длинная фраза без пауз", 10.0)
+    ]
+    assert transcriber._tail_offset == 10.0
+    assert transcriber.tail_seconds == 3.0
@@ -0,0 +1,115 @@
+"""
+Очередь транскрипций: параллельные вызовы ``submit`` для одного
+собеседования возвращают одну и ту же задачу, а задачу, поднятую
+несколькими воркерами, выполняет только один.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import build_engine
+from app.models import Interview, TranscriptJob, TranscriptJobStatus
+from app.services import transcript_jobs as transcript_jobs_module
+from app.services.transcript_jobs import TranscriptJobQueue
+
+
+async def _database(tmp_path, monkeypatch):
+    engine = build_engine(f"sqlite:///{tmp_path / 'jobs.db'}", profile="test")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(transcript_jobs_module, "async_session_maker", session_maker)
+
+    async with session_maker() as session:
+        session.add(Interview(
+            id=1,
+            unique_link="link-1",
+            candidate_name="Кандидат",
+            candidate_id="c-1",
+            position="Backend",
+            recommended_duration=30
+        ))
+        await session.commit()
+    return engine, session_maker
+
+
+def _queue(monkeypatch) -> TranscriptJobQueue:
+    queue = TranscriptJobQueue()
+    # Обработчик не запускается: задачи выполняются вызовом _process
+    monkeypatch.setattr(queue, "_ensure_worker", lambda: None)
+    queue._queue = asyncio.Queue()
+    return queue
+
+
+def test_concurrent_submit_returns_existing_job(tmp_path, monkeypatch):
+    async def scenario():
+        engine, session_maker = await _database(tmp_path, monkeypatch)
+        queue = _queue(monkeypatch)
+        jobs = await asyncio.gather(*(queue.submit(1) for _ in range(4)))
+
+        async with session_maker() as session:
+            stored = (await session.exec(select(TranscriptJob))).all()
+        await engine.dispose()
+        return jobs, stored
+
+    jobs, stored = asyncio.run(scenario())
+    assert len(stored) == 1
+    assert {job.id for job in jobs} == {stored[0].id}
+
+
+def test_job_is_processed_by_one_worker(tmp_path, monkeypatch):
+    exports = []
+    notified = []
+
+    async def seal(interview_id):
+        return None
+
+    async def flush():
+        pass
+
+    async def write_transcript(interview, session, path, fmt):
+        exports.append(path)
+        await asyncio.sleep(0.05)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{}\n")
+
+    async def store_file(path):
+        return "0" * 64
+
+    monkeypatch.setattr(transcript_jobs_module.transcript_journal, "seal", seal)
+    monkeypatch.setattr(transcript_jobs_module.message_writer, "flush", flush)
+    monkeypatch.setattr(transcript_jobs_module, "write_transcript", write_transcript)
+    monkeypatch.setattr(transcript_jobs_module.transcript_service, "store_file", store_file)
+    monkeypatch.setattr(transcript_jobs_module.transcript_service, "locate", lambda key: f"store/{key}")
+
+    async def scenario():
+        engine, session_maker = await _database(tmp_path, monkeypatch)
+        # Два воркера uvicorn подняли одну и ту же задачу из базы
+        workers = [_queue(monkeypatch), _queue(monkeypatch)]
+        for worker in workers:
+            worker.work_dir = str(tmp_path)
+
+            async def on_finished(job):
+                notified.append(job.id)
+            worker.on_finished = on_finished
+
+        job = await workers[0].submit(1)
+        await asyncio.gather(*(worker._process(job.id) for worker in workers))
+        for worker in workers:
+            await worker.shutdown()
+
+        async with session_maker() as session:
+            stored = await session.get(TranscriptJob, job.id)
+        await engine.dispose()
+        return stored
+
+    stored = asyncio.run(scenario())
+    assert stored.status == TranscriptJobStatus.DONE
+    assert stored.attempts == 1
+    assert len(exports) == 1
+    assert notified == [stored.id]
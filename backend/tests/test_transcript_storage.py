@@ -0,0 +1,66 @@
+"""
+Хранилище транскрипций поверх S3-клиента (заглушка в памяти) и прежний
+API ``TranscriptService`` для файлов транскрипции.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+from app.models import ChatMessage, Interview, InterviewStatus, MessageRole
+from app.services import transcript_service as transcript_service_module
+from app.services.transcript_service import TranscriptService
+from app.services.transcript_storage import S3TranscriptStorage, TranscriptStorage
+from s3_stub import InMemoryS3Client
+
+
+def test_storage_backend_must_implement_object_operations():
+    with pytest.raises(TypeError):
+        TranscriptStorage()
+
+
+def test_s3_storage_round_trip(tmp_path):
+    source = tmp_path / "transcript.ndjson"
+    lines = [json.dumps({"type": "message", "id": i, "content": f"реплика {i}"}, ensure_ascii=False) for i in range(2000)]
+    source.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    data = source.read_bytes()
+
+    storage = S3TranscriptStorage(InMemoryS3Client(), "transcripts", frame_size=4096)
+    key = storage.put_file(str(source))
+
+    assert storage.exists(key)
+    assert storage.put_file(str(source)) == key
+    assert storage.deduplicated == 1
+    assert storage.size(key) == len(data)
+    assert storage.read_range(key, 5000, 9000) == data[5000:9000]
+    assert b"".join(storage.iter_chunks(key)) == data
+    assert not storage.exists("0" * 64)
+
+
+def test_legacy_transcript_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcript_service_module, "TRANSCRIPTS_DIR", str(tmp_path))
+    interview = Interview(
+        id=9,
+        unique_link="abcdef123456",
+        candidate_name="Кандидат",
+        candidate_id="c-9",
+        position="Backend",
+        recommended_duration=30,
+        status=InterviewStatus.FINISHED
+    )
+    messages = [
+        ChatMessage(id=1, interview_id=9, role=MessageRole.AI_HR, content="Здравствуйте", timestamp=datetime(2026, 1, 1, 10)),
+        ChatMessage(id=2, interview_id=9, role=MessageRole.CANDIDATE, content="Добрый день", timestamp=datetime(2026, 1, 1, 10, 1))
+    ]
+
+    json_path = TranscriptService.create_transcript_file(interview, messages)
+    text_path = TranscriptService.create_simple_text_transcript(interview, messages)
+
+    assert json_path.endswith(".json") and json_path.startswith(str(tmp_path))
+    with open(json_path, encoding="utf-8") as f:
+        assert "Добрый день" in json.dumps(json.load(f), ensure_ascii=False)
+    with open(text_path, encoding="utf-8") as f:
+        assert "Здравствуйте" in f.read()
@@ -0,0 +1,41 @@
+"""
+Пул воркеров Whisper: задание, которое упавший воркер взял из очереди, но
+не успел записать в ``current_jobs``, завершается ошибкой после метки
+``OP_FENCE``, а не висит до таймаута.
+
+Запуск из папки backend:
+    python -m pytest tests
+"""
+import queue
+
+import pytest
+
+from app.services.whisper_workers import OP_FENCE, WhisperWorkerPool, WorkerCrashed
+
+
+def test_job_taken_by_crashed_worker_is_failed_after_fence():
+    pool = WhisperWorkerPool(num_workers=2, max_batch_size=2)
+    pool._job_queue = queue.Queue()
+    pool._current_jobs = [0] * 4
+    # Слотов нет — задания передаются целиком в кортеже
+    recorded, taken, queued = (pool.submit(b"audio") for _ in range(3))
+    recorded_job, taken_job, queued_job = (pool._job_queue.get_nowait() for _ in range(3))
+
+    # Воркер 1 записал своё задание, воркер 0 упал сразу после get()
+    pool._current_jobs[2] = recorded_job[0]
+    with pool._lock:
+        pool._put_fence()
+    fence = pool._job_queue.get_nowait()
+    assert fence[4] == OP_FENCE
+
+    # Воркер 1 взял оставшееся задание, затем подтвердил метку
+    pool._current_jobs[3] = queued_job[0]
+    pool._fences[fence[0]][1] = 0
+    pool._resolve_fences()
+
+    with pytest.raises(WorkerCrashed):
+        taken.result(timeout=0)
+    assert not recorded.done() and not queued.done()
+    assert taken_job[0] not in pool._jobs
+    assert pool.orphaned_jobs == 1
+    assert pool._fences == {}
@@ -65,7 +65,8 @@ const InterviewRoomInternal = () => {
       setConnectionError(null);
 
       await client.connect({
-        webrtcUrl: "http://localhost:7860/api/offer",
+        // Ссылка собеседования: бот строит промпт по его данным
+        webrtcUrl: `http://localhost:7860/api/offer?interview=${interviewId}`,
       });
 
       setIsConnected(true);
@@ -160,7 +161,7 @@ const InterviewRoomInternal = () => {
       );
 
       if (response.ok) {
-        alert('Собеседование завершено. Транскрипция сохранена.');
+        alert('Собеседование завершено. Транскрипция формируется.');
       }
     } catch (error) {
       console.error('Ошибка завершения интервью:', error);
@@ -131,11 +131,17 @@ const useWebSocket = (interviewId: number): UseWebSocketReturn => {
       if (!interviewId) return
 
       try {
-        const response = await fetch(`http://localhost:8000/api/v1/chat/${interviewId}/messages`)
-        if (response.ok) {
-          const data = await response.json()
-          setMessages(data)
-        }
+        // История отдаётся постранично: курсор следующей страницы в X-Next-Cursor
+        const history: Message[] = []
+        let cursor: string | null = null
+        do {
+          const query: string = cursor ? `?after_id=${cursor}` : ''
+          const response: Response = await fetch(`http://localhost:8000/api/v1/chat/${interviewId}/messages${query}`)
+          if (!response.ok) break
+          history.push(...(await response.json()))
+          cursor = response.headers.get('X-Next-Cursor')
+        } while (cursor)
+        setMessages(history)
       } catch (err) {
         console.error('Ошибка загрузки сообщений:', err)
       }